@@ -0,0 +1,28 @@
+"""
+Measures the overhead of going through flux.current_timeline compared to calling the timeline
+directly, before and after a timeline is scoped with current_timeline.use().
+
+Usage: python benchmarks/bench_current_timeline.py
+"""
+import timeit
+
+from flux import current_timeline
+
+
+def main():
+    timeline = current_timeline.get()
+    _bench("Timeline.time()", timeline.time)
+    _bench("current_timeline.time()", current_timeline.time)
+    _bench("current_timeline.get_time_factor()", current_timeline.get_time_factor)
+    with current_timeline.use(timeline):
+        _bench("scoped current_timeline.time()", current_timeline.time)
+        _bench("scoped get_time_factor()", current_timeline.get_time_factor)
+
+
+def _bench(name, func, number=1000000):
+    elapsed = min(timeit.repeat(func, number=number, repeat=5))
+    print("{:>36}: {:>6.1f} ns/call".format(name, elapsed / number * 1e9))
+
+
+if __name__ == "__main__":
+    main()
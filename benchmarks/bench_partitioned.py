@@ -0,0 +1,52 @@
+"""
+Measures the event throughput of run_partitioned, with partitions running in-process and in
+separate processes. Every partition runs clients re-arming random timers, and occasionally sends a
+message to a random other partition.
+
+Usage: python benchmarks/bench_partitioned.py [--partitions 4] [--clients 100] [--until 1000] [--lookahead 1]
+"""
+import argparse
+import functools
+import random
+import time
+
+from flux.parallel import run_partitioned
+
+
+def _tick(partition, rand, names, lookahead):
+    if rand.random() < 0.01:
+        partition.send(rand.choice(names), lookahead + rand.random(), _receive)
+    partition.timeline.schedule_callback(rand.expovariate(1.0), _tick, partition, rand, names, lookahead)
+
+
+def _receive(partition):
+    pass
+
+
+def _setup(partition, names, num_clients, lookahead):
+    rand = random.Random(partition.name)
+    for _ in range(num_clients):
+        partition.timeline.schedule_callback(rand.expovariate(1.0), _tick, partition, rand, names, lookahead)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--partitions", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--until", type=float, default=1000)
+    parser.add_argument("--lookahead", type=float, default=1)
+    args = parser.parse_args()
+
+    names = ["partition{}".format(index) for index in range(args.partitions)]
+    partitions = {name: functools.partial(_setup, names=names, num_clients=args.clients, lookahead=args.lookahead)
+                  for name in names}
+    for processes in (False, True):
+        start = time.perf_counter()
+        results = run_partitioned(partitions, args.lookahead, args.until, processes=processes)
+        elapsed = time.perf_counter() - start
+        num_events = sum(result.num_events for result in results.values())
+        print("{:>11}: {:>10.0f} events/s".format("processes" if processes else "in-process", num_events / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Measures the dispatch rate of Timeline.run_events compared to driving the same simulation with
+Timeline.sleep_wait_all_scheduled, and with instrumentation or tracing enabled: a number of clients, each re-arming a timer with a random
+interval every time it fires.
+
+Usage: python benchmarks/bench_run.py [--clients 1000] [--events 1000000]
+"""
+import argparse
+import io
+import random
+import time
+
+from flux.timeline import Timeline
+
+
+def _make_simulation(num_clients, num_events):
+    timeline = Timeline()
+    timeline.freeze()
+    rand = random.Random(0)
+    remaining = [num_events]
+
+    def tick():
+        remaining[0] -= 1
+        if remaining[0] > 0:
+            timeline.schedule_callback(rand.expovariate(1.0), tick)
+
+    for _ in range(num_clients):
+        timeline.schedule_callback(rand.expovariate(1.0), tick)
+    return timeline
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=1000000)
+    args = parser.parse_args()
+
+    timeline = _make_simulation(args.clients, args.events)
+    start = time.perf_counter()
+    num_events = timeline.run_events(args.events + args.clients)
+    elapsed = time.perf_counter() - start
+    print("run_events:               {:>12.0f} events/s".format(num_events / elapsed))
+
+    timeline = _make_simulation(args.clients, args.events)
+    timeline.enable_instrumentation()
+    start = time.perf_counter()
+    num_events = timeline.run_events(args.events + args.clients)
+    elapsed = time.perf_counter() - start
+    print("run_events, instrumented: {:>12.0f} events/s".format(num_events / elapsed))
+
+    timeline = _make_simulation(args.clients, args.events)
+    trace = io.BytesIO()
+    timeline.start_trace(trace)
+    start = time.perf_counter()
+    num_events = timeline.run_events(args.events + args.clients)
+    timeline.stop_trace()
+    elapsed = time.perf_counter() - start
+    print("run_events, traced:       {:>12.0f} events/s, {:.1f} bytes/event".format(
+        num_events / elapsed, len(trace.getvalue()) / num_events))
+
+    timeline = _make_simulation(args.clients, args.events // 10)
+    start = time.perf_counter()
+    timeline.sleep_wait_all_scheduled()
+    elapsed = time.perf_counter() - start
+    print("sleep_wait_all_scheduled: {:>12.0f} events/s".format(args.events // 10 / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Compares scheduling a batch of callbacks with Timeline.schedule_many against calling
+Timeline.schedule_callback once per callback, with and without callbacks already pending.
+
+Usage: python benchmarks/bench_schedule_many.py [--batch-size 50000] [--repeat 5]
+"""
+import argparse
+import random
+import time
+
+from flux.timeline import Timeline
+
+
+def _noop(*_):
+    pass
+
+
+def _make_timeline(num_pending):
+    timeline = Timeline()
+    timeline.freeze()
+    timeline.schedule_many([(i, _noop) for i in range(num_pending)])
+    return timeline
+
+
+def bench_loop(timeline, calls):
+    start = time.perf_counter()
+    for delay, callback, args in calls:
+        timeline.schedule_callback(delay, callback, *args)
+    return time.perf_counter() - start
+
+
+def bench_schedule_many(timeline, calls):
+    start = time.perf_counter()
+    timeline.schedule_many(calls)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each case, keeping the fastest")
+    args = parser.parse_args()
+
+    rand = random.Random(0)
+    calls = [(rand.uniform(0, 3600), _noop, (i,)) for i in range(args.batch_size)]
+    print("{:>10} {:>10} {:>16} {:>18}".format("batch", "pending", "loop ns/call", "schedule_many ns/call"))
+    for num_pending in (0, args.batch_size, args.batch_size * 10):
+        loop_elapsed = min(bench_loop(_make_timeline(num_pending), calls) for _ in range(args.repeat))
+        many_elapsed = min(bench_schedule_many(_make_timeline(num_pending), calls) for _ in range(args.repeat))
+        print("{:>10} {:>10} {:>16.0f} {:>18.0f}".format(
+            args.batch_size, num_pending, loop_elapsed / len(calls) * 1e9, many_elapsed / len(calls) * 1e9))
+
+
+if __name__ == "__main__":
+    main()
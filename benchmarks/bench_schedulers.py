@@ -0,0 +1,79 @@
+"""
+Compares the Timeline scheduler backends: schedules N callbacks with random delays on a frozen
+timeline, then fires all of them. Then, with N callbacks pending, re-arms a watchdog: schedules a
+callback, cancels it and sleeps until the next callback or for a millisecond.
+
+Usage: python benchmarks/bench_schedulers.py [--max-exponent 7]
+"""
+import argparse
+import random
+import time
+
+from flux.schedulers import HeapScheduler, TimingWheelScheduler
+from flux.timeline import Timeline
+
+SCHEDULERS = [
+    ("heap", HeapScheduler),
+    ("timing wheel", TimingWheelScheduler),
+]
+
+
+def _noop():
+    pass
+
+
+def bench(scheduler_factory, delays):
+    timeline = Timeline(scheduler=scheduler_factory())
+    timeline.freeze()
+    schedule_callback = timeline.schedule_callback
+
+    start = time.perf_counter()
+    for delay in delays:
+        schedule_callback(delay, _noop)
+    schedule_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    timeline.sleep(max(delays))
+    fire_elapsed = time.perf_counter() - start
+    assert not timeline._scheduled
+    return schedule_elapsed, fire_elapsed
+
+
+def bench_watchdog(scheduler_factory, delays, num_rearms=10000):
+    timeline = Timeline(scheduler=scheduler_factory())
+    timeline.freeze()
+    for delay in delays:
+        timeline.schedule_callback(delay, _noop)
+    timeline.sleep(0)
+
+    start = time.perf_counter()
+    for _ in range(num_rearms):
+        timeline.schedule_callback(1, _noop).cancel()
+        timeline.sleep_stop_first_scheduled(0.001)
+    return (time.perf_counter() - start) / num_rearms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--min-exponent", type=int, default=3)
+    parser.add_argument("--max-exponent", type=int, default=6)
+    parser.add_argument("--horizon", type=float, default=3600, help="maximal delay in seconds")
+    args = parser.parse_args()
+
+    print("{:>10} {:>14} {:>14} {:>14} {:>14}".format(
+        "timers", "scheduler", "schedule ns/op", "fire ns/op", "re-arm ns/op"))
+    for exponent in range(args.min_exponent, args.max_exponent + 1):
+        num_timers = 10 ** exponent
+        rand = random.Random(exponent)
+        delays = [rand.uniform(0, args.horizon) for _ in range(num_timers)]
+        # the watchdog is re-armed with the other callbacks far away
+        far_delays = [args.horizon + delay for delay in delays]
+        for name, factory in SCHEDULERS:
+            schedule_elapsed, fire_elapsed = bench(factory, delays)
+            print("{:>10} {:>14} {:>14.0f} {:>14.0f} {:>14.0f}".format(
+                num_timers, name, schedule_elapsed / num_timers * 1e9, fire_elapsed / num_timers * 1e9,
+                bench_watchdog(factory, far_delays) * 1e9))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Measures the number of sequence steps per second when running many concurrent sequences on one
+timeline: sleeping sequences, and pairs of sequences waking each other up through events.
+
+Usage: python benchmarks/bench_sequences.py [--sequences 100000] [--steps 10]
+"""
+import argparse
+import random
+import time
+
+from flux.sequence import Event, Sequence
+from flux.timeline import Timeline
+
+
+def _sleeper(rand, num_steps):
+    for _ in range(num_steps):
+        yield Sequence.sleep(rand.expovariate(1.0))
+
+
+def _ping_pong(my_event, other_event, num_steps):
+    for _ in range(num_steps):
+        other_event.set()
+        yield my_event
+        my_event.clear()
+
+
+def _measure(name, timeline, num_steps):
+    start = time.perf_counter()
+    timeline.run_events(float("inf"))
+    elapsed = time.perf_counter() - start
+    print("{:<12} {:>12.0f} steps/s".format(name + ":", num_steps / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sequences", type=int, default=100000)
+    parser.add_argument("--steps", type=int, default=10)
+    args = parser.parse_args()
+
+    rand = random.Random(0)
+    timeline = Timeline()
+    timeline.freeze()
+    for _ in range(args.sequences):
+        Sequence(_sleeper(rand, args.steps)).run(timeline)
+    _measure("sleep", timeline, args.sequences * args.steps)
+
+    timeline = Timeline()
+    timeline.freeze()
+    for _ in range(args.sequences // 2):
+        first, second = Event(), Event()
+        Sequence(_ping_pong(first, second, args.steps)).run(timeline)
+        Sequence(_ping_pong(second, first, args.steps)).run(timeline)
+    _measure("events", timeline, args.sequences * args.steps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Measures the per-call cost of SharedClockTimeline.time(), compared to a local Timeline.time() and
+time.time(), both with an idle clock and while another process keeps changing the time.
+
+Usage: python benchmarks/bench_shared_clock.py [--number N]
+"""
+import argparse
+import multiprocessing
+import time
+import timeit
+
+from flux.shared_timeline import SharedClockTimeline
+from flux.timeline import Timeline
+
+
+def _make_timeline(timeline_class, factor):
+    timeline = timeline_class()
+    timeline.set_time_factor(factor)
+    return timeline
+
+
+def _keep_sleeping(timeline, stop):
+    while not stop.is_set():
+        timeline.sleep(1)
+
+
+def _measure(name, func, number):
+    elapsed = min(timeit.repeat(func, number=number, repeat=5))
+    print("{:>24}: {:>6.1f} ns/call".format(name, elapsed / number * 1e9))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=1000000)
+    args = parser.parse_args()
+
+    _measure("time.time()", time.time, args.number)
+    for factor in (1, 0):
+        _measure("local, factor {}".format(factor), _make_timeline(Timeline, factor).time, args.number)
+        _measure("shared, factor {}".format(factor), _make_timeline(SharedClockTimeline, factor).time, args.number)
+
+    context = multiprocessing.get_context("fork")
+    timeline = _make_timeline(SharedClockTimeline, 0)
+    stop = context.Event()
+    writer = context.Process(target=_keep_sleeping, args=(timeline, stop))
+    writer.start()
+    try:
+        _measure("shared, with writer", timeline.time, args.number)
+    finally:
+        stop.set()
+        writer.join()
+
+
+if __name__ == "__main__":
+    main()
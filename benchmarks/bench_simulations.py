@@ -0,0 +1,43 @@
+"""
+Measures the throughput of run_simulations for increasing numbers of worker processes, with a
+CPU-bound scenario of clients re-arming random timers.
+
+Usage: python benchmarks/bench_simulations.py [--runs 32] [--events 100000] [--max-workers 4]
+"""
+import argparse
+import time
+
+from flux.simulation import run_simulations
+
+
+def _scenario(timeline, rand, num_clients, num_events):
+    remaining = [num_events]
+
+    def tick():
+        remaining[0] -= 1
+        if remaining[0] > 0:
+            timeline.schedule_callback(rand.expovariate(1.0), tick)
+
+    for _ in range(num_clients):
+        timeline.schedule_callback(rand.expovariate(1.0), tick)
+    timeline.run_events(num_events + num_clients)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=32)
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--max-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    param_sets = [{"num_clients": 100, "num_events": args.events}] * args.runs
+    for num_workers in range(1, args.max_workers + 1):
+        start = time.perf_counter()
+        num_events = sum(result.num_events for result in run_simulations(_scenario, param_sets, max_workers=num_workers))
+        elapsed = time.perf_counter() - start
+        print("{} workers: {:>6.2f} runs/s, {:>10.0f} events/s".format(
+            num_workers, args.runs / elapsed, num_events / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Measures the per-call cost of Timeline.time() and Timeline.time_ns() in their various states,
+compared to time.time() and time.time_ns(), as well as the cost of time.time() once patched by
+flux.time_patching.
+
+Usage: python benchmarks/bench_time.py
+"""
+import time
+import timeit
+
+from flux import current_timeline, time_patching
+from flux.timeline import Timeline
+
+
+def _make_timeline(factor=None):
+    timeline = Timeline()
+    if factor is not None:
+        timeline.set_time_factor(factor)
+    return timeline
+
+
+def main():
+    # until a timeline is modified, patching leaves the original functions in place
+    with time_patching.patched():
+        _print_timing("patched, none modified", "time.time()")
+    cases = [
+        ("time.time()", time.time),
+        ("unmodified", _make_timeline().time),
+        ("factor 1", _make_timeline(1).time),
+        ("factor 2.5", _make_timeline(2.5).time),
+        ("frozen", _make_timeline(0).time),
+        ("time.time_ns()", time.time_ns),
+        ("ns factor 1", _make_timeline(1).time_ns),
+        ("ns frozen", _make_timeline(0).time_ns),
+    ]
+    for name, func in cases:
+        _print_timing(name, func)
+    with time_patching.patched():
+        _print_timing("patched, unmodified", "time.time()")
+        current_timeline.get().freeze()
+        _print_timing("patched, frozen", "time.time()")
+
+
+def _print_timing(name, stmt):
+    number = 1000000
+    elapsed = min(timeit.repeat(stmt, number=number, repeat=5, globals={"time": time}))
+    print("{:>22}: {:>6.1f} ns/call".format(name, elapsed / number * 1e9))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 from .__version__ import __version__
 from .timeline import Timeline
+from .schedulers import HeapScheduler, TimingWheelScheduler
 from .gevent_timeline import GeventTimeline
+from .threadsafe_timeline import ThreadSafeTimeline
 from . import current_timeline
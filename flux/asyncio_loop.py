@@ -0,0 +1,97 @@
+import asyncio
+
+from . import current_timeline
+from .timeline import _to_ns
+
+_CLOCK_RESOLUTION = 1e-6
+
+
+class TimelineEventLoop(asyncio.SelectorEventLoop):
+
+    """
+    An asyncio event loop whose clock is the virtual time of a :class:`.Timeline` (the current
+    timeline by default). Whenever the loop would block waiting for a timer, the virtual time jumps
+    straight to that timer (or to the next callback scheduled on the timeline, if it is earlier).
+
+    I/O is still polled for real, waiting up to ``autojump_threshold`` real seconds before jumping
+    """
+
+    def __init__(self, timeline=None, autojump_threshold=0, selector=None):
+        super().__init__(selector)
+        if timeline is None:
+            timeline = current_timeline.get()
+        self._timeline = timeline
+        self._selector = _AutojumpSelector(self._selector, timeline, autojump_threshold)
+        # virtual time is an epoch timestamp, so the monotonic clock resolution gets lost in float rounding
+        self._clock_resolution = _CLOCK_RESOLUTION
+
+    def get_timeline(self):
+        return self._timeline
+
+    def time(self):
+        return self._timeline.time()
+
+
+class TimelineEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+
+    """
+    Event loop policy creating :class:`.TimelineEventLoop` loops, e.g. for returning from the
+    ``event_loop_policy`` fixture of pytest-asyncio
+    """
+
+    def __init__(self, timeline=None, autojump_threshold=0):
+        super().__init__()
+        self._timeline = timeline
+        self._autojump_threshold = autojump_threshold
+
+    def new_event_loop(self):
+        return TimelineEventLoop(self._timeline, self._autojump_threshold)
+
+
+def run(main, timeline=None, autojump_threshold=0):
+    """
+    Like :func:`asyncio.run`, but runs the coroutine on a :class:`.TimelineEventLoop`
+    """
+    loop = TimelineEventLoop(timeline, autojump_threshold)
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(main)
+    finally:
+        try:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+
+class _AutojumpSelector():
+
+    def __init__(self, selector, timeline, autojump_threshold):
+        super().__init__()
+        self._selector = selector
+        self._timeline = timeline
+        self._autojump_threshold = autojump_threshold
+
+    def __getattr__(self, attr):
+        return getattr(self._selector, attr)
+
+    def select(self, timeout=None):
+        if timeout is not None and timeout <= 0:
+            return self._selector.select(0)
+        poll_timeout = self._autojump_threshold
+        if timeout is not None:
+            poll_timeout = min(timeout, poll_timeout)
+        events = self._selector.select(poll_timeout)
+        if events:
+            return events
+        timeline = self._timeline
+        jump_time = timeline._scheduled.peek_time()
+        if timeout is not None:
+            timer_time = timeline.time_ns() + _to_ns(timeout)
+            if jump_time is None or timer_time < jump_time:
+                jump_time = timer_time
+        if jump_time is None:
+            # nothing to jump to, only I/O can wake us up
+            return self._selector.select(None)
+        timeline._run_until_ns(jump_time)
+        return []
@@ -1,18 +1,41 @@
+import contextlib as _contextlib
+import contextvars as _contextvars
 import datetime as _datetime
 from .timeline import Timeline
 
 _current = Timeline()
+_scoped = _contextvars.ContextVar("flux_current_timeline", default=None)
+# the context variable is only consulted once use() was called, sparing its cost otherwise
+_scoped_used = False
 
 def set(timeline):
     global _current
     _current = timeline
 
 def get():
+    if _scoped_used:
+        scoped = _scoped.get()
+        if scoped is not None:
+            return scoped
     return _current
 
+@_contextlib.contextmanager
+def use(timeline):
+    """
+    Makes ``timeline`` the current timeline within the block, for the current thread or asyncio
+    task only. Other threads and tasks keep using the timeline passed to :func:`set`
+    """
+    global _scoped_used
+    _scoped_used = True
+    token = _scoped.set(timeline)
+    try:
+        yield timeline
+    finally:
+        _scoped.reset(token)
+
 def _get_wrapper(method_name):
     def _wrapper(*args, **kwargs):
-        return getattr(_current, method_name)(*args, **kwargs)
+        return getattr(get() if _scoped_used else _current, method_name)(*args, **kwargs)
     _wrapper.__name__ = method_name
     return _wrapper
 
@@ -20,20 +43,46 @@ for _method_name in dir(Timeline):
     if not _method_name.startswith("_"):
         globals()[_method_name] = _get_wrapper(_method_name)
 
-class datetime(_datetime.datetime):
+# hot paths, spelled out to avoid the generic wrapper overhead
+def time():
+    if _scoped_used:
+        return get().time()
+    return _current.time()
+
+def sleep(seconds):
+    if _scoped_used:
+        return get().sleep(seconds)
+    return _current.sleep(seconds)
+
+class _RealTypeInstanceCheck(type):
+    # instances of the standard classes pass isinstance() checks against the classes below
+    def __instancecheck__(cls, instance):
+        return isinstance(instance, cls.__bases__[0])
+
+# the standard classes are kept aside, as flux.time_patching replaces them in the datetime module
+_real_datetime = _datetime.datetime
+_real_date = _datetime.date
+
+class datetime(_real_datetime, metaclass=_RealTypeInstanceCheck):
     @classmethod
-    def now(cls):
-        if not _current.is_modified():
-            return _datetime.datetime.now()
-        return _datetime.datetime.fromtimestamp(time())
+    def now(cls, tz=None):
+        timeline = get()
+        if not timeline.is_modified():
+            return _real_datetime.now(tz)
+        return _real_datetime.fromtimestamp(timeline.time(), tz)
 
     @classmethod
     def utcnow(cls):
-        if not _current.is_modified():
-            return _datetime.datetime.utcnow()
-        return _datetime.datetime.utcfromtimestamp(time())
+        timeline = get()
+        if not timeline.is_modified():
+            return _real_datetime.utcnow()
+        return _real_datetime.utcfromtimestamp(timeline.time())
+
+    @classmethod
+    def today(cls):
+        return cls.now()
 
-class date(_datetime.date):
+class date(_real_date, metaclass=_RealTypeInstanceCheck):
     @classmethod
     def today(cls):
         return datetime.now().date()
@@ -1,8 +1,9 @@
+from . import current_timeline
 from .timeline import Timeline
 
 class GeventTimeline(Timeline):
-    def sleep(self, seconds):
-        super().sleep(seconds)
+    def _sleep_ns(self, sleep_ns):
+        super()._sleep_ns(sleep_ns)
         self._real_sleep(0.0)
 
     def _real_sleep(self, seconds):
@@ -11,3 +12,172 @@ class GeventTimeline(Timeline):
             gevent.sleep(seconds)
         except ImportError:
             super()._real_sleep(seconds)
+
+
+def install_timeline_hub(timeline=None):
+    """
+    Replaces the gevent hub of the current thread with one whose timers -- sleeps, timeouts,
+    ``Event.wait(timeout)`` and so on -- run on the virtual time of ``timeline`` (the current
+    timeline by default). Whenever all greenlets are blocked, the virtual time jumps straight to
+    the next timer.
+
+    Should be called before spawning greenlets, as the previous hub is destroyed. Returns the new hub
+    """
+    import gevent
+    import gevent.hub
+
+    if timeline is None:
+        timeline = current_timeline.get()
+    gevent.get_hub().destroy(destroy_loop=True)
+    loop = _get_timeline_loop_class()()
+    loop._set_timeline(timeline)
+    hub = gevent.hub.Hub(loop=loop)
+    gevent.hub.set_hub(hub)
+    return hub
+
+
+def uninstall_timeline_hub():
+    """
+    Destroys the hub installed by :func:`.install_timeline_hub`, going back to real time timers
+    """
+    import gevent
+
+    gevent.get_hub().destroy(destroy_loop=True)
+
+
+_timeline_loop_class = None
+
+
+def _get_timeline_loop_class():
+    global _timeline_loop_class
+    if _timeline_loop_class is None:
+        import gevent
+
+        class TimelineLoop(gevent.config.loop):
+
+            def _set_timeline(self, timeline):
+                self._timeline = timeline
+                self._num_ref_timers = 0
+                self._idle = self.idle()
+                self._check = self.check()
+
+            def timer(self, after, repeat=0.0, ref=True, priority=None):
+                return _TimelineTimer(self, after, repeat, ref, priority)
+
+            def now(self):
+                return self._timeline.time()
+
+            def _timer_started(self, ref):
+                if ref:
+                    self._num_ref_timers += 1
+                    self._idle.ref = self._check.ref = True
+                if not self._idle.active:
+                    self._idle.ref = self._check.ref = self._num_ref_timers > 0
+                    self._idle.start(self._on_idle)
+                    self._check.start(self._timeline.trigger_past_callbacks)
+
+            def _timer_stopped(self, ref):
+                if ref:
+                    self._num_ref_timers -= 1
+                    if not self._num_ref_timers:
+                        self._idle.ref = self._check.ref = False
+
+            def _on_idle(self):
+                # nothing else is runnable, so jump to the next timer
+                timeline = self._timeline
+                next_time = timeline._scheduled.peek_time()
+                if next_time is None:
+                    self._idle.stop()
+                    self._check.stop()
+                    return
+                timeline._run_until_ns(max(next_time, timeline.time_ns()))
+
+        _timeline_loop_class = TimelineLoop
+    return _timeline_loop_class
+
+
+class _TimelineTimer():
+
+    """
+    Mimics the timer watchers of gevent loops, but is scheduled on the virtual timeline
+    """
+
+    def __init__(self, loop, after, repeat, ref, priority):
+        super().__init__()
+        self.loop = loop
+        self.after = after
+        self.repeat = repeat
+        self.priority = priority
+        self.callback = None
+        self.args = ()
+        self.pending = False
+        self._ref = ref
+        self._scheduled = None
+
+    @property
+    def active(self):
+        return self._scheduled is not None
+
+    @property
+    def at(self):
+        return self._scheduled.time if self._scheduled is not None else None
+
+    @property
+    def ref(self):
+        return self._ref
+
+    @ref.setter
+    def ref(self, ref):
+        if self.active and ref != self._ref:
+            self.loop._timer_stopped(self._ref)
+            self.loop._timer_started(ref)
+        self._ref = ref
+
+    def start(self, callback, *args, **kwargs):
+        # the 'update' keyword is meaningless on virtual time
+        self.stop()
+        self.callback = callback
+        self.args = args
+        self._schedule(self.after)
+
+    def again(self, callback, *args, **kwargs):
+        self.stop()
+        self.callback = callback
+        self.args = args
+        self._schedule(self.repeat or self.after)
+
+    def _schedule(self, delay):
+        self._scheduled = self.loop._timeline.schedule_callback(delay, self._on_expired)
+        self.loop._timer_started(self._ref)
+
+    def _on_expired(self):
+        # the callback may switch greenlets, so it is called from the hub rather than from the timeline
+        self._scheduled = None
+        self.loop._timer_stopped(self._ref)
+        self.pending = True
+        self.loop.run_callback(self._run_callback)
+        if self.repeat:
+            self._schedule(self.repeat)
+
+    def _run_callback(self):
+        if self.pending:
+            self.pending = False
+            self.callback(*self.args)
+
+    def stop(self):
+        self.pending = False
+        if self._scheduled is not None:
+            self._scheduled.cancel()
+            self._scheduled = None
+            self.loop._timer_stopped(self._ref)
+
+    def close(self):
+        self.stop()
+        self.callback = None
+        self.args = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -0,0 +1,294 @@
+import functools
+import marshal
+import os
+import sys
+# bound at import, as time_patching replaces the attribute of the time module
+from time import perf_counter
+
+# creation site of callbacks scheduled before profiling started, named like built-ins in pstats
+_UNKNOWN_SITE = ("~", 0, "<unknown>")
+
+
+class Histogram():
+
+    """
+    Distribution of durations in seconds, kept in power-of-two buckets of microseconds
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        # bucket i counts values below 2 ** i microseconds, and at least half of that
+        self.buckets = []
+
+    def record(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        bucket = int(value * 1000000).bit_length() if value > 0 else 0
+        buckets = self.buckets
+        if bucket >= len(buckets):
+            buckets.extend([0] * (bucket + 1 - len(buckets)))
+        buckets[bucket] += 1
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, percent):
+        """
+        Returns the upper bound of the bucket holding the given percentile, in seconds
+        """
+        if not self.count:
+            return None
+        threshold = self.count * percent / 100
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= threshold:
+                return min((1 << bucket) / 1000000, self.max)
+        return self.max  # pragma: no cover
+
+    def __repr__(self):
+        return "<Histogram ({} values, mean {})>".format(self.count, self.mean())
+
+
+class TimelineStats():
+
+    """
+    Scheduler statistics collected by :func:`.Timeline.enable_instrumentation`:
+
+    * ``num_scheduled`` and ``num_fired`` count the callbacks scheduled and called
+    * ``max_scheduled_size`` is the largest number of pending callbacks, and
+      ``scheduled_sizes`` lists ``(virtual time, number of pending callbacks)`` samples, taken every
+      ``size_sample_interval`` called callbacks
+    * ``lateness`` is a :class:`.Histogram` of how late callbacks were called, in real seconds,
+      while the time factor was positive
+    * ``callback_wall_time`` is a :class:`.Histogram` of the real time spent in callbacks
+    * ``profile`` is a :class:`.CallbackProfile` if callbacks are profiled, otherwise None
+    """
+
+    def __init__(self, timeline, size_sample_interval=1000, pre_dispatch=None, post_dispatch=None,
+                 profile_callbacks=False):
+        super().__init__()
+        self.num_scheduled = 0
+        self.num_fired = 0
+        self.max_scheduled_size = 0
+        self.scheduled_sizes = []
+        self.lateness = Histogram()
+        self.callback_wall_time = Histogram()
+        self.size_sample_interval = size_sample_interval
+        self.pre_dispatch = pre_dispatch
+        self.post_dispatch = post_dispatch
+        self.profile = CallbackProfile() if profile_callbacks else None
+        self._timeline = timeline
+        self._start_time = timeline.time()
+        self._start_wall_time = perf_counter()
+
+    def get_speedup(self):
+        """
+        Returns the ratio of virtual time to real time elapsed since the instrumentation was enabled
+        """
+        wall_time = perf_counter() - self._start_wall_time
+        if not wall_time:
+            return None
+        return (self._timeline.time() - self._start_time) / wall_time
+
+    def _record_call(self, item, lateness, wall_time):
+        self.num_fired += 1
+        if lateness is not None:
+            self.lateness.record(lateness)
+        self.callback_wall_time.record(wall_time)
+        if self.profile is not None:
+            self.profile._record_call(item, wall_time)
+        if self.num_fired % self.size_sample_interval == 0:
+            timeline = self._timeline
+            self.scheduled_sizes.append((timeline.time(), _get_num_pending(timeline._get_scheduler())))
+        if self.post_dispatch is not None:
+            self.post_dispatch(item, wall_time)
+
+    def __repr__(self):
+        return "<TimelineStats ({} scheduled, {} fired, {} pending at most)>".format(
+            self.num_scheduled, self.num_fired, self.max_scheduled_size)
+
+
+class CallSiteStats():
+
+    """
+    Calls of a callback scheduled from a given place: ``filename``, ``lineno`` and ``function``
+    locate the code scheduling the callback, ``callback_name`` is the qualified name of the
+    callback, and ``num_calls``, ``total_time`` and ``max_time`` aggregate the real time spent in it
+    """
+
+    def __init__(self, filename, lineno, function, callback_name):
+        super().__init__()
+        self.filename = filename
+        self.lineno = lineno
+        self.function = function
+        self.callback_name = callback_name
+        self.num_calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def __repr__(self):
+        return "<CallSiteStats {} scheduled at {}:{} ({} calls, {:.6f}s)>".format(
+            self.callback_name, self.filename, self.lineno, self.num_calls, self.total_time)
+
+
+class CallbackProfile():
+
+    """
+    Real time spent in callbacks, aggregated by the place they were scheduled from and their
+    qualified name. Like :class:`cProfile.Profile`, can be passed to :class:`pstats.Stats` or saved
+    with :func:`.dump_stats`, listing every call site as ``filename:lineno(callback name)``
+    """
+
+    def __init__(self):
+        super().__init__()
+        # pending item -> (creation site, callback name)
+        self._items = {}
+        self._prune_size = 1024
+        self._sites = {}
+        self.stats = {}
+
+    def get_call_sites(self):
+        """
+        Returns :class:`.CallSiteStats` for all call sites, by decreasing total time
+        """
+        return sorted(self._sites.values(), key=lambda site: site.total_time, reverse=True)
+
+    def create_stats(self):
+        # the pstats.Stats protocol
+        self.stats = {
+            (site.filename, site.lineno, site.callback_name): (
+                site.num_calls, site.num_calls, site.total_time, site.total_time, {})
+            for site in self._sites.values()}
+
+    def dump_stats(self, filename):
+        """
+        Writes the profile to ``filename`` in the format of :mod:`pstats`
+        """
+        self.create_stats()
+        with open(filename, "wb") as f:
+            marshal.dump(self.stats, f)
+
+    def write_collapsed(self, f):
+        """
+        Writes the profile to the file object ``f`` as collapsed stacks, one line per call site with
+        the total time in microseconds, as expected by flame graph tools
+        """
+        for site in self.get_call_sites():
+            f.write("{} ({}:{});{} {}\n".format(
+                site.function, os.path.basename(site.filename), site.lineno, site.callback_name,
+                round(site.total_time * 1000000)))
+
+    def _record_site(self, item):
+        items = self._items
+        previous = items.get(item)
+        # items pushed again keep their original site, e.g. intervals or sequences
+        site = previous[0] if previous is not None else _get_creation_site()
+        items[item] = (site, _get_callback_name(item._get_profiled_callback()))
+        if len(items) > self._prune_size:
+            # forgets cancelled items
+            for stale in [stale for stale in items if stale._seq is None]:
+                del items[stale]
+            self._prune_size = max(1024, 2 * len(items))
+
+    def _record_call(self, item, wall_time):
+        items = self._items
+        site, callback_name = items.get(item, (_UNKNOWN_SITE, None))
+        if callback_name is None:
+            callback_name = _get_callback_name(item._get_profiled_callback())
+        if item._seq is None:
+            items.pop(item, None)
+        key = site + (callback_name,)
+        stats = self._sites.get(key)
+        if stats is None:
+            stats = self._sites[key] = CallSiteStats(*key)
+        stats.num_calls += 1
+        stats.total_time += wall_time
+        if wall_time > stats.max_time:
+            stats.max_time = wall_time
+
+    def __repr__(self):
+        return "<CallbackProfile ({} call sites)>".format(len(self._sites))
+
+
+def _get_creation_site():
+    # the innermost frame outside of flux
+    frame = sys._getframe(1)  # pylint: disable=protected-access
+    while frame is not None and frame.f_globals.get("__name__", "").startswith("flux."):
+        frame = frame.f_back
+    if frame is None:
+        return _UNKNOWN_SITE  # pragma: no cover
+    code = frame.f_code
+    return (code.co_filename, frame.f_lineno, code.co_name)
+
+
+def _get_callback_name(callback):
+    while isinstance(callback, functools.partial):
+        callback = callback.func
+    name = getattr(callback, "__qualname__", None)
+    if name is None:
+        # callable objects are named after their class, as their repr usually holds their address
+        callback = type(callback)
+        name = callback.__qualname__
+    module = getattr(callback, "__module__", None)
+    if module is None:
+        return name
+    return "{}.{}".format(module, name)
+
+
+def _get_num_pending(scheduler):
+    # schedulers keep cancelled entries until they reach them or compact
+    return len(scheduler) - scheduler._num_cancelled
+
+
+class _InstrumentedScheduler():
+
+    """
+    Counts scheduled callbacks and tracks the size of a scheduler
+    """
+
+    def __init__(self, scheduler, stats):
+        super().__init__()
+        self._scheduler = scheduler
+        self._stats = stats
+
+    def __len__(self):
+        return len(self._scheduler)
+
+    def push(self, time, seq, item):
+        scheduler = self._scheduler
+        scheduler.push(time, seq, item)
+        stats = self._stats
+        if stats.profile is not None:
+            stats.profile._record_site(item)
+        stats.num_scheduled += 1
+        size = _get_num_pending(scheduler)
+        if size > stats.max_scheduled_size:
+            stats.max_scheduled_size = size
+
+    def push_many(self, entries):
+        scheduler = self._scheduler
+        scheduler.push_many(entries)
+        stats = self._stats
+        if stats.profile is not None:
+            for _, _, item in entries:
+                stats.profile._record_site(item)
+        stats.num_scheduled += len(entries)
+        stats.max_scheduled_size = max(stats.max_scheduled_size, _get_num_pending(scheduler))
+
+    def peek_time(self):
+        return self._scheduler.peek_time()
+
+    def pop_due(self, current_time):
+        return self._scheduler.pop_due(current_time)
+
+    def notify_cancelled(self, time):
+        self._scheduler.notify_cancelled(time)
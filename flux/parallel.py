@@ -0,0 +1,223 @@
+"""
+Runs a single simulation split into partitions, each on its own :class:`.Timeline` and process,
+synchronized conservatively with lookahead windows
+"""
+import functools
+import multiprocessing
+
+from .simulation import _create_frozen_timeline, _get_picklable_exception
+from .timeline import ScheduledItem, _to_ns
+
+
+class Partition():
+
+    """
+    The part of a simulation running in one process, as seen by its setup function. Callbacks are
+    scheduled on ``timeline`` as usual, and events affecting other partitions are sent with
+    :func:`.send`. The picklable ``result`` is reported back once the simulation ends
+    """
+
+    def __init__(self, name, names, timeline, lookahead_ns):
+        super().__init__()
+        self.name = name
+        self.timeline = timeline
+        self.result = None
+        self._names = names
+        self._lookahead_ns = lookahead_ns
+        self._outbox = []
+        self._num_sent = 0
+        self._num_received = 0
+
+    def send(self, target, delay, handler, *args):
+        """
+        Calls ``handler(partition, *args)`` in the ``target`` partition, ``delay`` seconds of virtual
+        time from now. The delay cannot be shorter than the lookahead of the simulation, which is
+        what lets partitions run ahead of each other safely. ``handler`` and ``args`` must be
+        picklable
+        """
+        if target not in self._names:
+            raise ValueError("Unknown partition: {!r}".format(target))
+        delay_ns = _to_ns(delay)
+        if delay_ns < self._lookahead_ns:
+            raise ValueError("Cannot send messages with a delay shorter than the lookahead ({} < {})".format(
+                delay, self._lookahead_ns / 1e9))
+        self._outbox.append((self.timeline.time_ns() + delay_ns, self.name, self._num_sent, target, handler, args))
+        self._num_sent += 1
+
+    def _advance(self, end_time, messages):
+        # messages are ordered by time, then by sender, so that same-time deliveries are deterministic
+        timeline = self.timeline
+        for message_time, _, _, _, handler, args in sorted(messages, key=_get_message_order):
+            timeline._push_scheduled(ScheduledItem(timeline, functools.partial(handler, self, *args)), message_time)
+        self._num_received += len(messages)
+        timeline._run_until_ns(end_time)
+        return self._flush()
+
+    def _flush(self):
+        # the messages sent so far, and the time of the next pending event
+        outbox, self._outbox = self._outbox, []
+        return outbox, self.timeline._scheduled.peek_time()
+
+    def _finish(self, end_time):
+        self.timeline.set_time_ns(end_time)
+        return PartitionResult(self.name, self.result, self.timeline._num_events, self._num_sent, self._num_received)
+
+
+def _get_message_order(message):
+    return message[:3]
+
+
+class PartitionResult():
+
+    """
+    Outcome and statistics of a partition run by :func:`.run_partitioned`: the ``result`` set by the
+    partition, the number of callbacks it called (``num_events``), and the number of messages it
+    sent and received
+    """
+
+    def __init__(self, name, value, num_events, num_sent, num_received):
+        super().__init__()
+        self.name = name
+        self.value = value
+        self.num_events = num_events
+        self.num_sent = num_sent
+        self.num_received = num_received
+
+    def __repr__(self):
+        return "<PartitionResult {!r} ({} events, {} sent, {} received)>".format(
+            self.name, self.num_events, self.num_sent, self.num_received)
+
+
+def run_partitioned(partitions, lookahead, until, start_time=0, processes=True):
+    """
+    Runs a simulation made of several partitions until the virtual time ``until``. ``partitions``
+    maps partition names to setup functions, each called as ``setup(partition)`` with a
+    :class:`.Partition` whose frozen timeline starts at ``start_time``.
+
+    Partitions advance in windows: every window ends ``lookahead`` seconds after the earliest
+    pending event of the whole simulation, so that no message sent during the window can arrive
+    before its end. Partitions run their windows concurrently, each in its own process unless
+    ``processes`` is False, and exchange messages between windows. Errors raised in partitions
+    stop the simulation and are raised here.
+
+    Returns a dict mapping partition names to :class:`.PartitionResult`
+    """
+    lookahead_ns = _to_ns(lookahead)
+    if lookahead_ns <= 0:
+        raise ValueError("Lookahead must be positive")
+    until_ns = _to_ns(until)
+    names = frozenset(partitions)
+    handle_class = _ProcessPartitionHandle if processes else _LocalPartitionHandle
+    handles = {}
+    try:
+        for name, setup in partitions.items():
+            handles[name] = handle_class(name, names, setup, lookahead_ns, _to_ns(start_time))
+        # messages sent by setup functions are delivered in the first window
+        next_times = {}
+        inboxes = {name: [] for name in handles}
+        for name, handle in handles.items():
+            outbox, next_times[name] = handle.wait()
+            for message in outbox:
+                inboxes[message[3]].append(message)
+        while True:
+            pending_times = [next_time for next_time in next_times.values() if next_time is not None]
+            pending_times.extend(message[0] for inbox in inboxes.values() for message in inbox)
+            if not pending_times or min(pending_times) > until_ns:
+                break
+            # events strictly before the end of the window cannot be affected by other partitions
+            end_time = min(min(pending_times) + lookahead_ns - 1, until_ns)
+            advanced = [name for name, handle in handles.items()
+                        if inboxes[name] or (next_times[name] is not None and next_times[name] <= end_time)]
+            for name in advanced:
+                handles[name].start("advance", end_time, inboxes[name])
+                inboxes[name] = []
+            for name in advanced:
+                outbox, next_times[name] = handles[name].wait()
+                for message in outbox:
+                    inboxes[message[3]].append(message)
+        for handle in handles.values():
+            handle.start("finish", until_ns)
+        return {name: handle.wait() for name, handle in handles.items()}
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+
+class _LocalPartitionHandle():
+
+    def __init__(self, name, names, setup, lookahead_ns, start_time):
+        super().__init__()
+        self._partition = _create_partition(name, names, setup, lookahead_ns, start_time)
+        self._returned = self._partition._flush()
+
+    def start(self, command, *args):
+        if command == "advance":
+            self._returned = self._partition._advance(*args)
+        else:
+            self._returned = self._partition._finish(*args)
+
+    def wait(self):
+        return self._returned
+
+    def close(self):
+        pass
+
+
+class _ProcessPartitionHandle():
+
+    def __init__(self, name, names, setup, lookahead_ns, start_time):
+        super().__init__()
+        self._connection, child_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_run_partition, args=(child_connection, name, names, setup, lookahead_ns, start_time), daemon=True)
+        self._process.start()
+        child_connection.close()
+
+    def start(self, command, *args):
+        self._connection.send((command, args))
+
+    def wait(self):
+        status, returned = self._connection.recv()
+        if status == "error":
+            raise returned
+        return returned
+
+    def close(self):
+        try:
+            # partitions forked later hold a copy of our end of the pipe, so closing it is not enough
+            self._connection.send(("stop", ()))
+        except OSError:
+            pass
+        self._connection.close()
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+
+
+def _create_partition(name, names, setup, lookahead_ns, start_time):
+    partition = Partition(name, names, _create_frozen_timeline(start_time), lookahead_ns)
+    setup(partition)
+    return partition
+
+
+def _run_partition(connection, name, names, setup, lookahead_ns, start_time):
+    try:
+        try:
+            partition = _create_partition(name, names, setup, lookahead_ns, start_time)
+            connection.send(("ok", partition._flush()))
+            while True:
+                command, args = connection.recv()
+                if command == "advance":
+                    connection.send(("ok", partition._advance(*args)))
+                elif command == "finish":
+                    connection.send(("ok", partition._finish(*args)))
+                    return
+                else:
+                    return
+        except Exception as e:  # pylint: disable=broad-except
+            connection.send(("error", _get_picklable_exception(e)))
+    except (EOFError, BrokenPipeError):
+        # the coordinator is gone
+        pass
+    finally:
+        connection.close()
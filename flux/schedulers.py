@@ -0,0 +1,349 @@
+import heapq
+
+_COMPACT_MIN_CANCELLED = 64
+
+
+class Scheduler():
+
+    """
+    Base class for the pending callback containers used by :class:`.Timeline`.
+
+    Entries are ``(time, seq, item)`` tuples, where ``time`` is an integer number of nanoseconds
+    and ``seq`` is unique and increasing. An entry is stale (cancelled or rescheduled) once
+    ``item._seq`` no longer equals its ``seq``. Stale entries are dropped lazily, and the container
+    is compacted once most of it is stale
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._num_cancelled = 0
+
+    def __len__(self):
+        raise NotImplementedError()  # pragma: no cover
+
+    def push(self, time, seq, item):
+        raise NotImplementedError()  # pragma: no cover
+
+    def push_many(self, entries):
+        for entry in entries:
+            self.push(*entry)
+
+    def peek_time(self):
+        """
+        Returns the time of the earliest pending entry, or None if there are none
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+    def pop_due(self, current_time):
+        """
+        Removes and returns the earliest pending entry if it is due by ``current_time``, otherwise returns None
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+    def notify_cancelled(self, time):
+        """
+        Called when the entry pushed for ``time`` is cancelled, making it stale
+        """
+        self._num_cancelled += 1
+        if self._num_cancelled >= _COMPACT_MIN_CANCELLED and self._num_cancelled * 2 > len(self):
+            self._compact()
+            self._num_cancelled = 0
+
+    def _compact(self):
+        raise NotImplementedError()  # pragma: no cover
+
+
+def _is_stale(entry):
+    return entry[2]._seq != entry[1]
+
+
+class HeapScheduler(Scheduler):
+
+    """
+    Keeps pending callbacks in a binary heap. This is the default scheduler
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._heap = []
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, time, seq, item):
+        heapq.heappush(self._heap, (time, seq, item))
+
+    def push_many(self, entries):
+        heap = self._heap
+        # re-heapifying is linear in the whole heap, while random pushes sift up only a few levels
+        # on average, so heapify only pays off for batches dominating the heap
+        if len(entries) >= 2 * len(heap):
+            heap.extend(entries)
+            heapq.heapify(heap)
+        else:
+            for entry in entries:
+                heapq.heappush(heap, entry)
+
+    def peek_time(self):
+        heap = self._heap
+        while heap and heap[0][2]._seq != heap[0][1]:
+            heapq.heappop(heap)
+            self._num_cancelled -= 1
+        if not heap:
+            return None
+        return heap[0][0]
+
+    def pop_due(self, current_time):
+        heap = self._heap
+        while heap and heap[0][0] <= current_time:
+            entry = heapq.heappop(heap)
+            if entry[2]._seq == entry[1]:
+                return entry
+            self._num_cancelled -= 1
+        return None
+
+    def _compact(self):
+        self._heap[:] = [entry for entry in self._heap if not _is_stale(entry)]
+        heapq.heapify(self._heap)
+
+
+class TimingWheelScheduler(Scheduler):
+
+    """
+    Keeps pending callbacks in a hierarchical timing wheel, making insertions O(1) and expiry
+    amortized O(1) regardless of the number of pending callbacks.
+
+    Time is divided into ticks of ``resolution`` seconds. Each of the ``num_levels`` wheels has
+    ``2 ** slot_bits`` slots, every slot of a level spanning a whole revolution of the level below
+    it. Entries further away than the outermost wheel wait in an overflow heap. Entries falling on
+    the current tick are kept in a small heap, so callbacks fire in exactly the same order as with
+    :class:`.HeapScheduler`
+    """
+
+    def __init__(self, resolution=0.001, slot_bits=8, num_levels=4):
+        super().__init__()
+        if resolution <= 0:
+            raise ValueError("Timing wheel resolution must be positive")
+        self._resolution = max(1, round(resolution * 1000000000))
+        self._slot_bits = slot_bits
+        self._slot_mask = (1 << slot_bits) - 1
+        self._num_levels = num_levels
+        self._wheels = [[[] for _ in range(1 << slot_bits)] for _ in range(num_levels)]
+        self._occupied = [0] * num_levels
+        # the earliest entry of every slot, or None if unknown
+        self._slot_min_entries = [[None] * (1 << slot_bits) for _ in range(num_levels)]
+        self._overflow = []
+        self._ready = []
+        # unknown until the first dispatch, before which entries wait in a plain list
+        self._current_tick = None
+        self._pending = []
+        self._size = 0
+        # the time of the earliest entry outside the ready heap, once peeked
+        self._next_time = None
+
+    def __len__(self):
+        return self._size
+
+    def _get_tick(self, time):
+        return time // self._resolution
+
+    def push(self, time, seq, item):
+        self._size += 1
+        tick = self._get_tick(time)
+        if self._current_tick is None:
+            self._pending.append((time, seq, item))
+        elif tick <= self._current_tick:
+            heapq.heappush(self._ready, (time, seq, item))
+            return
+        else:
+            self._insert(tick, (time, seq, item))
+        if self._next_time is not None and time < self._next_time:
+            self._next_time = time
+
+    def _start(self, current_time):
+        # the current tick starts at the first dispatched time, unless entries are due before it
+        pending, self._pending = self._pending, []
+        tick = min(self._get_tick(entry[0]) for entry in pending)
+        if current_time < float("inf"):
+            tick = min(tick, self._get_tick(current_time))
+        self._current_tick = tick
+        self._next_time = None
+        get_tick = self._get_tick
+        for entry in pending:
+            self._insert(get_tick(entry[0]), entry)
+
+    def _insert(self, tick, entry):
+        current_tick = self._current_tick
+        if tick <= current_tick:
+            heapq.heappush(self._ready, entry)
+            return
+        # the level is determined by the highest bit in which the tick differs from the current one
+        level = ((tick ^ current_tick).bit_length() - 1) // self._slot_bits
+        if level >= self._num_levels:
+            heapq.heappush(self._overflow, (tick, entry))
+            return
+        slot = (tick >> (level * self._slot_bits)) & self._slot_mask
+        entries = self._wheels[level][slot]
+        min_entries = self._slot_min_entries[level]
+        # stale entries are moved along with the live ones, but must never become the minimum
+        if not entries:
+            min_entries[slot] = None if _is_stale(entry) else entry
+        elif min_entries[slot] is not None and entry[0] < min_entries[slot][0] and not _is_stale(entry):
+            min_entries[slot] = entry
+        entries.append(entry)
+        self._occupied[level] |= 1 << slot
+
+    def _advance(self, current_time):
+        """
+        Moves the current tick forward to the next tick holding entries, filling the ready heap,
+        unless no entry can be due by ``current_time``. The current tick never passes the time
+        being dispatched, so that entries pushed later keep landing in the wheels
+        """
+        if self._current_tick is None:
+            if not self._pending:
+                return
+            self._start(current_time)
+        resolution = self._resolution
+        while not self._ready:
+            shift = 0
+            for level in range(self._num_levels):
+                index = (self._current_tick >> shift) & self._slot_mask
+                following = self._occupied[level] >> (index + 1)
+                if following:
+                    slot = index + (following & -following).bit_length()
+                    next_shift = shift + self._slot_bits
+                    slot_tick = ((self._current_tick >> next_shift) << next_shift) | (slot << shift)
+                    if slot_tick * resolution > current_time:
+                        return
+                    self._cascade(level, slot, slot_tick)
+                    break
+                shift += self._slot_bits
+            else:
+                if not self._overflow or self._overflow[0][0] * resolution > current_time:
+                    return
+                self._next_time = None
+                self._current_tick = self._overflow[0][0]
+                top_shift = self._slot_bits * self._num_levels
+                top = self._current_tick >> top_shift
+                while self._overflow and self._overflow[0][0] >> top_shift == top:
+                    tick, entry = heapq.heappop(self._overflow)
+                    self._insert(tick, entry)
+
+    def _cascade(self, level, slot, slot_tick):
+        entries = self._wheels[level][slot]
+        self._wheels[level][slot] = []
+        self._occupied[level] &= ~(1 << slot)
+        self._slot_min_entries[level][slot] = None
+        self._next_time = None
+        self._current_tick = slot_tick
+        if level == 0:
+            # all entries share the current tick
+            self._ready[:] = entries
+            heapq.heapify(self._ready)
+            return
+        get_tick = self._get_tick
+        for entry in entries:
+            self._insert(get_tick(entry[0]), entry)
+
+    def _drop_stale_ready(self, current_time):
+        ready = self._ready
+        while True:
+            if not ready:
+                self._advance(current_time)
+                if not ready:
+                    return False
+            if ready[0][2]._seq == ready[0][1]:
+                return True
+            heapq.heappop(ready)
+            self._size -= 1
+            self._num_cancelled -= 1
+
+    def _find_next_time(self):
+        """
+        Returns the time of the earliest entry outside the ready heap, without moving the current
+        tick. The earliest entries are in the first occupied slot of the innermost level having
+        one, or else at the top of the overflow heap. The earliest entry of a slot is kept for as
+        long as it is live, so that cancelling other entries does not cost a scan of the slot
+        """
+        if self._current_tick is None:
+            live = [entry for entry in self._pending if not _is_stale(entry)]
+            self._size -= len(self._pending) - len(live)
+            self._num_cancelled -= len(self._pending) - len(live)
+            self._pending = live
+            return min(live)[0] if live else None
+        shift = 0
+        for level in range(self._num_levels):
+            index = (self._current_tick >> shift) & self._slot_mask
+            following = self._occupied[level] >> (index + 1)
+            min_entries = self._slot_min_entries[level]
+            while following:
+                slot = index + (following & -following).bit_length()
+                min_entry = min_entries[slot]
+                if min_entry is not None and not _is_stale(min_entry):
+                    return min_entry[0]
+                entries = self._wheels[level][slot]
+                live = [entry for entry in entries if not _is_stale(entry)]
+                if live:
+                    if len(live) < len(entries):
+                        self._wheels[level][slot] = live
+                        self._size -= len(entries) - len(live)
+                        self._num_cancelled -= len(entries) - len(live)
+                    min_entries[slot] = min(live)
+                    return min_entries[slot][0]
+                self._wheels[level][slot] = []
+                min_entries[slot] = None
+                self._occupied[level] &= ~(1 << slot)
+                self._size -= len(entries)
+                self._num_cancelled -= len(entries)
+                following &= following - 1
+            shift += self._slot_bits
+        overflow = self._overflow
+        while overflow and _is_stale(overflow[0][1]):
+            heapq.heappop(overflow)
+            self._size -= 1
+            self._num_cancelled -= 1
+        if not overflow:
+            return None
+        return overflow[0][1][0]
+
+    def peek_time(self):
+        ready = self._ready
+        while ready and ready[0][2]._seq != ready[0][1]:
+            heapq.heappop(ready)
+            self._size -= 1
+            self._num_cancelled -= 1
+        if ready:
+            return ready[0][0]
+        # cached until entries are moved, cancelled or pushed earlier
+        if self._next_time is None:
+            self._next_time = self._find_next_time()
+        return self._next_time
+
+    def pop_due(self, current_time):
+        if not self._drop_stale_ready(current_time) or self._ready[0][0] > current_time:
+            return None
+        self._size -= 1
+        return heapq.heappop(self._ready)
+
+    def notify_cancelled(self, time):
+        if self._next_time is not None and time <= self._next_time:
+            self._next_time = None
+        super().notify_cancelled(time)
+
+    def _compact(self):
+        self._next_time = None
+        for min_entries in self._slot_min_entries:
+            min_entries[:] = [None] * len(min_entries)
+        self._ready[:] = [entry for entry in self._ready if not _is_stale(entry)]
+        heapq.heapify(self._ready)
+        self._pending[:] = [entry for entry in self._pending if not _is_stale(entry)]
+        for level, wheel in enumerate(self._wheels):
+            for slot, entries in enumerate(wheel):
+                if entries:
+                    entries[:] = [entry for entry in entries if not _is_stale(entry)]
+                    if not entries:
+                        self._occupied[level] &= ~(1 << slot)
+        self._overflow[:] = [(tick, entry) for tick, entry in self._overflow if not _is_stale(entry)]
+        heapq.heapify(self._overflow)
+        self._size = len(self._ready) + len(self._pending) + len(self._overflow) + sum(
+            len(entries) for wheel in self._wheels for entries in wheel)
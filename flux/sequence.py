@@ -1,36 +1,247 @@
+import copy
+
+from .timeline import CheckpointError, ScheduledItem, _to_ns
+
+
 class Sequence():
 
+    """
+    A cooperative task running on a :class:`.Timeline`. Sequences are generators -- either returned
+    by an overridden ``_run``, or passed to the constructor -- yielding what they wait for:
+
+    * ``Sequence.sleep(seconds)`` resumes the sequence after ``seconds`` of virtual time
+    * an :class:`.Event` resumes it once the event is set
+    * another sequence resumes it once that sequence finishes, starting it first if needed, and
+      sends back its return value or raises its error there. Errors of sequences nobody joined
+      are raised from the timeline instead
+    * ``Sequence.wait(target, timeout)`` waits for an event or a sequence for at most ``timeout``
+      seconds, sending back whether it happened in time
+
+    Every sequence keeps a single scheduled item, which is re-armed on every step
+    """
+
     class sleep():
 
         def __init__(self, seconds):
             super().__init__()
             self.seconds = seconds
+
+    class wait():
+
+        def __init__(self, target, timeout=None):
+            super().__init__()
+            self.target = target
+            self.timeout = timeout
+
+    # class defaults, so that subclasses not calling super().__init__() still work
     _running = False
+    _finished = False
+    _generator = None
+    _timeline = None
+    _item = None
+    _waiting_on = None
+    _waiting_for_timeout = False
+    _joiners = None
+    _result = None
+    _exception = None
+    _resume_value = None
+    _resume_exception = None
+
+    def __init__(self, generator=None):
+        super().__init__()
+        self._generator = generator
 
     def run(self, timeline):
         self._running = True
+        self._timeline = timeline
+        self._item = _SequenceItem(timeline, self._resume)
         generator = self._run()
-        self._tick(generator, timeline)
+        self._generator = generator
+        self._step(None, None)
 
     def is_running(self):
         return self._running
 
+    def is_finished(self):
+        """
+        Returns whether the sequence returned, raised or was stopped
+        """
+        return self._finished
+
+    def get_result(self):
+        """
+        Returns the value returned by the sequence
+        """
+        return self._result
+
     def stop(self):
         self._running = False
+        if self._item is not None:
+            self._item.cancel()
+        self._stop_waiting()
+        if not self._finished:
+            self._finish(None, None)
+
+    def __deepcopy__(self, memo):
+        # used by Timeline.checkpoint
+        if self._generator is not None:
+            raise CheckpointError("Cannot capture {!r}, as running generators cannot be copied".format(self))
+        copied = object.__new__(type(self))
+        memo[id(self)] = copied
+        copied.__dict__.update(copy.deepcopy(self.__dict__, memo))
+        return copied
 
     def _run(self):
-        raise NotImplementedError()  # pragma: no cover
+        if self._generator is None:
+            raise NotImplementedError()  # pragma: no cover
+        return self._generator
 
-    def _tick(self, generator, timeline):
-        if not self.is_running() or generator is None:
-            return
-        try:
-            action = next(generator)
-        except StopIteration:
-            self._running = False
+    def _resume(self):
+        # called by the timeline, either for a due wake up or for a timeout
+        if self._waiting_for_timeout:
+            self._stop_waiting()
+            self._resume_value = False
+        value, exception = self._resume_value, self._resume_exception
+        self._resume_value = self._resume_exception = None
+        self._step(value, exception)
+
+    def _step(self, value, exception):
+        generator = self._generator
+        while self._running and generator is not None:
+            try:
+                if exception is not None:
+                    action = generator.throw(exception)
+                else:
+                    action = generator.send(value)
+            except StopIteration as e:
+                self._running = False
+                self._finish(e.value, None)
+                return
+            except BaseException as e:
+                self._running = False
+                # errors handed to a joining sequence are its to handle, rather than the timeline's
+                if not self._finish(None, e) or not isinstance(e, Exception):
+                    raise
+                return
+            exception = None
+            if not self._running:
+                # stopped from within the generator
+                return
+            if isinstance(action, self.sleep):
+                self._schedule_resume(action.seconds)
+                return
+            if isinstance(action, self.wait):
+                target, timeout = action.target, action.timeout
+            else:
+                target, timeout = action, None
+            if isinstance(target, Event):
+                if target._is_set:
+                    value = True
+                    continue
+            elif isinstance(target, Sequence):
+                if target._finished:
+                    value, exception = self._get_join_outcome(target, action)
+                    continue
+                self._wait_on(target, timeout, action is not target)
+                if target._item is None:
+                    # sub-sequence, which wakes us up even if it finishes right away
+                    target.run(self._timeline)
+                return
+            else:
+                raise NotImplementedError()  # pragma: no cover
+            self._wait_on(target, timeout, action is not target)
             return
-        if isinstance(action, self.sleep):
-            timeline.schedule_callback(
-                action.seconds, self._tick, generator, timeline)
-        else:
-            raise NotImplementedError()  # pragma: no cover
+
+    def _get_join_outcome(self, target, action):
+        if action is not target:
+            return True, None
+        return target._result, target._exception
+
+    def _wait_on(self, target, timeout, is_wait):
+        if timeout is not None:
+            self._schedule_resume(timeout)
+            self._waiting_for_timeout = True
+        if target._joiners is None:
+            target._joiners = {}
+        target._joiners[self] = is_wait
+        self._waiting_on = target
+
+    def _schedule_resume(self, seconds):
+        if seconds < 0:
+            raise ValueError("Cannot schedule negative delays")
+        timeline = self._timeline
+        timeline._push_scheduled(self._item, timeline.time_ns() + _to_ns(seconds))
+
+    def _stop_waiting(self):
+        target = self._waiting_on
+        if target is not None:
+            target._joiners.pop(self, None)
+            self._waiting_on = None
+        self._waiting_for_timeout = False
+
+    def _wake(self, value, exception):
+        # resumes a waiting sequence at the current virtual time, from the timeline
+        self._waiting_on = None
+        self._waiting_for_timeout = False
+        self._resume_value = value
+        self._resume_exception = exception
+        timeline = self._timeline
+        item = self._item
+        timeline._cancel_scheduled(item)
+        timeline._push_scheduled(item, timeline.time_ns())
+
+    def _finish(self, result, exception):
+        # returns whether a joining sequence was handed the result
+        self._finished = True
+        self._result = result
+        self._exception = exception
+        self._generator = None
+        joiners = self._joiners
+        joined = False
+        if joiners:
+            self._joiners = None
+            for joiner, is_wait in joiners.items():
+                if is_wait:
+                    joiner._wake(True, None)
+                else:
+                    joiner._wake(result, exception)
+                    joined = True
+        return joined
+
+
+class _SequenceItem(ScheduledItem):
+
+    __slots__ = ()
+
+    def _get_profiled_callback(self):
+        # profiles name the generator rather than Sequence._resume
+        generator = self.callback.__self__._generator
+        return generator if generator is not None else self.callback
+
+
+class Event():
+
+    """
+    An event sequences can wait for, by yielding it or ``Sequence.wait(event, timeout)``. Setting
+    it resumes all waiting sequences at the current virtual time
+    """
+
+    _joiners = None
+
+    def __init__(self):
+        super().__init__()
+        self._is_set = False
+
+    def is_set(self):
+        return self._is_set
+
+    def set(self):
+        self._is_set = True
+        joiners = self._joiners
+        if joiners:
+            self._joiners = None
+            for joiner in joiners:
+                joiner._wake(True, None)
+
+    def clear(self):
+        self._is_set = False
@@ -0,0 +1,134 @@
+import mmap
+import multiprocessing
+import struct
+
+from .timeline import Timeline, TimeCorrection, _NS_PER_SECOND, _mark_modified
+
+# the sequence number is odd while the clock is being written
+_SEQ = struct.Struct("=Q")
+# (sequence, is modified, virtual base ns, real base, time factor, monotonic adjustment)
+_CLOCK = struct.Struct("=Qqqddq")
+
+
+class SharedClockTimeline(Timeline):
+
+    """
+    A :class:`.Timeline` whose clock -- the virtual time, the time factor and the monotonic
+    adjustment -- lives in a shared memory segment, so that processes forked after its creation
+    all see the same virtual time. Changing the time or the time factor in any process affects all
+    of them.
+
+    The segment is guarded by a seqlock: writers are serialized by a process-shared lock, while
+    readers only compare a sequence number with the one they last loaded, and reload the clock
+    when it changed. Reading the time therefore never blocks or involves IPC.
+
+    Only the clock is shared. Scheduled callbacks remain local to the process scheduling them
+    """
+
+    def __init__(self, start_time=None, scheduler=None):
+        self._shared = mmap.mmap(-1, _CLOCK.size)
+        # the sequence number, readable without unpacking
+        self._shared_seq_view = memoryview(self._shared)[:_SEQ.size].cast("Q")
+        self._shared_seq = 0
+        self._local_time_factor = 1
+        self._write_lock = multiprocessing.RLock()
+        super().__init__(start_time=start_time, scheduler=scheduler)
+        # other processes can modify the clock without this one reading it
+        _mark_modified()
+
+    def _sync_clock(self):
+        if self._shared_seq_view[0] != self._shared_seq:
+            self._load_clock()
+
+    @property
+    def _time_factor(self):
+        # read by sleeps, the dispatcher and lateness before they read the time
+        self._sync_clock()
+        return self._local_time_factor
+
+    @_time_factor.setter
+    def _time_factor(self, factor):
+        self._local_time_factor = factor
+
+    def _load_clock(self):
+        shared = self._shared
+        while True:
+            seq, modified, virtual_base, real_base, factor, monotonic_adjustment = _CLOCK.unpack_from(shared)
+            if not seq & 1 and self._shared_seq_view[0] == seq:
+                break
+        if modified:
+            super()._set_time_correction(TimeCorrection(virtual_base, real_base, time_factor=factor))
+        else:
+            self._time_correction = self._clock = None
+        self._local_time_factor = factor
+        self._monotonic_adjustment = monotonic_adjustment
+        self._shared_seq = seq
+
+    def _publish_clock(self):
+        shared = self._shared
+        seq_view = self._shared_seq_view
+        seq = seq_view[0]
+        seq_view[0] = seq + 1
+        clock = self._clock
+        if clock is None:
+            _CLOCK.pack_into(shared, 0, seq + 1, 0, 0, 0, self._local_time_factor, self._monotonic_adjustment)
+        else:
+            virtual_base, _, real_base, factor = clock
+            _CLOCK.pack_into(shared, 0, seq + 1, 1, virtual_base, real_base, factor, self._monotonic_adjustment)
+        seq_view[0] = seq + 2
+        self._shared_seq = seq + 2
+
+    def _set_time_correction(self, correction):
+        super()._set_time_correction(correction)
+        self._publish_clock()
+
+    def is_modified(self):
+        self._sync_clock()
+        return super().is_modified()
+
+    def set_time_factor(self, factor):
+        with self._write_lock:
+            self._sync_clock()
+            super().set_time_factor(factor)
+
+    def set_time_ns(self, time_ns, allow_backwards=False):
+        with self._write_lock:
+            self._sync_clock()
+            super().set_time_ns(time_ns, allow_backwards)
+
+    def restore(self, checkpoint):
+        with self._write_lock:
+            super().restore(checkpoint)
+            self._publish_clock()
+
+    def time(self):
+        # inlined, as this is the hot path of every process sharing the clock
+        if self._shared_seq_view[0] != self._shared_seq:
+            self._load_clock()
+        forced_time = self._forced_time
+        if forced_time is not None:
+            return forced_time / _NS_PER_SECOND
+        clock = self._clock
+        if clock is None:
+            return self._real_time()
+        _, virtual_base, real_base, factor = clock
+        if not factor:
+            return virtual_base
+        return virtual_base + (self._real_time() - real_base) * factor
+
+    def time_ns(self):
+        if self._shared_seq_view[0] != self._shared_seq:
+            self._load_clock()
+        return super().time_ns()
+
+    def _get_clock_time_ns(self):
+        self._sync_clock()
+        return super()._get_clock_time_ns()
+
+    def monotonic_ns(self):
+        self._sync_clock()
+        return super().monotonic_ns()
+
+    def monotonic(self):
+        self._sync_clock()
+        return super().monotonic()
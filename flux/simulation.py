@@ -0,0 +1,121 @@
+"""
+Runs many independent simulations, each on a fresh :class:`.Timeline`, across a process pool
+"""
+import concurrent.futures
+import pickle
+import random
+from time import perf_counter
+
+from .timeline import Timeline, _to_ns
+
+
+class SimulationResult():
+
+    """
+    Outcome and statistics of a single simulation run by :func:`.run_simulations`: the ``index``,
+    ``params`` and ``seed`` of the run, the ``value`` returned by the scenario or the
+    ``exception`` it raised, the number of callbacks called (``num_events``), and the virtual and
+    real seconds it took (``simulated_time`` and ``wall_time``)
+    """
+
+    def __init__(self, index, params, seed, value=None, exception=None, num_events=0, simulated_time=0, wall_time=0):
+        super().__init__()
+        self.index = index
+        self.params = params
+        self.seed = seed
+        self.value = value
+        self.exception = exception
+        self.num_events = num_events
+        self.simulated_time = simulated_time
+        self.wall_time = wall_time
+
+    def succeeded(self):
+        return self.exception is None
+
+    def __repr__(self):
+        return "<SimulationResult #{} ({}, {} events, {:.3f}s simulated in {:.3f}s)>".format(
+            self.index, "failed" if self.exception is not None else "succeeded",
+            self.num_events, self.simulated_time, self.wall_time)
+
+
+class _CountingTimeline(Timeline):
+
+    def __init__(self, scheduler=None):
+        super().__init__(scheduler=scheduler)
+        self._num_events = 0
+
+    def _dispatch(self, end_time, max_events=None, max_wall_seconds=None):
+        returned = super()._dispatch(end_time, max_events, max_wall_seconds)
+        self._num_events += returned[0]
+        return returned
+
+
+def _create_frozen_timeline(start_time_ns, scheduler=None):
+    timeline = _CountingTimeline(scheduler=scheduler)
+    # freezing first, so that the start time is exact
+    timeline.freeze()
+    timeline.set_time_ns(start_time_ns, allow_backwards=True)
+    return timeline
+
+
+def run_simulations(scenario, param_sets, seed=0, max_workers=None, executor=None, fail_fast=False,
+                    start_time=0, scheduler_factory=None):
+    """
+    Runs ``scenario(timeline, rand, **params)`` for every dict in ``param_sets``, each time on a
+    fresh frozen timeline starting at ``start_time``. The scenario drives the timeline itself, e.g.
+    with :func:`.Timeline.run_for`, and its return value is reported as the result value.
+
+    ``rand`` is a :class:`random.Random` seeded from ``seed`` and the index of the parameter set,
+    and the global :mod:`random` module is seeded the same way, so sweeps are reproducible
+    regardless of the number of workers.
+
+    Runs are spread over a :class:`concurrent.futures.ProcessPoolExecutor` of ``max_workers``
+    processes, unless an ``executor`` is given, so ``scenario`` and the parameters must be
+    picklable. Yields a :class:`.SimulationResult` for every run as soon as it completes. With
+    ``fail_fast``, the first failing run cancels the remaining ones, and its exception is raised
+    """
+    param_sets = list(param_sets)
+    seeder = random.Random(seed)
+    seeds = [seeder.getrandbits(64) for _ in param_sets]
+    owns_executor = executor is None
+    if owns_executor:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers)
+    futures = []
+    try:
+        futures = [executor.submit(_run_simulation, scenario, index, params, run_seed, start_time, scheduler_factory)
+                   for index, (params, run_seed) in enumerate(zip(param_sets, seeds))]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            if fail_fast and result.exception is not None:
+                raise result.exception
+            yield result
+    finally:
+        for future in futures:
+            future.cancel()
+        if owns_executor:
+            executor.shutdown(wait=True)
+
+
+def _run_simulation(scenario, index, params, seed, start_time, scheduler_factory):
+    random.seed(seed)
+    rand = random.Random(seed)
+    timeline = _create_frozen_timeline(
+        _to_ns(start_time), scheduler_factory() if scheduler_factory is not None else None)
+    result = SimulationResult(index, params, seed)
+    wall_start = perf_counter()
+    try:
+        result.value = scenario(timeline, rand, **params)
+    except Exception as e:  # pylint: disable=broad-except
+        result.exception = _get_picklable_exception(e)
+    result.wall_time = perf_counter() - wall_start
+    result.num_events = timeline._num_events
+    result.simulated_time = timeline.time() - start_time
+    return result
+
+
+def _get_picklable_exception(exception):
+    try:
+        pickle.dumps(exception)
+    except Exception:  # pylint: disable=broad-except
+        return RuntimeError("Simulation failed with unpicklable exception: {!r}".format(exception))
+    return exception
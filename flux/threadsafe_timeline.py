@@ -0,0 +1,219 @@
+import concurrent.futures
+import threading
+
+from .timeline import Timeline, _NS_PER_SECOND
+
+
+class ThreadSafeTimeline(Timeline):
+
+    """
+    A :class:`.Timeline` which can be shared between threads. Scheduling, cancelling and time
+    changes are serialized with a lock, while :func:`.time` stays lock-free, as time corrections are
+    swapped atomically. The forced time of running callbacks is per-thread, so callbacks running in
+    one thread do not freeze the clock for the others.
+
+    Due callbacks can optionally be called by a background thread, see :func:`.start_dispatcher`
+    """
+
+    def __init__(self, start_time=None, scheduler=None):
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._dispatcher_wakeup = threading.Condition(self._lock)
+        self._dispatcher_thread = None
+        self._dispatcher_stopping = False
+        self._dispatcher_until = float("-inf")
+        self._dispatcher_error = None
+        super().__init__(start_time=start_time, scheduler=scheduler)
+        self._scheduled = _LockedScheduler(self._scheduled, self._lock)
+
+    @property
+    def _forced_time(self):
+        return getattr(self._local, "forced_time", None)
+
+    @_forced_time.setter
+    def _forced_time(self, forced_time):
+        self._local.forced_time = forced_time
+
+    def set_time_factor(self, factor):
+        with self._lock:
+            super().set_time_factor(factor)
+            self._dispatcher_wakeup.notify()
+
+    def set_time_ns(self, time_ns, allow_backwards=False):
+        with self._lock:
+            super().set_time_ns(time_ns, allow_backwards)
+            self._dispatcher_wakeup.notify()
+
+    def checkpoint(self):
+        with self._lock:
+            return super().checkpoint()
+
+    def _unwrap_scheduler(self, scheduler):
+        return super()._unwrap_scheduler(scheduler._scheduler)
+
+    def restore(self, checkpoint):
+        with self._lock:
+            super().restore(checkpoint)
+            self._dispatcher_wakeup.notify()
+
+    def _set_scheduler(self, scheduler):
+        super()._set_scheduler(scheduler)
+        self._scheduled = _LockedScheduler(self._scheduled, self._lock)
+
+    def enable_instrumentation(self, pre_dispatch=None, post_dispatch=None, size_sample_interval=1000,
+                               profile_callbacks=False):
+        with self._lock:
+            return super().enable_instrumentation(pre_dispatch, post_dispatch, size_sample_interval, profile_callbacks)
+
+    def disable_instrumentation(self):
+        with self._lock:
+            return super().disable_instrumentation()
+
+    def _start_tracer(self, tracer):
+        with self._lock:
+            return super()._start_tracer(tracer)
+
+    def stop_trace(self):
+        with self._lock:
+            return super().stop_trace()
+
+    def schedule_many(self, calls):
+        with self._lock:
+            returned = super().schedule_many(calls)
+            self._dispatcher_wakeup.notify()
+        return returned
+
+    def _push_scheduled(self, item, scheduled_time):
+        with self._lock:
+            super()._push_scheduled(item, scheduled_time)
+            if scheduled_time < self._dispatcher_until:
+                self._dispatcher_wakeup.notify()
+
+    def _cancel_scheduled(self, item):
+        with self._lock:
+            return super()._cancel_scheduled(item)
+
+    def _reschedule(self, item, delay):
+        with self._lock:
+            super()._reschedule(item, delay)
+
+    def _submit_callback(self, executor, callback, scheduled_time):
+        if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+            return executor.submit(callback)
+        # forced times are per-thread, so every worker thread holds its own
+        return executor.submit(self._call_forced, callback, scheduled_time)
+
+    def _call_forced(self, callback, scheduled_time):
+        prev_forced_time = self._forced_time
+        self._forced_time = scheduled_time
+        try:
+            return callback()
+        finally:
+            self._forced_time = prev_forced_time
+
+    def start_dispatcher(self):
+        """
+        Starts a daemon thread calling scheduled callbacks when they are due. Errors raised by
+        callbacks do not stop the thread, and the first one is raised by :func:`.stop_dispatcher`
+        """
+        with self._lock:
+            if self._dispatcher_thread is not None:
+                raise RuntimeError("Dispatcher thread already started")
+            self._dispatcher_stopping = False
+            self._dispatcher_error = None
+            self._dispatcher_thread = threading.Thread(
+                target=self._run_dispatcher, name="flux-dispatcher", daemon=True)
+            self._dispatcher_thread.start()
+
+    def stop_dispatcher(self):
+        """
+        Stops the dispatcher thread started by :func:`.start_dispatcher`, waiting for it to exit.
+        Raises the first error raised by a callback it called, if any
+        """
+        with self._lock:
+            thread = self._dispatcher_thread
+            if thread is None:
+                return
+            self._dispatcher_stopping = True
+            self._dispatcher_wakeup.notify()
+        if thread is not threading.current_thread():
+            thread.join()
+        self._dispatcher_thread = None
+        error, self._dispatcher_error = self._dispatcher_error, None
+        if error is not None:
+            raise error
+
+    def _run_dispatcher(self):
+        try:
+            self._dispatch_forever()
+        finally:
+            # the thread can still die of errors other than Exception, and must not be left registered
+            with self._lock:
+                if self._dispatcher_thread is threading.current_thread() and not self._dispatcher_stopping:
+                    self._dispatcher_thread = None
+
+    def _dispatch_forever(self):
+        while True:
+            with self._lock:
+                while True:
+                    if self._dispatcher_stopping:
+                        return
+                    next_time = self._scheduled.peek_time()
+                    current_time = self.time_ns()
+                    if next_time is not None and next_time <= current_time:
+                        break
+                    if next_time is None:
+                        self._dispatcher_until = float("inf")
+                        timeout = None
+                    else:
+                        self._dispatcher_until = next_time
+                        # with a zero factor, only set_time() can make the callback due
+                        time_factor = self._time_factor
+                        timeout = (next_time - current_time) / _NS_PER_SECOND / time_factor if time_factor else None
+                    self._dispatcher_wakeup.wait(timeout)
+                self._dispatcher_until = float("-inf")
+            try:
+                self.trigger_past_callbacks()
+            except Exception as e:  # pylint: disable=broad-except
+                # the failed callback is gone, and later ones are still called
+                if self._dispatcher_error is None:
+                    self._dispatcher_error = e
+
+
+class _LockedScheduler():
+
+    """
+    Serializes access to a scheduler. Popped items are marked as fired under the lock, so cancelling
+    either prevents the call or reports that the item is no longer pending
+    """
+
+    def __init__(self, scheduler, lock):
+        super().__init__()
+        self._scheduler = scheduler
+        self._lock = lock
+
+    def __len__(self):
+        return len(self._scheduler)
+
+    def push(self, time, seq, item):
+        with self._lock:
+            self._scheduler.push(time, seq, item)
+
+    def push_many(self, entries):
+        with self._lock:
+            self._scheduler.push_many(entries)
+
+    def peek_time(self):
+        with self._lock:
+            return self._scheduler.peek_time()
+
+    def pop_due(self, current_time):
+        with self._lock:
+            entry = self._scheduler.pop_due(current_time)
+            if entry is not None:
+                entry[2]._seq = None
+            return entry
+
+    def notify_cancelled(self, time):
+        with self._lock:
+            self._scheduler.notify_cancelled(time)
@@ -0,0 +1,148 @@
+"""
+Opt-in, process-wide patching of the standard ``time`` and ``datetime`` modules, making code that
+never heard of flux run on the current timeline.
+
+Only module attributes are patched, so names imported beforehand (``from time import time``)
+keep pointing at the originals. Until a timeline is modified, the original functions of the
+``time`` module stay in place, costing nothing. Afterwards, the patched functions defer to the
+original ones while the current timeline is unmodified.
+
+asyncio event loops keep using the real monotonic clock, as their timeouts are in real seconds.
+"""
+import asyncio.base_events
+import contextlib
+import datetime
+import time
+import types
+
+from . import current_timeline
+from . import timeline as _timeline_module
+
+_TIME_FUNCTION_NAMES = ("time", "time_ns", "monotonic", "monotonic_ns", "perf_counter", "sleep")
+# modules which must keep using the real clock
+_REAL_CLOCK_MODULES = (_timeline_module, asyncio.base_events)
+
+_originals = None
+
+
+def _get_current():
+    if current_timeline._scoped_used:
+        return current_timeline.get()
+    return current_timeline._current
+
+
+def _make_patched_functions(original_time_module):
+    original_time = original_time_module.time
+    original_time_ns = original_time_module.time_ns
+    original_monotonic = original_time_module.monotonic
+    original_monotonic_ns = original_time_module.monotonic_ns
+    original_perf_counter = original_time_module.perf_counter
+    original_sleep = original_time_module.sleep
+    # the virtual monotonic clocks keep their offset from the real wall clock at installation time
+    monotonic_offset = original_time_ns() - original_monotonic_ns()
+    perf_counter_offset = original_time_ns() - original_time_module.perf_counter_ns()
+
+    def patched_time():
+        timeline = _get_current()
+        if not timeline.is_modified():
+            return original_time()
+        return timeline.time()
+
+    def patched_time_ns():
+        timeline = _get_current()
+        if not timeline.is_modified():
+            return original_time_ns()
+        return timeline.time_ns()
+
+    def patched_monotonic():
+        timeline = _get_current()
+        if not timeline.is_modified():
+            return original_monotonic()
+        return (timeline.monotonic_ns() - monotonic_offset) / 1e9
+
+    def patched_monotonic_ns():
+        timeline = _get_current()
+        if not timeline.is_modified():
+            return original_monotonic_ns()
+        return timeline.monotonic_ns() - monotonic_offset
+
+    def patched_perf_counter():
+        timeline = _get_current()
+        if not timeline.is_modified():
+            return original_perf_counter()
+        return (timeline.monotonic_ns() - perf_counter_offset) / 1e9
+
+    def patched_sleep(seconds):
+        timeline = _get_current()
+        if not timeline.is_modified():
+            return original_sleep(seconds)
+        return timeline.sleep(seconds)
+
+    return {
+        "time": patched_time,
+        "time_ns": patched_time_ns,
+        "monotonic": patched_monotonic,
+        "monotonic_ns": patched_monotonic_ns,
+        "perf_counter": patched_perf_counter,
+        "sleep": patched_sleep,
+    }
+
+
+def install():
+    """
+    Patches ``time.time``, ``time.time_ns``, ``time.monotonic``, ``time.monotonic_ns``,
+    ``time.perf_counter``, ``time.sleep``, ``datetime.datetime`` and ``datetime.date`` to follow
+    the current timeline
+    """
+    global _originals
+    if _originals is not None:
+        raise RuntimeError("Time patching is already installed")
+    originals = {name: getattr(time, name) for name in _TIME_FUNCTION_NAMES}
+    original_time_module = types.SimpleNamespace(**{name: getattr(time, name) for name in dir(time) if not name.startswith("__")})
+    _originals = (originals, datetime.datetime, datetime.date, [module.time for module in _REAL_CLOCK_MODULES])
+    for module in _REAL_CLOCK_MODULES:
+        module.time = original_time_module
+    patched_functions = _make_patched_functions(original_time_module)
+
+    def patch_time_functions():
+        for name, function in patched_functions.items():
+            setattr(time, name, function)
+
+    if _timeline_module._any_modified:
+        patch_time_functions()
+    else:
+        _timeline_module._on_first_modification = patch_time_functions
+    datetime.datetime = current_timeline.datetime
+    datetime.date = current_timeline.date
+
+
+def uninstall():
+    """
+    Restores everything patched by :func:`.install`
+    """
+    global _originals
+    if _originals is None:
+        return
+    originals, datetime.datetime, datetime.date, module_times = _originals
+    _timeline_module._on_first_modification = None
+    for module, module_time in zip(_REAL_CLOCK_MODULES, module_times):
+        module.time = module_time
+    for name, function in originals.items():
+        setattr(time, name, function)
+    _originals = None
+
+
+def is_installed():
+    return _originals is not None
+
+
+@contextlib.contextmanager
+def patched():
+    """
+    Context manager calling :func:`.install` on entry and :func:`.uninstall` on exit
+    """
+    install()
+    try:
+        yield
+    finally:
+        uninstall()
@@ -1,33 +1,102 @@
 import asyncio
-import contextlib
+import concurrent.futures
+import copy
 import datetime
 import functools
-import heapq
+import itertools
+import threading
 import time
+import types
 from numbers import Number
 
+from .instrumentation import TimelineStats, _InstrumentedScheduler, _get_num_pending
+from .schedulers import HeapScheduler
+from .tracing import TraceRecorder, TraceReplayer, _TracedScheduler
+
+_NS_PER_SECOND = 1000000000
+
+_iscoroutine = asyncio.iscoroutine
+
+MISSED_TICKS_CALL_ALL = "call_all"
+MISSED_TICKS_COALESCE = "coalesce"
+MISSED_TICKS_SKIP = "skip"
+_MISSED_TICKS_POLICIES = (MISSED_TICKS_CALL_ALL, MISSED_TICKS_COALESCE, MISSED_TICKS_SKIP)
+
+# whether any timeline of the process was ever modified, and what to call when the first one is,
+# so that flux.time_patching can keep the original time functions until then
+_any_modified = False
+_on_first_modification = None
+
+
+def _mark_modified():
+    global _any_modified
+    if not _any_modified:
+        _any_modified = True
+        if _on_first_modification is not None:
+            _on_first_modification()
+
+
+def _to_ns(seconds):
+    # the whole seconds are converted separately, so that for any realistic timestamp, converting
+    # the result back to seconds gives the original float
+    if isinstance(seconds, int):
+        return seconds * _NS_PER_SECOND
+    seconds = float(seconds)
+    whole = int(seconds)
+    return whole * _NS_PER_SECOND + round((seconds - whole) * _NS_PER_SECOND)
+
 
 class Timeline():
 
-    def __init__(self, start_time=None):
+    """
+    A virtual timeline. Virtual time is kept internally as an integer number of nanoseconds, so
+    time shifts and scheduled callbacks never accumulate rounding errors
+    """
+
+    def __init__(self, start_time=None, scheduler=None):
         super().__init__()
         current_time = self._real_time()
+        # the virtual time in nanoseconds while callbacks are being called
         self._forced_time = None
-        self._scheduled = []
+        if scheduler is None:
+            scheduler = HeapScheduler()
+        self._scheduled = scheduler
+        self._scheduled_counter = itertools.count()
         self._time_factor = 1
         self._time_correction = None
+        # (virtual base ns, virtual base, real base, factor), precomputed from the time correction
+        # for time() and time_ns()
+        self._clock = None
+        # added to the virtual time by monotonic_ns(), absorbing backward time changes
+        self._monotonic_adjustment = 0
+        # real sleeps in progress, woken when a callback is scheduled before their wake time
+        self._sleepers = set()
+        # the sleeper of the current synchronous sleep of every thread
+        self._sleep_local = threading.local()
+        # collects the tasks of coroutine callbacks started during async_sleep()
+        self._spawned_tasks = None
+        self._dispatch_executor = None
+        self._dispatch_min_batch_size = 2
+        # set while instrumentation is enabled
+        self._stats = None
+        # set while recording or replaying a trace
+        self._tracer = None
 
         if start_time is not None:
-            self._correct_time(base=start_time)
+            self._correct_time(base=_to_ns(start_time))
 
     def is_modified(self):
         return self._time_correction is not None
 
     def _real_sleep(self, seconds):
-        time.sleep(seconds)
+        sleeper = getattr(self._sleep_local, "sleeper", None)
+        if sleeper is None:
+            time.sleep(seconds)
+        else:
+            sleeper.wait(seconds)
 
-    async def _real_async_sleep(self, seconds):
-        await asyncio.sleep(seconds)
+    async def _real_async_sleep(self, seconds, sleeper):
+        await sleeper.wait(seconds)
 
     def _real_time(self):
         return time.time()
@@ -40,7 +109,7 @@ class Timeline():
         """
         if factor < 0:
             raise ValueError("Cannot set negative time factor")
-        self._correct_time()
+        self._correct_time(time_factor=factor)
         self._time_factor = factor
 
     def get_time_factor(self):
@@ -55,127 +124,957 @@ class Timeline():
         """
         self.set_time_factor(0)
 
-    def _correct_time(self, base=None):
-        current_time = self._real_time()
-        if base is None:
-            base = current_time
-        if self._time_correction is None:
-            self._time_correction = TimeCorrection(base, current_time)
+    def _correct_time(self, base=None, time_factor=None):
+        # corrections are never modified in place, but replaced as a whole, so that time() always
+        # sees a consistent snapshot even when called concurrently
+        if base is None or self._time_correction is not None:
+            base = self.time_ns()
+        if time_factor is None:
+            time_factor = self._time_factor
+        self._set_time_correction(TimeCorrection(base, self._real_time(), time_factor=time_factor))
 
-        self._time_correction.virtual_time = self.time()
-        self._time_correction.real_time = self._real_time()
-        # shift stems from the previous correction...
-        self._time_correction.shift = 0
+    def _set_time_correction(self, correction):
+        self._time_correction = correction
+        if not _any_modified:
+            _mark_modified()
+        virtual_base = correction.virtual_time + correction.shift
+        self._clock = (virtual_base, virtual_base / _NS_PER_SECOND, correction.real_time, correction.time_factor)
+        if self._tracer is not None:
+            self._tracer._on_time_change(virtual_base, correction.time_factor)
 
     async def async_sleep(self, seconds):
         """
-        Async sleeps a given number of seconds in the virtual timeline
+        Async sleeps a given number of seconds in the virtual timeline. Coroutine callbacks called
+        during the sleep run concurrently, and are awaited before returning
         """
-        for sleep_sec in self._sleep_time_generator(seconds):
-            await self._real_async_sleep(sleep_sec)
+        spawned_tasks = []
+        sleeper = _AsyncSleeper(asyncio.get_running_loop())
+        generator = self._sleep_time_generator(self._get_sleep_ns(seconds), sleeper)
+        while True:
+            # callbacks are only called synchronously from within the generator
+            prev_spawned_tasks, self._spawned_tasks = self._spawned_tasks, spawned_tasks
+            try:
+                sleep_sec = next(generator, None)
+            finally:
+                self._spawned_tasks = prev_spawned_tasks
+            if sleep_sec is None:
+                break
+            await self._real_async_sleep(sleep_sec, sleeper)
+        if spawned_tasks:
+            await asyncio.gather(*spawned_tasks)
 
     def sleep(self, seconds):
         """
         Sleeps a given number of seconds in the virtual timeline
         """
-        for sleep_sec in self._sleep_time_generator(seconds):
-            self._real_sleep(sleep_sec)
+        self._sleep_ns(self._get_sleep_ns(seconds))
 
-    def _sleep_time_generator(self, seconds):
+    def _get_sleep_ns(self, seconds):
         if not isinstance(seconds, Number):
             raise ValueError(
                 "Invalid number of seconds specified: {0!r}".format(seconds))
         if seconds < 0:
             raise ValueError("Cannot sleep negative number of seconds")
+        return _to_ns(seconds)
+
+    def _sleep_ns(self, sleep_ns):
+        local = self._sleep_local
+        sleeper = _Sleeper()
+        # callbacks may sleep too, nesting sleeps within a thread
+        prev_sleeper, local.sleeper = getattr(local, "sleeper", None), sleeper
+        try:
+            for sleep_sec in self._sleep_time_generator(sleep_ns, sleeper):
+                self._real_sleep(sleep_sec)
+        finally:
+            local.sleeper = prev_sleeper
+
+    def _sleep_time_generator(self, sleep_ns, sleeper):
         if self._time_factor == 0:
-            self.set_time(self.time() + seconds)
+            self.set_time_ns(self.time_ns() + sleep_ns)
         else:
-            end_time = self.time() + seconds
-            while self.time() < end_time:
-                yield max(0, (end_time - self.time()) / self._time_factor)
+            # sleep in segments, waking up for every scheduled callback so it is called on time
+            end_time = self.time_ns() + sleep_ns
+            self._sleepers.add(sleeper)
+            try:
+                while True:
+                    sleeper.clear()
+                    # any callback scheduled until the wake time is known wakes the sleeper
+                    sleeper.wake_time = float("inf")
+                    current_time = self.time_ns()
+                    if current_time >= end_time:
+                        break
+                    time_factor = self._time_factor
+                    if time_factor == 0:
+                        # frozen by a callback, so the rest of the sleep is skipped like frozen sleeps
+                        self.set_time_ns(end_time)
+                        break
+                    wake_time = self._scheduled.peek_time()
+                    if wake_time is None or wake_time > end_time:
+                        wake_time = end_time
+                    sleeper.wake_time = wake_time
+                    yield max(0, (wake_time - current_time) / _NS_PER_SECOND / time_factor)
+                    self.trigger_past_callbacks()
+            finally:
+                self._sleepers.discard(sleeper)
         self.trigger_past_callbacks()
 
+    def _wake_sleepers(self, scheduled_time):
+        for sleeper in tuple(self._sleepers):
+            if scheduled_time < sleeper.wake_time:
+                sleeper.wake()
+
     def sleep_wait_all_scheduled(self):
         """
         Sleeps enough time for all scheduled callbacks to occur
         """
-        while self._scheduled:
-            self.sleep(max(0, self._scheduled[0].time - self.time()))
+        while True:
+            next_time = self._scheduled.peek_time()
+            if next_time is None:
+                break
+            self._sleep_ns(max(0, next_time - self.time_ns()))
 
     def sleep_stop_first_scheduled(self, sleep_seconds):
         """
         Sleeps the given amount of time, but wakes up if a scheduled event exists before the destined end time
         """
-        if self._scheduled:
-            sleep_seconds = min(
-                max(0, self._scheduled[0].time - self.time()), sleep_seconds)
-        self.sleep(sleep_seconds)
+        sleep_ns = self._get_sleep_ns(sleep_seconds)
+        next_time = self._scheduled.peek_time()
+        if next_time is not None:
+            sleep_ns = min(
+                max(0, next_time - self.time_ns()), sleep_ns)
+        self._sleep_ns(sleep_ns)
 
     def trigger_past_callbacks(self):
-        current_time = self.time()
-        while self._scheduled and self._scheduled[0].time <= current_time:
-            scheduled = heapq.heappop(self._scheduled)
-            with self._get_forced_time_context(scheduled.time):
-                scheduled.callback()
+        self._dispatch(self.time_ns())
 
-    def set_time(self, time, allow_backwards=False):
-        delta = time - self.time()
-        if delta < 0 and not allow_backwards:
-            # Can't move time backwards. Not an exception, if using threads.
-            return
-        self._time_correction.shift += delta
+    def run_until(self, end_time, max_events=None, max_wall_seconds=None):
+        """
+        Runs all callbacks scheduled until ``end_time``, jumping the virtual time from one callback
+        to the next without sleeping, and then sets the virtual time to ``end_time``.
 
-    def time(self):
+        Stops early after calling ``max_events`` callbacks or after ``max_wall_seconds`` seconds of
+        real time, leaving the virtual time at the last called callback. Returns the number of
+        callbacks called
         """
-        Gets the virtual time
+        return self._run_until_ns(_to_ns(end_time), max_events, max_wall_seconds)
+
+    def _run_until_ns(self, end_time, max_events=None, max_wall_seconds=None):
+        num_events, last_time, exhausted = self._dispatch(end_time, max_events, max_wall_seconds)
+        if exhausted:
+            self.set_time_ns(end_time)
+        elif last_time is not None:
+            self.set_time_ns(last_time)
+        return num_events
+
+    def run_for(self, seconds, max_events=None, max_wall_seconds=None):
+        """
+        Shortcut for :func:`.run_until` (current time + ``seconds``)
+        """
+        if seconds < 0:
+            raise ValueError("Cannot run for a negative number of seconds")
+        return self._run_until_ns(self.time_ns() + _to_ns(seconds), max_events, max_wall_seconds)
+
+    def run_events(self, max_events, max_wall_seconds=None):
+        """
+        Runs the next ``max_events`` scheduled callbacks, however far they are in the virtual
+        timeline, leaving the virtual time at the last called callback. Returns the number of
+        callbacks called
+        """
+        num_events, last_time, _ = self._dispatch(float("inf"), max_events, max_wall_seconds)
+        if last_time is not None:
+            self.set_time_ns(last_time)
+        return num_events
+
+    def _dispatch(self, end_time, max_events=None, max_wall_seconds=None):
+        """
+        Calls scheduled callbacks due by ``end_time`` (in nanoseconds), each under the forced time
+        it was scheduled for. Returns the number of callbacks called, the time of the last one and
+        whether all due callbacks were called
         """
-        if self._forced_time is not None:
-            return self._forced_time
-        returned = self._real_time()
-        if self._time_correction is not None:
-            returned = self._time_correction.virtual_time + self._time_correction.shift + (returned - self._time_correction.real_time) * self._time_factor
-        return returned
+        if self._dispatch_executor is not None:
+            return self._dispatch_batches(end_time, max_events, max_wall_seconds)
+        if self._stats is not None:
+            return self._dispatch_instrumented(end_time, max_events, max_wall_seconds)
+        pop_due = self._scheduled.pop_due
+        prev_forced_time = self._forced_time
+        if max_wall_seconds is not None:
+            deadline = time.monotonic() + max_wall_seconds
+        num_events = 0
+        scheduled_time = None
+        try:
+            while max_events is None or num_events < max_events:
+                entry = pop_due(end_time)
+                if entry is None:
+                    return num_events, scheduled_time, True
+                scheduled_time, _, item = entry
+                item._seq = None
+                # the time is forced inline, as a context manager is too costly per callback
+                self._forced_time = scheduled_time
+                result = item.callback()
+                num_events += 1
+                if result is not None and _iscoroutine(result):
+                    self._start_coroutine_callback(result)
+                if max_wall_seconds is not None and time.monotonic() >= deadline:
+                    break
+        finally:
+            self._forced_time = prev_forced_time
+        return num_events, scheduled_time, False
+
+    def _dispatch_batches(self, end_time, max_events, max_wall_seconds):
+        # like _dispatch, but callbacks sharing the same time are popped together, and called
+        # concurrently on the executor
+        pop_due = self._scheduled.pop_due
+        prev_forced_time = self._forced_time
+        if max_wall_seconds is not None:
+            deadline = time.monotonic() + max_wall_seconds
+        num_events = 0
+        scheduled_time = None
+        try:
+            while max_events is None or num_events < max_events:
+                entry = pop_due(end_time)
+                if entry is None:
+                    return num_events, scheduled_time, True
+                scheduled_time = entry[0]
+                batch = [entry[2]]
+                while max_events is None or num_events + len(batch) < max_events:
+                    entry = pop_due(scheduled_time)
+                    if entry is None:
+                        break
+                    batch.append(entry[2])
+                for item in batch:
+                    item._seq = None
+                self._forced_time = scheduled_time
+                if self._stats is not None:
+                    self._call_batch_instrumented(batch, scheduled_time)
+                else:
+                    self._call_batch(batch, scheduled_time)
+                num_events += len(batch)
+                if max_wall_seconds is not None and time.monotonic() >= deadline:
+                    break
+        finally:
+            self._forced_time = prev_forced_time
+        return num_events, scheduled_time, False
 
-    @contextlib.contextmanager
-    def _get_forced_time_context(self, time):
+    def _dispatch_instrumented(self, end_time, max_events, max_wall_seconds):
+        # like _dispatch, but feeding the statistics and hooks of every call
+        stats = self._stats
+        pop_due = self._scheduled.pop_due
         prev_forced_time = self._forced_time
-        self._forced_time = time
+        if max_wall_seconds is not None:
+            deadline = time.monotonic() + max_wall_seconds
+        num_events = 0
+        scheduled_time = None
         try:
-            yield
+            while max_events is None or num_events < max_events:
+                entry = pop_due(end_time)
+                if entry is None:
+                    return num_events, scheduled_time, True
+                scheduled_time, _, item = entry
+                item._seq = None
+                lateness = self._get_lateness(scheduled_time)
+                self._forced_time = scheduled_time
+                if stats.pre_dispatch is not None:
+                    stats.pre_dispatch(item)
+                call_start = time.perf_counter()
+                try:
+                    result = item.callback()
+                finally:
+                    stats._record_call(item, lateness, time.perf_counter() - call_start)
+                num_events += 1
+                if result is not None and _iscoroutine(result):
+                    self._start_coroutine_callback(result)
+                if max_wall_seconds is not None and time.monotonic() >= deadline:
+                    break
         finally:
             self._forced_time = prev_forced_time
+        return num_events, scheduled_time, False
+
+    def _get_lateness(self, scheduled_time):
+        # in real seconds, only meaningful while the virtual time follows the real time
+        factor = self._time_factor
+        if not factor:
+            return None
+        late_ns = self._get_clock_time_ns() - scheduled_time
+        if late_ns < 0:
+            # ahead of the clock, e.g. with run_until()
+            return None
+        return late_ns / _NS_PER_SECOND / factor
+
+    def _call_batch_instrumented(self, batch, scheduled_time):
+        stats = self._stats
+        lateness = self._get_lateness(scheduled_time)
+        if stats.pre_dispatch is not None:
+            for item in batch:
+                stats.pre_dispatch(item)
+        call_start = time.perf_counter()
+        try:
+            self._call_batch(batch, scheduled_time)
+        finally:
+            # callbacks of a batch run concurrently, and are all accounted the time of the batch
+            wall_time = time.perf_counter() - call_start
+            for item in batch:
+                stats._record_call(item, lateness, wall_time)
+
+    def _call_batch(self, batch, scheduled_time):
+        if len(batch) < self._dispatch_min_batch_size:
+            results = [item.callback() for item in batch]
+        else:
+            executor = self._dispatch_executor
+            futures = [self._submit_callback(executor, item.callback, scheduled_time) for item in batch]
+            # the virtual time only moves on once the whole batch is done
+            concurrent.futures.wait(futures)
+            results = [future.result() for future in futures]
+        for result in results:
+            if result is not None and _iscoroutine(result):
+                self._start_coroutine_callback(result)
+
+    def _submit_callback(self, executor, callback, scheduled_time):
+        # the forced time is shared by all threads, and held by the dispatching thread
+        return executor.submit(callback)
+
+    def set_dispatch_executor(self, executor, min_batch_size=2):
+        """
+        Makes callbacks scheduled for the same virtual time run concurrently on ``executor``, a
+        :class:`concurrent.futures.Executor`. The virtual time is held at their scheduled time
+        until all of them return. Batches smaller than ``min_batch_size`` are called directly.
+
+        With a process pool, callbacks must be picklable, and only run for their side effects
+        outside of the timeline. Pass None to call all callbacks one by one again
+        """
+        if min_batch_size < 1:
+            raise ValueError("Minimum batch size must be positive")
+        self._dispatch_executor = executor
+        self._dispatch_min_batch_size = min_batch_size
+
+    def enable_instrumentation(self, pre_dispatch=None, post_dispatch=None, size_sample_interval=1000,
+                               profile_callbacks=False):
+        """
+        Starts collecting scheduler statistics, returning a new :class:`.TimelineStats`.
+        ``pre_dispatch(item)`` is called before every callback and ``post_dispatch(item, wall_time)``
+        after it. With ``profile_callbacks``, the real time spent in callbacks is also attributed to
+        the code which scheduled them, see :class:`.CallbackProfile`. While disabled,
+        instrumentation costs nothing
+        """
+        if size_sample_interval < 1:
+            raise ValueError("Size sample interval must be positive")
+        scheduler = self._get_scheduler()
+        self._stats = TimelineStats(self, size_sample_interval, pre_dispatch, post_dispatch, profile_callbacks)
+        self._stats.max_scheduled_size = _get_num_pending(scheduler)
+        self._set_scheduler(scheduler)
+        return self._stats
+
+    def disable_instrumentation(self):
+        """
+        Stops collecting scheduler statistics, returning the collected :class:`.TimelineStats`
+        """
+        stats = self._stats
+        scheduler = self._get_scheduler()
+        self._stats = None
+        self._set_scheduler(scheduler)
+        return stats
+
+    def start_trace(self, f, buffer_size=1 << 16):
+        """
+        Starts recording every scheduled and dispatched callback and every time change to the
+        binary file object ``f``, returning a :class:`.TraceRecorder`. Events are buffered, and
+        only written every ``buffer_size`` bytes and by :func:`.stop_trace`. Traces can be read with
+        :func:`flux.tracing.read_trace`
+        """
+        return self._start_tracer(TraceRecorder(f, buffer_size))
+
+    def start_replay(self, f):
+        """
+        Starts checking that callbacks are dispatched in the order recorded in the trace read from
+        the binary file object ``f``, returning a :class:`.TraceReplayer`. The first callback
+        dispatched out of order raises :class:`.TraceDivergence`. Callback times are compared
+        relative to the virtual time at which the trace and the replay started, so the rerun may
+        start at any time
+        """
+        return self._start_tracer(TraceReplayer(f))
+
+    def _start_tracer(self, tracer):
+        if self._tracer is not None:
+            raise RuntimeError("A trace is already being recorded or replayed")
+        tracer._start(self.time_ns(), self._get_next_seq())
+        scheduler = self._get_scheduler()
+        self._tracer = tracer
+        self._set_scheduler(scheduler)
+        return tracer
+
+    def stop_trace(self):
+        """
+        Stops recording or replaying a trace, flushing recorded events. Returns the stopped
+        :class:`.TraceRecorder` or :class:`.TraceReplayer`
+        """
+        tracer = self._tracer
+        if tracer is None:
+            return None
+        scheduler = self._get_scheduler()
+        self._tracer = None
+        self._set_scheduler(scheduler)
+        tracer._stop()
+        return tracer
+
+    def get_stats(self):
+        """
+        Returns the :class:`.TimelineStats` being collected, or None if instrumentation is disabled
+        """
+        return self._stats
+
+    def _start_coroutine_callback(self, coroutine):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            coroutine.close()
+            raise RuntimeError("Coroutine callbacks can only be called while an asyncio event loop is running") from None
+        task = loop.create_task(self._run_coroutine_callback(coroutine, self._forced_time))
+        if self._spawned_tasks is not None:
+            self._spawned_tasks.append(task)
+
+    async def _run_coroutine_callback(self, coroutine, scheduled_time):
+        return await self._step_coroutine_callback(coroutine, scheduled_time)
+
+    @types.coroutine
+    def _step_coroutine_callback(self, coroutine, scheduled_time):
+        # the coroutine is stepped here, as its first step runs under the time it was scheduled
+        # for, like synchronous callbacks, while the time has moved on by the time its task starts
+        prev_forced_time = self._forced_time
+        self._forced_time = scheduled_time
+        try:
+            yielded = coroutine.send(None)
+        except StopIteration as e:
+            return e.value
+        finally:
+            self._forced_time = prev_forced_time
+        while True:
+            try:
+                value = yield yielded
+            except GeneratorExit:
+                coroutine.close()
+                raise
+            except BaseException as e:
+                step, value = coroutine.throw, e
+            else:
+                step = coroutine.send
+            try:
+                yielded = step(value)
+            except StopIteration as e:
+                return e.value
+
+    def set_time(self, time, allow_backwards=False):
+        self.set_time_ns(_to_ns(time), allow_backwards)
+
+    def set_time_ns(self, time_ns, allow_backwards=False):
+        """
+        Like :func:`.set_time`, but receives the time as an integer number of nanoseconds
+        """
+        delta = time_ns - self.time_ns()
+        if delta < 0:
+            if not allow_backwards:
+                # Can't move time backwards. Not an exception, if using threads.
+                return
+            self._monotonic_adjustment -= delta
+        if self._time_correction is None:
+            self._correct_time()
+        correction = self._time_correction
+        self._set_time_correction(TimeCorrection(
+            correction.virtual_time, correction.real_time, correction.shift + delta, correction.time_factor))
+
+    def time(self):
+        """
+        Gets the virtual time
+        """
+        forced_time = self._forced_time
+        if forced_time is not None:
+            return forced_time / _NS_PER_SECOND
+        clock = self._clock
+        if clock is None:
+            return self._real_time()
+        _, virtual_base, real_base, factor = clock
+        if not factor:
+            # frozen, no need to read the real time
+            return virtual_base
+        return virtual_base + (self._real_time() - real_base) * factor
+
+    def time_ns(self):
+        """
+        Gets the virtual time as an integer number of nanoseconds
+        """
+        forced_time = self._forced_time
+        if forced_time is not None:
+            return forced_time
+        return self._get_clock_time_ns()
+
+    def _get_clock_time_ns(self):
+        # the virtual time regardless of the forced time of running callbacks
+        clock = self._clock
+        if clock is None:
+            return _to_ns(self._real_time())
+        virtual_base_ns, _, real_base, factor = clock
+        if not factor:
+            return virtual_base_ns
+        return virtual_base_ns + round((self._real_time() - real_base) * factor * _NS_PER_SECOND)
+
+    def monotonic(self):
+        """
+        Gets the virtual monotonic time, which follows the virtual time but never goes backwards,
+        even when :func:`.set_time` is called with ``allow_backwards``
+        """
+        return (self.time_ns() + self._monotonic_adjustment) / _NS_PER_SECOND
+
+    def monotonic_ns(self):
+        """
+        Like :func:`.monotonic`, as an integer number of nanoseconds
+        """
+        return self.time_ns() + self._monotonic_adjustment
 
     def schedule_callback(self, delay, callback, *args, **kwargs):
+        """
+        Schedules a callback to be called after ``delay`` seconds in the virtual timeline. Returns a
+        :class:`.ScheduledItem`, which can be used to cancel or reschedule the call.
+
+        The callback may be a coroutine function, in which case it runs as a task on the running
+        asyncio event loop, concurrently with other callbacks
+        """
+        if delay < 0:
+            raise ValueError("Cannot schedule negative delays")
+        if args or kwargs:
+            callback = functools.partial(callback, *args, **kwargs)
+        item = ScheduledItem(self, callback)
+        self._push_scheduled(item, self.time_ns() + _to_ns(delay))
+        return item
+
+    def schedule_many(self, calls):
+        """
+        Schedules many callbacks at once. ``calls`` is an iterable of ``(delay, callback)`` or
+        ``(delay, callback, args)`` tuples, all delays being relative to the same current time.
+        Returns a list of :class:`.ScheduledItem` objects, in the same order as ``calls``
+        """
+        current_time = self.time_ns()
+        counter = self._scheduled_counter
+        partial = functools.partial
+        to_ns = _to_ns
+        items = []
+        entries = []
+        add_item = items.append
+        add_entry = entries.append
+        for call in calls:
+            if len(call) == 2:
+                delay, callback = call
+            else:
+                delay, callback, args = call
+                if args:
+                    callback = partial(callback, *args)
+            if delay < 0:
+                raise ValueError("Cannot schedule negative delays")
+            item = ScheduledItem(self, callback)
+            item._time = scheduled_time = current_time + to_ns(delay)
+            item._seq = seq = next(counter)
+            add_item(item)
+            add_entry((scheduled_time, seq, item))
+        self._scheduled.push_many(entries)
+        if entries and self._sleepers:
+            self._wake_sleepers(min(entries)[0])
+        return items
+
+    def schedule_stream(self, events):
+        """
+        Schedules a lazily consumed stream of events. ``events`` is a time-ordered iterable of
+        ``(timestamp, callback)`` pairs, in absolute virtual time. Only the next event of each
+        stream is kept pending, so memory use does not depend on the length of the stream.
+        Returns a :class:`.ScheduledStream`, which can be used to stop the stream
+        """
+        stream = ScheduledStream(self, iter(events))
+        stream._schedule_next()
+        return stream
+
+    def schedule_interval(self, period, callback, *args, missed=MISSED_TICKS_CALL_ALL):
+        """
+        Schedules a callback to be called every ``period`` seconds in the virtual timeline, the
+        first call being ``period`` seconds from now. Calls are scheduled on multiples of the
+        period, so they do not drift even if the virtual time moves while they run.
+
+        ``missed`` determines what happens to ticks missed because the virtual time jumped over
+        them, e.g. with :func:`.set_time`:
+
+        * ``"call_all"`` (:data:`.MISSED_TICKS_CALL_ALL`) calls the callback once for every tick
+        * ``"coalesce"`` (:data:`.MISSED_TICKS_COALESCE`) calls the callback once, passing the
+          number of ticks it covers as an additional last argument
+        * ``"skip"`` (:data:`.MISSED_TICKS_SKIP`) calls the callback once, dropping the other ticks
+
+        Returns a :class:`.ScheduledInterval`, which can be used to stop the calls
+        """
+        if period <= 0:
+            raise ValueError("Interval period must be positive")
+        if missed not in _MISSED_TICKS_POLICIES:
+            raise ValueError("Invalid missed ticks policy: {!r}".format(missed))
+        if args:
+            callback = functools.partial(callback, *args)
+        period_ns = _to_ns(period)
+        interval = ScheduledInterval(self, callback, period_ns, missed)
+        self._push_scheduled(interval, self.time_ns() + period_ns)
+        return interval
+
+    def _push_scheduled(self, item, scheduled_time):
+        item._time = scheduled_time
+        item._seq = seq = next(self._scheduled_counter)
+        self._scheduled.push(scheduled_time, seq, item)
+        if self._sleepers:
+            self._wake_sleepers(scheduled_time)
+
+    def _cancel_scheduled(self, item):
+        if item._seq is None:
+            return False
+        item._seq = None
+        self._scheduled.notify_cancelled(item._time)
+        return True
+
+    def _reschedule(self, item, delay):
         if delay < 0:
             raise ValueError("Cannot schedule negative delays")
-        item = ScheduledItem(self.time() + delay, functools.partial(callback, *args, **kwargs))
-        heapq.heappush(self._scheduled, item)
+        self._cancel_scheduled(item)
+        self._push_scheduled(item, self.time_ns() + _to_ns(delay))
+
+    def checkpoint(self):
+        """
+        Captures the virtual time, the time factor and all pending callbacks, returning a
+        :class:`.TimelineCheckpoint` which can later be passed to :func:`.restore`, any number of
+        times. Callbacks are deep-copied along with everything they refer to, so that restored
+        timelines do not share state. Raises :class:`.CheckpointError` for callbacks which cannot
+        be copied, such as closures or running sequences
+        """
+        placeholder = _TimelinePlaceholder()
+        state = self._get_checkpoint_state()
+        try:
+            state = copy.deepcopy(state, {id(self): placeholder})
+        except CheckpointError:
+            raise
+        except Exception as e:
+            raise CheckpointError("Cannot capture timeline state: {}".format(e)) from e
+        time_ns = self.time_ns() if self._time_correction is not None else None
+        return TimelineCheckpoint(placeholder, state, time_ns, self._time_factor, self._monotonic_adjustment)
+
+    def _get_checkpoint_state(self):
+        return (self._get_scheduler(), self._get_next_seq())
+
+    def _get_next_seq(self):
+        # the counter is replaced, as it can only be read by consuming it
+        next_seq = next(self._scheduled_counter)
+        self._scheduled_counter = itertools.count(next_seq)
+        return next_seq
+
+    def restore(self, checkpoint):
+        """
+        Brings the timeline back to a state captured by :func:`.checkpoint`, replacing all pending
+        callbacks. The virtual time goes back to the captured time, and keeps going from there
+        according to the captured time factor
+        """
+        scheduler, next_seq = copy.deepcopy(checkpoint._state, {id(checkpoint._placeholder): self})
+        self._set_scheduler(scheduler)
+        self._scheduled_counter = itertools.count(next_seq)
+        self._time_factor = checkpoint.time_factor
+        self._monotonic_adjustment = checkpoint._monotonic_adjustment
+        if checkpoint.time_ns is None:
+            self._time_correction = self._clock = None
+        else:
+            self._set_time_correction(TimeCorrection(checkpoint.time_ns, self._real_time(), time_factor=checkpoint.time_factor))
+
+    def _get_scheduler(self):
+        # the scheduler passed to the constructor, without instrumentation
+        return self._unwrap_scheduler(self._scheduled)
+
+    def _unwrap_scheduler(self, scheduler):
+        if isinstance(scheduler, _TracedScheduler):
+            scheduler = scheduler._scheduler
+        if isinstance(scheduler, _InstrumentedScheduler):
+            scheduler = scheduler._scheduler
+        return scheduler
+
+    def _set_scheduler(self, scheduler):
+        if self._stats is not None:
+            scheduler = _InstrumentedScheduler(scheduler, self._stats)
+        if self._tracer is not None:
+            scheduler = _TracedScheduler(scheduler, self._tracer)
+        self._scheduled = scheduler
+
+    def fork(self):
+        """
+        Returns a new timeline of the same class, in the state of this one. Shortcut for restoring
+        :func:`.checkpoint` on a new timeline
+        """
+        forked = type(self)()
+        forked._dispatch_executor = self._dispatch_executor
+        forked._dispatch_min_batch_size = self._dispatch_min_batch_size
+        forked.restore(self.checkpoint())
+        return forked
 
     def __repr__(self):
         return "<Timeline (@{})>".format(datetime.datetime.fromtimestamp(self.time()).ctime())
 
 
-class ScheduledItem():
+class _Sleeper():
+
+    """
+    A real sleep in progress, cut short once a callback is scheduled before ``wake_time``
+    """
+
+    __slots__ = ("wake_time", "_event")
 
-    def __init__(self, time, callback):
+    def __init__(self):
         super().__init__()
-        self.time = time
+        self.wake_time = float("inf")
+        self._event = threading.Event()
+
+    def wake(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    def wait(self, seconds):
+        self._event.wait(seconds)
+
+
+class _AsyncSleeper():
+
+    """
+    Like :class:`._Sleeper`, for :func:`.Timeline.async_sleep`. Callbacks may be scheduled from
+    other threads, so the event is set from the event loop
+    """
+
+    __slots__ = ("wake_time", "_loop", "_event")
+
+    def __init__(self, loop):
+        super().__init__()
+        self.wake_time = float("inf")
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def wake(self):
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self, seconds):
+        try:
+            await asyncio.wait_for(self._event.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+class CheckpointError(Exception):
+    pass
+
+
+class TimelineCheckpoint():
+
+    """
+    Timeline state captured by :func:`.Timeline.checkpoint`
+    """
+
+    def __init__(self, placeholder, state, time_ns, time_factor, monotonic_adjustment):
+        super().__init__()
+        self._placeholder = placeholder
+        self._state = state
+        #: the captured virtual time in nanoseconds, or None if the timeline was unmodified
+        self.time_ns = time_ns
+        self.time_factor = time_factor
+        self._monotonic_adjustment = monotonic_adjustment
+
+
+class _TimelinePlaceholder():
+    # stands for the timeline in checkpoints, and is replaced by the restored timeline
+    pass
+
+
+def _check_capturable(callback):
+    while isinstance(callback, functools.partial):
+        callback = callback.func
+    if isinstance(callback, types.FunctionType) and callback.__closure__:
+        raise CheckpointError(
+            "Cannot capture {!r}, as the variables it closes over would be shared with the restored "
+            "timelines. Use a bound method or a functools.partial instead".format(callback))
+
+
+class ScheduledItem():
+
+    """
+    Handle to a callback scheduled with :func:`.Timeline.schedule_callback`
+    """
+
+    __slots__ = ("_time", "callback", "_timeline", "_seq")
+
+    def __init__(self, timeline, callback):
+        # no super().__init__() call, as this is created for every scheduled callback
+        self._time = None
         self.callback = callback
+        self._timeline = timeline
+        self._seq = None
+
+    @property
+    def time(self):
+        """
+        The virtual time the callback was last scheduled for
+        """
+        return self._time / _NS_PER_SECOND if self._time is not None else None
+
+    def is_pending(self):
+        """
+        Returns whether the callback is still waiting to be called
+        """
+        return self._seq is not None
+
+    def _get_profiled_callback(self):
+        # the callback named by profiles, when pushed to the scheduler
+        return self.callback
+
+    def __deepcopy__(self, memo):
+        # used by Timeline.checkpoint
+        copied = object.__new__(type(self))
+        memo[id(self)] = copied
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                value = getattr(self, name)
+                _check_capturable(value)
+                try:
+                    setattr(copied, name, copy.deepcopy(value, memo))
+                except CheckpointError:
+                    raise
+                except Exception as e:
+                    raise CheckpointError("Cannot capture scheduled callback {!r}: {}".format(self.callback, e)) from e
+        return copied
+
+    def cancel(self):
+        """
+        Cancels the callback. Returns False if it was no longer pending
+        """
+        return self._timeline._cancel_scheduled(self)
+
+    def reschedule(self, delay):
+        """
+        Moves the callback to be called ``delay`` seconds from now, re-arming it if it was already called or cancelled
+        """
+        self._timeline._reschedule(self, delay)
+
+
+class ScheduledStream(ScheduledItem):
+
+    """
+    Handle to a stream of events scheduled with :func:`.Timeline.schedule_stream`. Streams follow
+    the times of their events, so they can be cancelled but not rescheduled: :func:`.reschedule`
+    raises :class:`TypeError`
+    """
+
+    __slots__ = ("_events", "_event_callback")
+
+    def __init__(self, timeline, events):
+        super().__init__(timeline, self._fire)
+        self._events = events
+        self._event_callback = None
 
-    def __lt__(self, other):
-        if not isinstance(other, ScheduledItem):
-            return NotImplemented
-        return self.time < other.time
+    def _fire(self):
+        try:
+            self._event_callback()
+        finally:
+            self._schedule_next()
+
+    def _schedule_next(self):
+        if self._events is None:
+            return
+        try:
+            event_time, self._event_callback = next(self._events)
+        except StopIteration:
+            self._events = self._event_callback = None
+            return
+        event_time_ns = _to_ns(event_time)
+        if self._time is not None and event_time_ns < self._time:
+            self._events = self._event_callback = None
+            raise ValueError("Stream events must be ordered by time ({} < {})".format(event_time, self.time))
+        self._timeline._push_scheduled(self, event_time_ns)
+
+    def cancel(self):
+        """
+        Stops the stream. Returns False if it had already ended
+        """
+        if self._events is None:
+            return False
+        self._events = self._event_callback = None
+        self._timeline._cancel_scheduled(self)
+        return True
+
+    def reschedule(self, delay):
+        raise TypeError("Event streams cannot be rescheduled, as their events carry their own times")
+
+    def _get_profiled_callback(self):
+        return self._event_callback
+
+
+class ScheduledInterval(ScheduledItem):
+
+    """
+    Handle to a periodic callback scheduled with :func:`.Timeline.schedule_interval`. The same
+    handle is pushed back to the scheduler after every call
+    """
+
+    __slots__ = ("_interval_callback", "_period", "_missed", "_active")
+
+    def __init__(self, timeline, callback, period, missed):
+        super().__init__(timeline, self._fire)
+        self._interval_callback = callback
+        self._period = period
+        self._missed = missed
+        self._active = True
+
+    def _get_profiled_callback(self):
+        return self._interval_callback
+
+    def _fire(self):
+        scheduled_time = self._time
+        period = self._period
+        num_ticks = 1
+        if self._missed != MISSED_TICKS_CALL_ALL:
+            # ticks up to the actual time of the timeline are all due at once
+            num_ticks += max(0, self._timeline._get_clock_time_ns() - scheduled_time) // period
+        try:
+            if self._missed == MISSED_TICKS_COALESCE:
+                self._interval_callback(num_ticks)
+            else:
+                self._interval_callback()
+        finally:
+            # the callback may have cancelled or rescheduled the interval
+            if self._active and self._seq is None:
+                self._timeline._push_scheduled(self, scheduled_time + num_ticks * period)
+
+    def cancel(self):
+        """
+        Stops the periodic calls. Returns False if they were already stopped
+        """
+        if not self._active:
+            return False
+        self._active = False
+        self._timeline._cancel_scheduled(self)
+        return True
+
+    def reschedule(self, delay):
+        """
+        Moves the next call to ``delay`` seconds from now, the following ones keeping the same
+        period. Restarts the periodic calls if they were stopped
+        """
+        self._active = True
+        super().reschedule(delay)
 
 
 class TimeCorrection():
 
     """
-    Utility class used for keeping records of time shifts or corrections
+    Utility class used for keeping records of time shifts or corrections. The virtual time and the
+    shift are integer nanoseconds, the real time is in seconds
     """
 
-    def __init__(self, virtual_time, real_time):
+    def __init__(self, virtual_time, real_time, shift=0, time_factor=1):
         super().__init__()
         self.virtual_time = virtual_time
         self.real_time = real_time
-        self.shift = 0
+        self.shift = shift
+        self.time_factor = time_factor
@@ -0,0 +1,275 @@
+"""
+Binary traces of the scheduling and dispatching of callbacks, and replays checking that a rerun
+dispatches callbacks in the same order
+"""
+import functools
+import struct
+
+from .instrumentation import _get_callback_name
+
+TRACE_SCHEDULE = "schedule"
+TRACE_DISPATCH = "dispatch"
+TRACE_TIME = "time"
+
+_HEADER = b"FLUXTRC\x03"
+# the virtual time ns and the next sequence number when the trace started, following the header
+_START = struct.Struct("<qQ")
+_SCHEDULE_RECORD = 1
+_DISPATCH_RECORD = 2
+_TIME_RECORD = 3
+_NAME_RECORD = 4
+# (record type, virtual time ns, sequence number, callback id)
+_EVENT = struct.Struct("<BqQI")
+# (record type, virtual time ns, time factor)
+_TIME = struct.Struct("<Bqd")
+# (record type, callback id, name length), followed by the UTF-8 name
+_NAME = struct.Struct("<BIH")
+_MAX_NAME_LENGTH = 0xffff
+
+
+class TraceDivergence(Exception):
+    pass
+
+
+class TraceEvent():
+
+    """
+    An event read from a trace. Scheduling and dispatching events have the virtual time in
+    nanoseconds the callback was scheduled for, its sequence number and the qualified name of the
+    callback. Time events have the new virtual time and time factor
+    """
+
+    __slots__ = ("kind", "time_ns", "seq", "callback_name", "time_factor")
+
+    def __init__(self, kind, time_ns, seq=None, callback_name=None, time_factor=None):
+        self.kind = kind
+        self.time_ns = time_ns
+        self.seq = seq
+        self.callback_name = callback_name
+        self.time_factor = time_factor
+
+    def __eq__(self, other):
+        return isinstance(other, TraceEvent) and self._as_tuple() == other._as_tuple()
+
+    def __hash__(self):
+        return hash(self._as_tuple())
+
+    def _as_tuple(self):
+        return (self.kind, self.time_ns, self.seq, self.callback_name, self.time_factor)
+
+    def __repr__(self):
+        if self.kind == TRACE_TIME:
+            return "<TraceEvent time {} (factor {})>".format(self.time_ns, self.time_factor)
+        return "<TraceEvent {} {} #{} at {}>".format(self.kind, self.callback_name, self.seq, self.time_ns)
+
+
+def read_trace(f):
+    """
+    Yields the :class:`.TraceEvent` recorded to the binary file object ``f`` by
+    :func:`.Timeline.start_trace`
+    """
+    _read_start(f)
+    yield from _read_events(f)
+
+
+def _read_start(f):
+    if f.read(len(_HEADER)) != _HEADER:
+        raise ValueError("Not a flux trace")
+    data = f.read(_START.size)
+    if len(data) < _START.size:
+        raise ValueError("Corrupt trace: truncated header")
+    return _START.unpack(data)
+
+
+def _read_events(f):
+    names = {}
+    kinds = {_SCHEDULE_RECORD: TRACE_SCHEDULE, _DISPATCH_RECORD: TRACE_DISPATCH}
+    data = b""
+    offset = 0
+    end_of_file = False
+    while True:
+        # refilled while the longest record might not fit
+        if not end_of_file and len(data) - offset < _NAME.size + _MAX_NAME_LENGTH:
+            chunk = f.read(1 << 20)
+            end_of_file = not chunk
+            data = data[offset:] + chunk
+            offset = 0
+        if offset >= len(data):
+            return
+        record_type = data[offset]
+        if record_type == _NAME_RECORD:
+            _, callback_id, length = _NAME.unpack_from(data, offset)
+            offset += _NAME.size
+            names[callback_id] = data[offset:offset + length].decode("utf-8")
+            offset += length
+        elif record_type == _TIME_RECORD:
+            _, time_ns, time_factor = _TIME.unpack_from(data, offset)
+            offset += _TIME.size
+            yield TraceEvent(TRACE_TIME, time_ns, time_factor=time_factor)
+        elif record_type in kinds:
+            _, time_ns, seq, callback_id = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            yield TraceEvent(kinds[record_type], time_ns, seq, names[callback_id])
+        else:
+            raise ValueError("Corrupt trace: unknown record type {}".format(record_type))
+
+
+class TraceRecorder():
+
+    """
+    Appends the events of a timeline to a binary file object, buffering up to ``buffer_size`` bytes
+    """
+
+    def __init__(self, f, buffer_size=1 << 16):
+        super().__init__()
+        self._file = f
+        self._buffer = bytearray()
+        self._buffer_size = buffer_size
+        # callback name -> id in the trace
+        self._callback_ids = {}
+        self._callback_ids_by_key = {}
+
+    def flush(self):
+        """
+        Writes the buffered events to the file
+        """
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+
+    def _get_callback_id(self, item):
+        callback = item._get_profiled_callback()
+        while isinstance(callback, functools.partial):
+            callback = callback.func
+        # names are only computed once per code object, which all closures of a function share, or
+        # once per class for callable objects, which are named after it
+        key = getattr(getattr(callback, "__func__", callback), "__code__", None)
+        if key is None and not hasattr(callback, "__qualname__"):
+            key = type(callback)
+        if key is not None:
+            callback_id = self._callback_ids_by_key.get(key)
+            if callback_id is not None:
+                return callback_id
+        name = _get_callback_name(callback)
+        callback_id = self._callback_ids.get(name)
+        if callback_id is None:
+            callback_id = self._callback_ids[name] = len(self._callback_ids)
+            encoded = name.encode("utf-8")[:_MAX_NAME_LENGTH]
+            self._buffer += _NAME.pack(_NAME_RECORD, callback_id, len(encoded))
+            self._buffer += encoded
+        if key is not None:
+            self._callback_ids_by_key[key] = callback_id
+        return callback_id
+
+    def _start(self, time_ns, seq):
+        self._buffer += _HEADER
+        self._buffer += _START.pack(time_ns, seq)
+
+    def _on_push(self, time_ns, seq, item):
+        self._buffer += _EVENT.pack(_SCHEDULE_RECORD, time_ns, seq, self._get_callback_id(item))
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def _on_pop(self, time_ns, seq, item):
+        self._buffer += _EVENT.pack(_DISPATCH_RECORD, time_ns, seq, self._get_callback_id(item))
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def _on_time_change(self, time_ns, time_factor):
+        self._buffer += _TIME.pack(_TIME_RECORD, time_ns, time_factor)
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def _stop(self):
+        self.flush()
+
+
+class TraceReplayer():
+
+    """
+    Compares the callbacks dispatched by a timeline with those recorded in a trace, raising
+    :class:`.TraceDivergence` at the first callback dispatched out of order. Times and sequence
+    numbers are compared relative to the start of the trace and of the replay, and reported on the
+    recorded timeline
+    """
+
+    def __init__(self, f):
+        super().__init__()
+        self._file = f
+        self._expected = ()
+        # added to recorded times and sequence numbers to get the replayed ones
+        self._offset = 0
+        self._seq_offset = 0
+        #: the number of callbacks dispatched as recorded so far
+        self.num_replayed = 0
+
+    def _start(self, time_ns, seq):
+        start_time_ns, start_seq = _read_start(self._file)
+        self._offset = time_ns - start_time_ns
+        self._seq_offset = seq - start_seq
+        self._expected = (event for event in _read_events(self._file) if event.kind == TRACE_DISPATCH)
+
+    def _on_push(self, time_ns, seq, item):
+        pass
+
+    def _on_pop(self, time_ns, seq, item):
+        actual = TraceEvent(TRACE_DISPATCH, time_ns - self._offset, seq - self._seq_offset,
+                            _get_callback_name(item._get_profiled_callback()))
+        expected = next(self._expected, None)
+        if actual != expected:
+            raise TraceDivergence("Dispatch #{} diverged from the trace: expected {!r}, got {!r}".format(
+                self.num_replayed, expected, actual))
+        self.num_replayed += 1
+
+    def get_num_remaining(self):
+        """
+        Returns the number of recorded dispatches which were not replayed, reading the rest of the
+        trace
+        """
+        self._expected, remaining = (), self._expected
+        return sum(1 for _ in remaining)
+
+    def _on_time_change(self, time_ns, time_factor):
+        pass
+
+    def _stop(self):
+        pass
+
+
+class _TracedScheduler():
+
+    """
+    Reports pushed and popped entries of a scheduler to a trace recorder or replayer
+    """
+
+    def __init__(self, scheduler, tracer):
+        super().__init__()
+        self._scheduler = scheduler
+        self._tracer = tracer
+
+    def __len__(self):
+        return len(self._scheduler)
+
+    def push(self, time, seq, item):
+        self._scheduler.push(time, seq, item)
+        self._tracer._on_push(time, seq, item)
+
+    def push_many(self, entries):
+        self._scheduler.push_many(entries)
+        for entry in entries:
+            self._tracer._on_push(*entry)
+
+    def peek_time(self):
+        return self._scheduler.peek_time()
+
+    def pop_due(self, current_time):
+        entry = self._scheduler.pop_due(current_time)
+        if entry is not None:
+            # marked as fired first, so that a divergence raised by a replay does not leave the
+            # dropped item pending
+            entry[2]._seq = None
+            self._tracer._on_pop(*entry)
+        return entry
+
+    def notify_cancelled(self, time):
+        self._scheduler.notify_cancelled(time)
@@ -1,6 +1,12 @@
+import time
+from unittest import TestCase
+
 import flux
 import forge
-from flux.gevent_timeline import GeventTimeline
+import gevent
+import gevent.event
+from flux.gevent_timeline import GeventTimeline, install_timeline_hub, uninstall_timeline_hub
+from flux.timeline import Timeline
 from .test__timeline import TimeFactorTest, CurrentTimeLineTest, DatetimeTest, ScheduleSequenceTest, ScheduleTest, TimelineAPITest
 
 class GeventTimeFactorTest(TimeFactorTest):
@@ -35,3 +41,55 @@ class GeventScheduleTest(ScheduleTest):
 class GeventTimelineAPITest(TimelineAPITest):
     def _get_timeline(self):
         return GeventTimeline()
+
+class TimelineHubTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.timeline = Timeline()
+        self.timeline.freeze()
+        self.start_time = self.timeline.time()
+        install_timeline_hub(self.timeline)
+        self.addCleanup(uninstall_timeline_hub)
+
+    def _elapsed(self):
+        return self.timeline.time() - self.start_time
+
+    def test__greenlet_sleeps(self):
+        woken = []
+        def worker(name, seconds):
+            for _ in range(3):
+                gevent.sleep(seconds)
+                woken.append((name, self._elapsed()))
+        gevent.joinall([gevent.spawn(worker, "a", 100), gevent.spawn(worker, "b", 250)])
+        self.assertEqual(woken, [("a", 100), ("a", 200), ("b", 250), ("a", 300), ("b", 500), ("b", 750)])
+
+    def test__event_wait_timeout(self):
+        self.assertFalse(gevent.event.Event().wait(3600))
+        self.assertEqual(self._elapsed(), 3600)
+
+    def test__event_set_before_timeout(self):
+        event = gevent.event.Event()
+        gevent.spawn_later(10, event.set)
+        self.assertTrue(event.wait(3600))
+        self.assertEqual(self._elapsed(), 10)
+        gevent.sleep(5000)
+        self.assertEqual(self._elapsed(), 5010)
+
+    def test__timeout(self):
+        with self.assertRaises(gevent.Timeout):
+            with gevent.Timeout(50):
+                gevent.sleep(100)
+        self.assertEqual(self._elapsed(), 50)
+
+    def test__timeline_callbacks(self):
+        called = []
+        self.timeline.schedule_callback(30, lambda: called.append(self._elapsed()))
+        gevent.sleep(60)
+        self.assertEqual(called, [30])
+
+    def test__time_factor_does_not_sleep_for_real(self):
+        self.timeline.set_time_factor(1)
+        real_start_time = time.time()
+        gevent.sleep(24 * 60 * 60)
+        self.assertGreaterEqual(self._elapsed(), 24 * 60 * 60)
+        self.assertLess(time.time() - real_start_time, 60)
@@ -0,0 +1,100 @@
+import functools
+from unittest import TestCase
+
+from flux.parallel import run_partitioned
+
+
+def _ping(partition, remaining, sent_time):
+    partition.result.append((partition.name, sent_time, partition.timeline.time()))
+    if remaining:
+        target = "b" if partition.name == "a" else "a"
+        partition.send(target, 1.5, _ping, remaining - 1, partition.timeline.time())
+
+
+def _tick(partition):
+    partition.result.append((partition.name, "tick", partition.timeline.time()))
+    partition.timeline.schedule_callback(1, _tick, partition)
+
+
+def _setup(partition, num_pings=0, ticking=False):
+    partition.result = []
+    if num_pings:
+        partition.timeline.schedule_callback(0, _ping, partition, num_pings, None)
+    if ticking:
+        partition.timeline.schedule_callback(1, _tick, partition)
+
+
+def _send_from_setup(partition, later_event=False):
+    _setup(partition)
+    if later_event:
+        partition.timeline.schedule_callback(5, dict)
+    partition.send("b", 1, _ping, 0, partition.timeline.time())
+
+
+def _send_too_soon(partition):
+    partition.timeline.schedule_callback(1, partition.send, "b", 0.5, _ping, 0, None)
+
+
+def _fail(partition):
+    partition.timeline.schedule_callback(3, _raise)
+
+
+def _raise():
+    raise ZeroDivisionError()
+
+
+class RunPartitionedTest(TestCase):
+
+    processes = False
+
+    def _run(self, partitions, lookahead=1, until=10):
+        return run_partitioned(partitions, lookahead, until, processes=self.processes)
+
+    def test__messages(self):
+        results = self._run({"a": functools.partial(_setup, num_pings=4), "b": _setup})
+        self.assertEqual(results["a"].value, [("a", None, 0), ("a", 1.5, 3), ("a", 4.5, 6)])
+        self.assertEqual(results["b"].value, [("b", 0, 1.5), ("b", 3, 4.5)])
+        self.assertEqual((results["a"].num_sent, results["a"].num_received), (2, 2))
+        self.assertEqual((results["b"].num_sent, results["b"].num_received), (2, 2))
+        self.assertEqual(results["b"].num_events, 2)
+
+    def test__messages_interleaved_with_local_events(self):
+        results = self._run({"a": functools.partial(_setup, num_pings=10), "b": functools.partial(_setup, ticking=True)},
+                            until=5)
+        self.assertEqual(results["b"].value, [
+            ("b", "tick", 1), ("b", 0, 1.5), ("b", "tick", 2), ("b", "tick", 3),
+            ("b", "tick", 4), ("b", 3, 4.5), ("b", "tick", 5)])
+        self.assertEqual(results["a"].value[-1], ("a", 1.5, 3))
+
+    def test__messages_sent_from_setup(self):
+        results = self._run({"a": _send_from_setup, "b": _setup})
+        self.assertEqual(results["b"].value, [("b", 0, 1)])
+        self.assertEqual(results["b"].num_received, 1)
+
+    def test__messages_sent_from_setup_by_partition_with_later_events(self):
+        results = self._run({"a": functools.partial(_send_from_setup, later_event=True),
+                             "b": functools.partial(_setup, ticking=True)}, until=6)
+        self.assertEqual(results["b"].value[:3], [("b", "tick", 1), ("b", 0, 1), ("b", "tick", 2)])
+
+    def test__lookahead_shorter_than_delays(self):
+        partitions = {"a": functools.partial(_setup, num_pings=6), "b": _setup}
+        self.assertEqual(
+            {name: result.value for name, result in self._run(partitions, lookahead=0.25).items()},
+            {name: result.value for name, result in self._run(partitions, lookahead=1.5).items()})
+
+    def test__delay_shorter_than_lookahead(self):
+        with self.assertRaises(ValueError):
+            self._run({"a": _send_too_soon, "b": _setup})
+
+    def test__partition_errors(self):
+        with self.assertRaises(ZeroDivisionError):
+            self._run({"a": _fail, "b": functools.partial(_setup, ticking=True)})
+
+    def test__invalid_lookahead(self):
+        with self.assertRaises(ValueError):
+            self._run({"a": _setup}, lookahead=0)
+
+
+class RunPartitionedProcessesTest(RunPartitionedTest):
+
+    processes = True
@@ -0,0 +1,156 @@
+import random
+
+import pytest
+from flux.schedulers import HeapScheduler, TimingWheelScheduler
+from flux.timeline import Timeline
+from .test__timeline import ScheduleSequenceTest, ScheduleTest, TimelineAPITest
+
+
+class _TimingWheelTimelineMixin():
+    def _get_timeline(self):
+        return Timeline(scheduler=TimingWheelScheduler())
+
+class TimingWheelScheduleSequenceTest(_TimingWheelTimelineMixin, ScheduleSequenceTest):
+    pass
+
+class TimingWheelScheduleTest(_TimingWheelTimelineMixin, ScheduleTest):
+    pass
+
+class TimingWheelTimelineAPITest(_TimingWheelTimelineMixin, TimelineAPITest):
+    pass
+
+
+def _record_firing_order(scheduler, delays, cancel_every=None):
+    timeline = Timeline(scheduler=scheduler)
+    timeline.freeze()
+    fired = []
+    items = [timeline.schedule_callback(delay, fired.append, index) for index, delay in enumerate(delays)]
+    if cancel_every is not None:
+        for item in items[::cancel_every]:
+            item.cancel()
+    for _ in range(20):
+        timeline.sleep(max(delays) / 10)
+    timeline.sleep_wait_all_scheduled()
+    return fired
+
+
+@pytest.mark.parametrize("cancel_every", [None, 3])
+@pytest.mark.parametrize("max_delay", [0.01, 1, 100, 10 ** 6, 10 ** 9])
+def test_timing_wheel_fires_in_heap_order(max_delay, cancel_every):
+    rand = random.Random(max_delay)
+    delays = [rand.choice([0, max_delay / 2, rand.uniform(0, max_delay)]) for _ in range(2000)]
+    expected = _record_firing_order(HeapScheduler(), delays, cancel_every)
+    assert _record_firing_order(TimingWheelScheduler(), delays, cancel_every) == expected
+    assert _record_firing_order(TimingWheelScheduler(resolution=1, slot_bits=2, num_levels=2), delays, cancel_every) == expected
+
+
+def test_timing_wheel_schedule_from_callback():
+    timeline = Timeline(scheduler=TimingWheelScheduler())
+    timeline.freeze()
+    start_time = timeline.time()
+    fired = []
+
+    def callback(remaining):
+        fired.append(timeline.time())
+        if remaining:
+            timeline.schedule_callback(0, callback, remaining - 1)
+            timeline.schedule_callback(1000, callback, 0)
+
+    timeline.schedule_callback(5000, callback, 2)
+    timeline.sleep_wait_all_scheduled()
+    assert fired == [start_time + delay for delay in (5000, 5000, 5000, 6000, 6000)]
+
+
+def test_timing_wheel_invalid_resolution():
+    with pytest.raises(ValueError):
+        TimingWheelScheduler(resolution=0)
+
+
+def test_timing_wheel_far_timer_does_not_move_current_tick():
+    scheduler = TimingWheelScheduler()
+    timeline = Timeline(scheduler=scheduler)
+    timeline.freeze()
+    fired = []
+    timeline.schedule_callback(30 * 24 * 3600, fired.append, "far")
+    timeline.run_for(1)
+    assert timeline._scheduled.peek_time() is not None
+    delays = [3600 * index / 10000 for index in range(10000)]
+    for delay in delays:
+        timeline.schedule_callback(delay, fired.append, delay)
+    # the near timers are spread over the wheels instead of piling up in the ready heap
+    assert len(scheduler._ready) < 100
+    timeline.run_for(3600)
+    assert fired == delays
+    assert len(scheduler._ready) < 100
+    timeline.sleep_wait_all_scheduled()
+    assert fired[-1] == "far"
+
+
+def _record_peeks_with_watchdog(scheduler, delays, watchdog_delay):
+    timeline = Timeline(scheduler=scheduler)
+    timeline.freeze()
+    start_time = timeline.time_ns()
+    rand = random.Random(watchdog_delay)
+    items = [timeline.schedule_callback(delay, dict) for delay in delays]
+    timeline.sleep(0)
+    peeks = []
+    for index in range(300):
+        # a watchdog re-armed and cancelled, as well as pending callbacks cancelled at random
+        timeline.schedule_callback(watchdog_delay, dict).cancel()
+        if index % 3 == 0:
+            items.pop(rand.randrange(len(items))).cancel()
+        peeks.append(scheduler.peek_time() - start_time)
+        timeline.sleep_stop_first_scheduled(0.001)
+    return peeks
+
+
+@pytest.mark.parametrize("watchdog_delay", [1, 2000])
+def test_timing_wheel_peek_after_cancel(watchdog_delay):
+    rand = random.Random(0)
+    delays = sorted(rand.uniform(1000, 3600) for _ in range(1000))
+    expected = _record_peeks_with_watchdog(HeapScheduler(), delays, watchdog_delay)
+    assert _record_peeks_with_watchdog(TimingWheelScheduler(), delays, watchdog_delay) == expected
+    assert _record_peeks_with_watchdog(TimingWheelScheduler(resolution=1, slot_bits=2, num_levels=2), delays, watchdog_delay) == expected
+
+
+def _record_peeks_with_random_operations(scheduler, seed):
+    # starts cancelling and rescheduling before the first dispatch, and schedules far enough for
+    # cancelled entries to be moved down the wheels later on
+    timeline = Timeline(scheduler=scheduler)
+    timeline.freeze()
+    start_time = timeline.time_ns()
+    rand = random.Random(seed)
+    items = []
+    peeks = []
+    for _ in range(200):
+        operation = rand.choice(["schedule", "schedule", "cancel", "reschedule", "sleep", "peek"])
+        if operation == "schedule":
+            items.append(timeline.schedule_callback(rand.choice([0.0005, 1, 5, rand.uniform(0, 3000)]), dict))
+        elif operation == "cancel" and items:
+            items.pop(rand.randrange(len(items))).cancel()
+        elif operation == "reschedule" and items:
+            rand.choice(items).reschedule(rand.uniform(0, 3000))
+        elif operation == "sleep":
+            timeline.sleep(rand.choice([0, 0.0005, rand.uniform(0, 100)]))
+        peek_time = scheduler.peek_time()
+        peeks.append(None if peek_time is None else peek_time - start_time)
+    timeline.sleep_wait_all_scheduled()
+    peeks.append(timeline.time_ns() - start_time)
+    return peeks
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_timing_wheel_peek_matches_heap(seed):
+    expected = _record_peeks_with_random_operations(HeapScheduler(), seed)
+    assert _record_peeks_with_random_operations(TimingWheelScheduler(), seed) == expected
+    assert _record_peeks_with_random_operations(TimingWheelScheduler(resolution=1, slot_bits=2, num_levels=2), seed) == expected
+
+
+def test_timing_wheel_does_not_wait_for_timer_cancelled_before_first_dispatch():
+    timeline = Timeline(scheduler=TimingWheelScheduler())
+    timeline.freeze()
+    start_time = timeline.time_ns()
+    timeline.schedule_callback(5, dict).cancel()
+    timeline.sleep(0.0005)
+    timeline.sleep_wait_all_scheduled()
+    assert timeline.time_ns() - start_time == 500000
@@ -0,0 +1,205 @@
+from unittest import TestCase
+
+from flux.sequence import Event, Sequence
+from flux.timeline import Timeline
+
+
+class SequenceRuntimeTest(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.timeline = Timeline()
+        self.timeline.freeze()
+        self.start_time = self.timeline.time()
+        self.log = []
+
+    def _log(self, *args):
+        self.log.append((self.timeline.time() - self.start_time,) + args)
+
+    def test__generator_sequence(self):
+        def worker():
+            for _ in range(3):
+                yield Sequence.sleep(10)
+                self._log("tick")
+            return "done"
+
+        seq = Sequence(worker())
+        seq.run(self.timeline)
+        self.timeline.sleep_wait_all_scheduled()
+        self.assertEqual(self.log, [(10, "tick"), (20, "tick"), (30, "tick")])
+        self.assertTrue(seq.is_finished())
+        self.assertFalse(seq.is_running())
+        self.assertEqual(seq.get_result(), "done")
+
+    def test__single_scheduled_item_per_sequence(self):
+        def worker():
+            while True:
+                yield Sequence.sleep(1)
+
+        seqs = [Sequence(worker()) for _ in range(100)]
+        for seq in seqs:
+            seq.run(self.timeline)
+        self.timeline.sleep(50)
+        self.assertEqual(len(self.timeline._scheduled), 100)
+        self.assertEqual(len({id(seq._item) for seq in seqs}), 100)
+
+    def test__wait_for_event(self):
+        event = Event()
+
+        def waiter(name):
+            result = yield event
+            self._log(name, result)
+
+        def setter():
+            yield Sequence.sleep(5)
+            event.set()
+
+        for name in ("a", "b"):
+            Sequence(waiter(name)).run(self.timeline)
+        Sequence(setter()).run(self.timeline)
+        self.timeline.sleep(10)
+        self.assertEqual(self.log, [(5, "a", True), (5, "b", True)])
+
+    def test__already_set_event(self):
+        event = Event()
+        event.set()
+
+        def waiter():
+            yield event
+            self._log("woke")
+
+        Sequence(waiter()).run(self.timeline)
+        self.assertEqual(self.log, [(0, "woke")])
+
+    def test__wait_with_timeout(self):
+        event = Event()
+
+        def waiter(timeout):
+            result = yield Sequence.wait(event, timeout)
+            self._log(timeout, result)
+
+        Sequence(waiter(3)).run(self.timeline)
+        Sequence(waiter(30)).run(self.timeline)
+        self.timeline.sleep(10)
+        event.set()
+        self.timeline.sleep(100)
+        self.assertEqual(self.log, [(3, 3, False), (10, 30, True)])
+        self.assertEqual(len(self.timeline._scheduled), 0)
+
+    def test__join_sequence(self):
+        def child(delay):
+            yield Sequence.sleep(delay)
+            return delay * 2
+
+        def parent():
+            running = Sequence(child(10))
+            running.run(self.timeline)
+            first = yield Sequence(child(5))
+            self._log("sub-sequence", first)
+            second = yield running
+            self._log("joined", second)
+            third = yield running
+            self._log("joined again", third)
+
+        Sequence(parent()).run(self.timeline)
+        self.timeline.sleep_wait_all_scheduled()
+        self.assertEqual(self.log, [(5, "sub-sequence", 10), (10, "joined", 20), (10, "joined again", 20)])
+
+    def test__join_with_timeout(self):
+        def child():
+            yield Sequence.sleep(10)
+
+        def parent():
+            seq = Sequence(child())
+            self._log((yield Sequence.wait(seq, 3)))
+            self._log((yield Sequence.wait(seq, 30)))
+
+        Sequence(parent()).run(self.timeline)
+        self.timeline.sleep_wait_all_scheduled()
+        self.assertEqual(self.log, [(3, False), (10, True)])
+
+    def test__join_failed_sequence(self):
+        def child():
+            yield Sequence.sleep(1)
+            raise ZeroDivisionError()
+
+        def parent():
+            try:
+                yield Sequence(child())
+            except ZeroDivisionError:
+                self._log("caught")
+
+        Sequence(parent()).run(self.timeline)
+        self.timeline.sleep(5)
+        self.assertEqual(self.log, [(1, "caught")])
+
+    def test__failed_sequence_without_joiner(self):
+        def child():
+            yield Sequence.sleep(1)
+            raise ZeroDivisionError()
+
+        def waiter(seq):
+            self._log((yield Sequence.wait(seq)))
+
+        seq = Sequence(child())
+        seq.run(self.timeline)
+        Sequence(waiter(seq)).run(self.timeline)
+        with self.assertRaises(ZeroDivisionError):
+            self.timeline.sleep(5)
+        self.timeline.sleep(5)
+        self.assertEqual(self.log, [(1, True)])
+
+    def test__stop_waiting_sequence(self):
+        event = Event()
+
+        def waiter():
+            yield Sequence.wait(event, 10)
+            self._log("woke")
+
+        def joiner(seq):
+            result = yield seq
+            self._log("joined", result)
+
+        seq = Sequence(waiter())
+        seq.run(self.timeline)
+        Sequence(joiner(seq)).run(self.timeline)
+        self.timeline.sleep(1)
+        seq.stop()
+        event.set()
+        self.timeline.sleep(20)
+        self.assertEqual(self.log, [(1, "joined", None)])
+        self.assertFalse(seq.is_running())
+        self.assertTrue(seq.is_finished())
+
+    def test__negative_delays(self):
+        event = Event()
+
+        def sleeper():
+            yield Sequence.sleep(-5)
+
+        def waiter():
+            yield Sequence.wait(event, -5)
+
+        for worker in (sleeper, waiter):
+            with self.assertRaisesRegex(ValueError, "negative"):
+                Sequence(worker()).run(self.timeline)
+        self.assertEqual(len(self.timeline._scheduled), 0)
+        self.assertIsNone(event._joiners)
+
+    def test__many_sequences(self):
+        event = Event()
+        num_sequences = 10000
+
+        def worker(index):
+            yield Sequence.sleep(index % 7)
+            yield event
+            yield Sequence.sleep(1)
+            return index
+
+        seqs = [Sequence(worker(index)) for index in range(num_sequences)]
+        for seq in seqs:
+            seq.run(self.timeline)
+        self.timeline.run_for(10)
+        event.set()
+        self.timeline.run_for(10)
+        self.assertEqual([seq.get_result() for seq in seqs], list(range(num_sequences)))
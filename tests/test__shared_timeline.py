@@ -0,0 +1,87 @@
+import multiprocessing
+import sys
+import time
+from unittest import TestCase, skipIf
+
+from flux.shared_timeline import SharedClockTimeline
+from .test__timeline import CheckpointTest, TimeFactorTest, TimelineAPITest
+
+
+class SharedClockTimeFactorTest(TimeFactorTest):
+    def _get_timeline(self):
+        return SharedClockTimeline()
+
+
+class SharedClockTimelineAPITest(TimelineAPITest):
+    def _get_timeline(self):
+        return SharedClockTimeline()
+
+
+class SharedClockCheckpointTest(CheckpointTest):
+    def _get_timeline(self):
+        return SharedClockTimeline()
+
+
+def _report_time(timeline, requests, times):
+    while requests.get() is not None:
+        times.put((timeline.time(), timeline.get_time_factor()))
+
+
+def _set_time(timeline, new_time):
+    timeline.set_time(new_time)
+
+
+def _set_time_factor(timeline, factor):
+    timeline.set_time_factor(factor)
+
+
+@skipIf(sys.platform == "win32", "requires fork")
+class SharedClockTest(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.context = multiprocessing.get_context("fork")
+        self.timeline = SharedClockTimeline()
+        self.timeline.freeze()
+        self.start_time = self.timeline.time()
+
+    def _run(self, target, *args):
+        process = self.context.Process(target=target, args=(self.timeline,) + args)
+        process.start()
+        self.addCleanup(process.join)
+        return process
+
+    def test__children_follow_the_parent_clock(self):
+        requests, times = self.context.Queue(), self.context.Queue()
+        self._run(_report_time, requests, times)
+        self.addCleanup(requests.put, None)
+        requests.put(True)
+        self.assertEqual(times.get(timeout=10), (self.start_time, 0))
+        self.timeline.sleep(100)
+        requests.put(True)
+        self.assertEqual(times.get(timeout=10), (self.start_time + 100, 0))
+        self.timeline.set_time_factor(2)
+        requests.put(True)
+        child_time, factor = times.get(timeout=10)
+        self.assertEqual(factor, 2)
+        self.assertGreaterEqual(child_time, self.start_time + 100)
+        self.assertLessEqual(child_time, self.timeline.time())
+
+    def test__parent_follows_the_child_clock(self):
+        self._run(_set_time, self.start_time + 3600).join(10)
+        self.assertEqual(self.timeline.time(), self.start_time + 3600)
+        self.assertEqual(self.timeline.monotonic(), self.timeline.time())
+
+    def test__shared_monotonic_adjustment(self):
+        self.timeline.set_time(self.start_time - 10, allow_backwards=True)
+        self._run(_set_time, self.start_time).join(10)
+        self.assertEqual(self.timeline.time(), self.start_time)
+        self.assertEqual(self.timeline.monotonic(), self.start_time + 10)
+
+    def test__sleep_follows_the_child_time_factor(self):
+        self._run(_set_time_factor, 1).join(10)
+        real_start_time = time.monotonic()
+        self.timeline.sleep(0.5)
+        self.assertGreaterEqual(time.monotonic() - real_start_time, 0.45)
+        self.assertGreaterEqual(self.timeline.time(), self.start_time + 0.5)
+        self.assertLess(self.timeline.time(), self.start_time + 10)
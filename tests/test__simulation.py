@@ -0,0 +1,67 @@
+import concurrent.futures
+
+import pytest
+from flux.simulation import SimulationResult, run_simulations
+
+
+def _random_walk(timeline, rand, steps, fail_at=None):
+    position = [0]
+
+    def step(remaining):
+        if remaining == fail_at:
+            raise ZeroDivisionError()
+        position[0] += rand.choice([-1, 1])
+        if remaining:
+            timeline.schedule_callback(rand.expovariate(1.0), step, remaining - 1)
+
+    timeline.schedule_callback(0, step, steps - 1)
+    timeline.sleep_wait_all_scheduled()
+    return position[0]
+
+
+def _get_param_sets(num_runs, steps=100):
+    return [{"steps": steps} for _ in range(num_runs)]
+
+
+def test_run_simulations():
+    results = sorted(run_simulations(_random_walk, _get_param_sets(8), max_workers=2), key=lambda result: result.index)
+    assert [result.index for result in results] == list(range(8))
+    for result in results:
+        assert isinstance(result, SimulationResult)
+        assert result.succeeded()
+        assert result.num_events == 100
+        assert result.simulated_time > 0
+        assert result.wall_time > 0
+        assert result.params == {"steps": 100}
+    assert len({result.seed for result in results}) == 8
+
+
+def test_run_simulations_deterministic():
+    def run(seed=3, **kwargs):
+        return [(result.index, result.seed, result.value, result.simulated_time)
+                for result in sorted(run_simulations(_random_walk, _get_param_sets(6), seed=seed, **kwargs), key=lambda result: result.index)]
+
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        sequential = run(executor=executor)
+    assert run(max_workers=3) == sequential
+    assert run(max_workers=3, seed=4) != sequential
+
+
+def test_run_simulations_failures_reported():
+    param_sets = _get_param_sets(4)
+    param_sets[2]["fail_at"] = 50
+    results = {result.index: result for result in run_simulations(_random_walk, param_sets, max_workers=2)}
+    assert [results[index].succeeded() for index in range(4)] == [True, True, False, True]
+    assert isinstance(results[2].exception, ZeroDivisionError)
+    assert results[2].num_events == 49
+
+
+def test_run_simulations_fail_fast():
+    param_sets = _get_param_sets(20)
+    param_sets[0]["fail_at"] = 99
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        results = []
+        with pytest.raises(ZeroDivisionError):
+            for result in run_simulations(_random_walk, param_sets, executor=executor, fail_fast=True):
+                results.append(result)  # pragma: no cover
+    assert results == []
@@ -0,0 +1,156 @@
+import threading
+import time
+from unittest import TestCase
+
+import forge
+from flux.threadsafe_timeline import ThreadSafeTimeline
+from .test__timeline import CheckpointTest, InstrumentationTest, ParallelDispatchTest, ScheduleSequenceTest, ScheduleTest, TimeFactorTest, TimelineAPITest
+
+
+class ThreadSafeTimeFactorTest(TimeFactorTest):
+    def _forge_timeline(self):
+        self.forge = forge.Forge()
+        self.forge.replace_with(ThreadSafeTimeline, "_real_time", self.time)
+        self.forge.replace_with(ThreadSafeTimeline, "_real_sleep", self.sleep)
+        self.timeline = ThreadSafeTimeline()
+
+class ThreadSafeScheduleSequenceTest(ScheduleSequenceTest):
+    def _get_timeline(self):
+        return ThreadSafeTimeline()
+
+class ThreadSafeScheduleTest(ScheduleTest):
+    def _get_timeline(self):
+        return ThreadSafeTimeline()
+
+class ThreadSafeTimelineAPITest(TimelineAPITest):
+    def _get_timeline(self):
+        return ThreadSafeTimeline()
+
+class ThreadSafeParallelDispatchTest(ParallelDispatchTest):
+    def _get_timeline(self):
+        return ThreadSafeTimeline()
+
+
+class ThreadSafeCheckpointTest(CheckpointTest):
+    def _get_timeline(self):
+        return ThreadSafeTimeline()
+
+
+class ThreadSafeInstrumentationTest(InstrumentationTest):
+    def _get_timeline(self):
+        return ThreadSafeTimeline()
+
+
+class ConcurrencyTest(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.timeline = ThreadSafeTimeline()
+        self.timeline.freeze()
+        self.start_time = self.timeline.time()
+
+    def _run_threads(self, target, num_threads=8):
+        threads = [threading.Thread(target=target, args=(index,)) for index in range(num_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test__concurrent_scheduling_and_cancelling(self):
+        called = []
+
+        def schedule(index):
+            for i in range(1000):
+                item = self.timeline.schedule_callback(i % 50, called.append, (index, i))
+                if i % 3 == 0:
+                    item.cancel()
+
+        self._run_threads(schedule)
+        self.timeline.sleep_wait_all_scheduled()
+        self.assertEqual(sorted(called), sorted((index, i) for index in range(8) for i in range(1000) if i % 3))
+
+    def test__concurrent_set_time(self):
+        def advance(_):
+            for _ in range(1000):
+                self.timeline.set_time(self.timeline.time() + 1)
+
+        self._run_threads(advance)
+        self.assertGreaterEqual(self.timeline.time(), self.start_time + 1000)
+        self.assertLessEqual(self.timeline.time(), self.start_time + 8000)
+
+    def test__forced_time_is_per_thread(self):
+        observed = []
+
+        def callback():
+            thread = threading.Thread(target=lambda: observed.append(self.timeline.time()))
+            thread.start()
+            thread.join()
+            observed.append(self.timeline.time())
+
+        self.timeline.schedule_callback(10, callback)
+        self.timeline.set_time(self.start_time + 20)
+        self.timeline.trigger_past_callbacks()
+        self.assertEqual(observed, [self.start_time + 20, self.start_time + 10])
+
+    def test__concurrent_sleepers_woken_by_earlier_callback(self):
+        self.timeline.set_time_factor(1)
+        called_real_times = []
+        start_real_time = time.monotonic()
+
+        def sleep(index):
+            # the short sleeper finishes first, leaving the long one sleeping
+            self.timeline.sleep(1.5 if index == 0 else 0.1)
+
+        def schedule():
+            time.sleep(0.3)
+            self.timeline.schedule_callback(0.1, lambda: called_real_times.append(time.monotonic()))
+
+        thread = threading.Thread(target=schedule)
+        thread.start()
+        self._run_threads(sleep, num_threads=2)
+        thread.join()
+        self.assertEqual(len(called_real_times), 1)
+        self.assertLess(called_real_times[0] - start_real_time, 0.9)
+
+
+class DispatcherTest(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.timeline = ThreadSafeTimeline()
+        self.addCleanup(self.timeline.stop_dispatcher)
+        self.timeline.start_dispatcher()
+        self.called = threading.Event()
+
+    def test__dispatcher_calls_due_callbacks(self):
+        self.timeline.set_time_factor(100)
+        self.timeline.schedule_callback(5, self.called.set)
+        self.assertTrue(self.called.wait(10))
+
+    def test__dispatcher_woken_by_set_time(self):
+        self.timeline.freeze()
+        self.timeline.schedule_callback(3600, self.called.set)
+        time.sleep(0.01)
+        self.assertFalse(self.called.is_set())
+        self.timeline.set_time(self.timeline.time() + 3600)
+        self.assertTrue(self.called.wait(10))
+
+    def test__dispatcher_woken_by_earlier_callback(self):
+        self.timeline.schedule_callback(3600, lambda: None)
+        time.sleep(0.01)
+        self.timeline.schedule_callback(0.01, self.called.set)
+        self.assertTrue(self.called.wait(10))
+
+    def test__dispatcher_survives_callback_errors(self):
+        self.timeline.set_time_factor(100)
+        self.timeline.schedule_callback(1, lambda: 1 / 0)
+        self.timeline.schedule_callback(2, self.called.set)
+        self.assertTrue(self.called.wait(10))
+        self.assertTrue(self.timeline._dispatcher_thread.is_alive())
+        with self.assertRaises(ZeroDivisionError):
+            self.timeline.stop_dispatcher()
+        self.timeline.start_dispatcher()
+
+    def test__cannot_start_dispatcher_twice(self):
+        with self.assertRaises(RuntimeError):
+            self.timeline.start_dispatcher()
@@ -0,0 +1,134 @@
+import asyncio
+import concurrent.futures
+import datetime
+import time
+from unittest import TestCase
+
+import flux
+from flux import time_patching
+from flux.simulation import run_simulations
+from flux.timeline import Timeline
+
+
+def _sleep_an_hour(timeline, rand):
+    # sleeps on the current timeline, which is frozen
+    time.sleep(3600)
+
+
+class TimePatchingTest(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(flux.current_timeline.set, flux.current_timeline.get())
+        self.timeline = Timeline()
+        flux.current_timeline.set(self.timeline)
+        self.original_time = time.time
+        self.original_sleep = time.sleep
+        self.original_monotonic = time.monotonic
+        self.original_datetime = datetime.datetime
+        self.addCleanup(time_patching.uninstall)
+        time_patching.install()
+
+    def test__patched_time_follows_timeline(self):
+        self.timeline.freeze()
+        self.timeline.set_time(self.timeline.time() + 3600)
+        self.assertEqual(time.time(), self.timeline.time())
+        self.assertEqual(time.time_ns(), self.timeline.time_ns())
+
+    def test__patched_sleep_sleeps_on_timeline(self):
+        self.timeline.freeze()
+        start_time = time.time()
+        start_monotonic = time.monotonic()
+        start_perf_counter = time.perf_counter()
+        time.sleep(3600)
+        self.assertEqual(self.timeline.time(), start_time + 3600)
+        self.assertAlmostEqual(time.monotonic(), start_monotonic + 3600, places=3)
+        self.assertAlmostEqual(time.perf_counter(), start_perf_counter + 3600, places=3)
+
+    def test__speedup_uses_real_clock(self):
+        self.timeline.freeze()
+        stats = self.timeline.enable_instrumentation()
+        time.sleep(3600)
+        self.assertGreater(stats.get_speedup(), 1000)
+
+    def test__simulation_wall_time_uses_real_clock(self):
+        self.timeline.freeze()
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            [result] = run_simulations(_sleep_an_hour, [{}], executor=executor)
+        self.assertTrue(result.succeeded())
+        self.assertLess(result.wall_time, 60)
+
+    def test__unmodified_timeline_uses_real_clock(self):
+        self.assertFalse(self.timeline.is_modified())
+        self.assertAlmostEqual(time.time(), self.original_time(), places=1)
+        self.assertLess(abs(datetime.datetime.now() - self.original_datetime.now()), datetime.timedelta(seconds=1))
+
+    def test__patched_datetime(self):
+        self.timeline.freeze()
+        self.timeline.set_time(self.timeline.time() + 10 * 24 * 3600)
+        now = datetime.datetime.now()
+        # datetimes have a microsecond resolution
+        self.assertAlmostEqual(now.timestamp(), self.timeline.time(), places=5)
+        self.assertEqual(datetime.date.today(), now.date())
+        self.assertAlmostEqual(datetime.datetime.now(datetime.timezone.utc).timestamp(), self.timeline.time(), places=5)
+
+    def test__isinstance_of_real_datetime(self):
+        real_now = self.original_datetime.now()
+        self.assertIsInstance(real_now, datetime.datetime)
+        self.assertIsInstance(real_now, datetime.date)
+        self.assertIsInstance(real_now.date(), datetime.date)
+        self.assertNotIsInstance(real_now.date(), datetime.datetime)
+
+    def test__timeline_keeps_using_real_clock(self):
+        self.timeline.set_time_factor(1000)
+        before = self.original_time()
+        self.timeline.time()
+        self.assertAlmostEqual(self.timeline._time_correction.real_time, before, places=1)
+
+    def test__uninstall_restores_originals(self):
+        time_patching.uninstall()
+        self.assertFalse(time_patching.is_installed())
+        self.assertIs(time.time, self.original_time)
+        self.assertIs(time.sleep, self.original_sleep)
+        self.assertIs(datetime.datetime, self.original_datetime)
+        self.assertIs(flux.timeline.time, time)
+
+    def test__cannot_install_twice(self):
+        with self.assertRaises(RuntimeError):
+            time_patching.install()
+
+    def test__patched_context_manager(self):
+        time_patching.uninstall()
+        with time_patching.patched():
+            self.assertTrue(time_patching.is_installed())
+            self.timeline.freeze()
+            self.assertIsNot(time.time, self.original_time)
+        self.assertIs(time.time, self.original_time)
+
+    def test__original_functions_until_modified(self):
+        time_patching.uninstall()
+        self.addCleanup(setattr, flux.timeline, "_any_modified", flux.timeline._any_modified)
+        flux.timeline._any_modified = False
+        time_patching.install()
+        self.assertIs(time.time, self.original_time)
+        self.assertIs(time.sleep, self.original_sleep)
+        Timeline().freeze()
+        self.assertIsNot(time.time, self.original_time)
+        self.assertAlmostEqual(time.time(), self.original_time(), places=1)
+        self.timeline.freeze()
+        self.assertEqual(time.time(), self.timeline.time())
+
+    def test__asyncio_loops_use_real_clock(self):
+        self.timeline.set_time_factor(0.5)
+        start_real_time = self.original_monotonic()
+        asyncio.run(self.timeline.async_sleep(0.2))
+        elapsed = self.original_monotonic() - start_real_time
+        self.assertGreaterEqual(elapsed, 0.39)
+        self.assertLess(elapsed, 0.7)
+
+    def test__scoped_timeline(self):
+        other = Timeline()
+        other.freeze()
+        with flux.current_timeline.use(other):
+            time.sleep(100)
+            self.assertEqual(time.time(), other.time())
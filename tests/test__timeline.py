@@ -1,13 +1,22 @@
+import asyncio
 import calendar
+import concurrent.futures
 import datetime
 import functools
+import io
+import math
+import os
+import pstats
+import tempfile
+import threading
 import time
 import types
 
 import flux
 import forge
 from flux.sequence import Sequence
-from flux.timeline import Timeline
+from flux.instrumentation import Histogram
+from flux.timeline import CheckpointError, Timeline
 
 try:
     from unittest2 import TestCase
@@ -59,6 +68,254 @@ class TimelineAPITest(TimelineTestBase):
         self.timeline.sleep_wait_all_scheduled()
         assert self.counter == i
 
+    def test__same_time_callbacks_called_in_scheduling_order(self):
+        called = []
+        for i in range(100):
+            self.timeline.schedule_callback(10 if i % 2 else 5, called.append, i)
+        self.timeline.sleep_wait_all_scheduled()
+        self.assertEqual(called, list(range(0, 100, 2)) + list(range(1, 100, 2)))
+
+    def test__schedule_callback_without_arguments(self):
+        callback = lambda: None
+        item = self.timeline.schedule_callback(10, callback)
+        self.assertIs(item.callback, callback)
+
+    def test__schedule_many(self):
+        called = []
+        start_time = self.timeline.time()
+        self.timeline.schedule_callback(15, called.append, "single")
+        items = self.timeline.schedule_many(
+            [(20, called.append, ("a",)), (10, called.append, ("b",)), (20, lambda: called.append("c")), (30, called.append, ("d",))])
+        self.assertEqual([item.time for item in items], [start_time + 20, start_time + 10, start_time + 20, start_time + 30])
+        items[-1].cancel()
+        self.timeline.sleep_wait_all_scheduled()
+        self.assertEqual(called, ["b", "single", "a", "c"])
+
+    def test__schedule_many_merges_into_large_schedule(self):
+        called = []
+        for i in range(1000):
+            self.timeline.schedule_callback(i, called.append, i)
+        self.timeline.schedule_many([(1.5, called.append, ("x",))])
+        self.timeline.sleep_wait_all_scheduled()
+        self.assertEqual(called[:4], [0, 1, "x", 2])
+        self.assertEqual(len(called), 1001)
+
+    def test__schedule_many_negative_delay(self):
+        with self.assertRaises(ValueError):
+            self.timeline.schedule_many([(1, lambda: None), (-1, lambda: None)])
+
+    def test__schedule_stream(self):
+        called = []
+        start_time = self.timeline.time()
+
+        def events(name, delays):
+            for delay in delays:
+                yield start_time + delay, functools.partial(called.append, (name, delay))
+
+        self.timeline.schedule_stream(events("a", [1, 3, 3, 10]))
+        stream = self.timeline.schedule_stream(events("b", [2, 3, 5]))
+        self.timeline.schedule_callback(4, called.append, "single")
+        self.assertTrue(stream.is_pending())
+        self.timeline.sleep_wait_all_scheduled()
+        self.assertEqual(called, [("a", 1), ("b", 2), ("a", 3), ("b", 3), ("a", 3), "single", ("b", 5), ("a", 10)])
+        self.assertFalse(stream.is_pending())
+
+    def test__schedule_stream_consumed_lazily(self):
+        start_time = self.timeline.time()
+        consumed = []
+
+        def events():
+            for i in range(10 ** 9):
+                consumed.append(i)
+                yield start_time + i, lambda: None
+
+        self.timeline.schedule_stream(events())
+        self.timeline.sleep(10)
+        self.assertEqual(consumed, list(range(12)))
+        self.assertEqual(len(self.timeline._scheduled), 1)
+
+    def test__cancel_stream(self):
+        called = []
+        start_time = self.timeline.time()
+        stream = self.timeline.schedule_stream((start_time + i, functools.partial(called.append, i)) for i in range(10))
+        self.timeline.sleep(2)
+        self.assertTrue(stream.cancel())
+        self.assertFalse(stream.cancel())
+        self.timeline.sleep_wait_all_scheduled()
+        self.assertEqual(called, [0, 1, 2])
+
+    def test__reschedule_stream(self):
+        start_time = self.timeline.time()
+        stream = self.timeline.schedule_stream((start_time + i, lambda: None) for i in range(10))
+        with self.assertRaises(TypeError):
+            stream.reschedule(5)
+        self.assertEqual(stream.time, start_time)
+
+    def test__schedule_stream_out_of_order(self):
+        start_time = self.timeline.time()
+        stream = self.timeline.schedule_stream([(start_time + 2, lambda: None), (start_time + 1, lambda: None)])
+        with self.assertRaises(ValueError):
+            self.timeline.sleep(5)
+        self.assertFalse(stream.is_pending())
+
+    def test__schedule_interval(self):
+        called = []
+        start_time = self.timeline.time()
+        interval = self.timeline.schedule_interval(10, lambda: called.append(self.timeline.time()))
+        self.timeline.sleep(35)
+        self.assertEqual(called, [start_time + 10, start_time + 20, start_time + 30])
+        self.assertEqual(len(self.timeline._scheduled), 1)
+        self.assertTrue(interval.cancel())
+        self.assertFalse(interval.cancel())
+        self.timeline.sleep(100)
+        self.assertEqual(len(called), 3)
+
+    def test__schedule_interval_does_not_drift(self):
+        called = []
+        start_time_ns = self.timeline.time_ns()
+
+        def callback():
+            called.append(self.timeline.time_ns())
+            self.timeline.sleep(0.3)
+
+        self.timeline.schedule_interval(1, callback)
+        self.timeline.run_for(3.5)
+        self.assertEqual(called, [start_time_ns + i * 10 ** 9 for i in (1, 2, 3)])
+
+    def test__schedule_interval_missed_ticks(self):
+        for missed, expected in [
+                ("call_all", [("tick",)] * 10),
+                ("coalesce", [("tick", 10)]),
+                ("skip", [("tick",)]),
+        ]:
+            called = []
+            interval = self.timeline.schedule_interval(1, lambda *args: called.append(args), "tick", missed=missed)
+            self.timeline.set_time(self.timeline.time() + 10.5)
+            self.timeline.trigger_past_callbacks()
+            self.assertEqual(called, expected)
+            # the following tick is on schedule
+            self.timeline.sleep(0.5)
+            self.assertEqual(len(called), len(expected) + 1)
+            interval.cancel()
+
+    def test__schedule_interval_cancel_from_callback(self):
+        called = []
+
+        def callback():
+            called.append(self.timeline.time())
+            interval.cancel()
+
+        interval = self.timeline.schedule_interval(1, callback)
+        self.timeline.sleep(10)
+        self.assertEqual(len(called), 1)
+        self.assertFalse(interval.is_pending())
+
+    def test__schedule_interval_reschedule(self):
+        called = []
+        start_time = self.timeline.time()
+        interval = self.timeline.schedule_interval(10, lambda: called.append(self.timeline.time()))
+        interval.reschedule(1)
+        self.timeline.sleep(25)
+        self.assertEqual(called, [start_time + 1, start_time + 11, start_time + 21])
+
+    def test__schedule_interval_invalid(self):
+        with self.assertRaises(ValueError):
+            self.timeline.schedule_interval(0, lambda: None)
+        with self.assertRaises(ValueError):
+            self.timeline.schedule_interval(1, lambda: None, missed="sometimes")
+
+    def test__run_until(self):
+        called = []
+        start_time = self.timeline.time()
+        for delay in (30, 10, 20, 50):
+            self.timeline.schedule_callback(delay, lambda: called.append(self.timeline.time() - start_time))
+        self.assertEqual(self.timeline.run_until(start_time + 40), 3)
+        self.assertEqual(called, [10, 20, 30])
+        self.assertEqual(self.timeline.time(), start_time + 40)
+
+    def test__run_for(self):
+        called = []
+        start_time = self.timeline.time()
+        self.timeline.schedule_callback(10, called.append, 1)
+        self.assertEqual(self.timeline.run_for(100), 1)
+        self.assertEqual(called, [1])
+        self.assertEqual(self.timeline.time(), start_time + 100)
+        with self.assertRaises(ValueError):
+            self.timeline.run_for(-1)
+
+    def test__run_events(self):
+        start_time = self.timeline.time()
+        self.timeline.schedule_many([(delay, lambda: None) for delay in (10, 20, 1000)])
+        self.assertEqual(self.timeline.run_events(2), 2)
+        self.assertEqual(self.timeline.time(), start_time + 20)
+        self.assertEqual(self.timeline.run_events(10), 1)
+        self.assertEqual(self.timeline.time(), start_time + 1000)
+        self.assertEqual(self.timeline.run_events(10), 0)
+        self.assertEqual(self.timeline.time(), start_time + 1000)
+
+    def test__run_until_max_events(self):
+        start_time = self.timeline.time()
+
+        def callback():
+            self.timeline.schedule_callback(1, callback)
+
+        self.timeline.schedule_callback(1, callback)
+        self.assertEqual(self.timeline.run_until(start_time + 10 ** 6, max_events=100), 100)
+        self.assertEqual(self.timeline.time(), start_time + 100)
+
+    def test__run_until_max_wall_seconds(self):
+        start_time = self.timeline.time()
+
+        def callback():
+            self.timeline.schedule_callback(0, callback)
+
+        self.timeline.schedule_callback(0, callback)
+        self.assertGreater(self.timeline.run_until(start_time + 1, max_wall_seconds=0.01), 0)
+        self.assertEqual(self.timeline.time(), start_time)
+
+    def test__cancel_scheduled(self):
+        self.called = False
+        item = self.timeline.schedule_callback(100, setattr, self, "called", True)
+        self.assertTrue(item.is_pending())
+        self.assertTrue(item.cancel())
+        self.assertFalse(item.is_pending())
+        self.assertFalse(item.cancel())
+        self.timeline.sleep(200)
+        self.assertFalse(self.called)
+
+    def test__cancel_does_not_stop_sleep_wait_all_scheduled(self):
+        start_time = self.timeline.time()
+        self.timeline.schedule_callback(100, lambda: None)
+        self.timeline.schedule_callback(200, lambda: None).cancel()
+        self.timeline.sleep_wait_all_scheduled()
+        self.assertEqual(self.timeline.time(), start_time + 100)
+
+    def test__reschedule(self):
+        calls = []
+        start_time = self.timeline.time()
+        item = self.timeline.schedule_callback(100, lambda: calls.append(self.timeline.time()))
+        item.reschedule(50)
+        self.assertEqual(item.time, start_time + 50)
+        self.timeline.sleep(200)
+        self.assertEqual(calls, [start_time + 50])
+        self.assertFalse(item.is_pending())
+        item.reschedule(10)
+        self.timeline.sleep(10)
+        self.assertEqual(calls, [start_time + 50, start_time + 210])
+
+    def test__reschedule_negative_delay(self):
+        item = self.timeline.schedule_callback(100, lambda: None)
+        with self.assertRaises(ValueError):
+            item.reschedule(-1)
+        self.assertTrue(item.is_pending())
+
+    def test__cancelled_items_compacted(self):
+        items = [self.timeline.schedule_callback(i, lambda: None) for i in range(1000)]
+        for item in items[:900]:
+            item.cancel()
+        self.assertLess(len(self.timeline._scheduled), 500)
+        self.assertTrue(all(item.is_pending() for item in items[900:]))
+
     def test__sleep_stop_first_scheduled_without_scheduled(self):
         start_time = self.timeline.time()
         self.timeline.sleep_stop_first_scheduled(200)
@@ -87,6 +344,42 @@ class TimelineAPITest(TimelineTestBase):
         self.timeline.set_time(current_time - 10, allow_backwards=True)
         self.assertEqual(self.timeline.time(), current_time - 10)
 
+    def test__time_ns(self):
+        start_time_ns = self.timeline.time_ns()
+        self.assertIsInstance(start_time_ns, int)
+        self.assertEqual(self.timeline.time(), start_time_ns / 10 ** 9)
+        self.timeline.sleep(0.1)
+        self.assertEqual(self.timeline.time_ns(), start_time_ns + 10 ** 8)
+
+    def test__set_time_ns(self):
+        time_ns = self.timeline.time_ns() + 123456789
+        self.timeline.set_time_ns(time_ns)
+        self.assertEqual(self.timeline.time_ns(), time_ns)
+
+    def test__no_accumulated_rounding_errors(self):
+        start_time_ns = self.timeline.time_ns()
+        for _ in range(10000):
+            self.timeline.sleep(0.001)
+        self.timeline.run_for(0.3)
+        self.assertEqual(self.timeline.time_ns(), start_time_ns + 10 * 10 ** 9 + 3 * 10 ** 8)
+
+    def test__callbacks_called_at_exact_ns(self):
+        called = []
+        start_time_ns = self.timeline.time_ns()
+        for _ in range(3):
+            self.timeline.schedule_callback(0.1, lambda: called.append(self.timeline.time_ns()))
+            self.timeline.sleep_wait_all_scheduled()
+        self.assertEqual(called, [start_time_ns + i * 10 ** 8 for i in (1, 2, 3)])
+
+    def test__monotonic(self):
+        start_monotonic = self.timeline.monotonic_ns()
+        self.timeline.sleep(10)
+        self.assertEqual(self.timeline.monotonic_ns(), start_monotonic + 10 * 10 ** 9)
+        self.timeline.set_time(self.timeline.time() - 100, allow_backwards=True)
+        self.assertEqual(self.timeline.monotonic_ns(), start_monotonic + 10 * 10 ** 9)
+        self.timeline.sleep(5)
+        self.assertEqual(self.timeline.monotonic(), (start_monotonic + 15 * 10 ** 9) / 10 ** 9)
+
 
 class TimeFactorTest(TestCase):
 
@@ -135,6 +428,23 @@ class TimeFactorTest(TestCase):
         self.assertEqual(self.timeline.time(), start_time + 10)
         self.assertEqual(self._callback_calls, [schedule_time])
 
+    def test__run_for_does_not_sleep(self):
+        start_time = self.timeline.time()
+        self.timeline.schedule_callback(5, self.callback)
+        self.timeline.run_for(100)
+        self.assertEqual(self._callback_calls, [start_time + 5])
+        self.assertEqual(self.timeline.time(), start_time + 100)
+        self.assertEqual(self._real_time, self._start_real_time)
+
+    def test__scheduled_callbacks_called_on_time_during_sleep(self):
+        real_calls = []
+        self.timeline.set_time_factor(2)
+        for delay in (5, 7):
+            self.timeline.schedule_callback(delay, lambda: real_calls.append(self._real_time))
+        self.timeline.sleep(10)
+        self.assertEqual(real_calls, [self._start_real_time + 2.5, self._start_real_time + 3.5])
+        self.assertEqual(self._real_time, self._start_real_time + 5)
+
     def test__factor_changes_real_sleeps(self):
         self._test__factor_changes(real_sleep=True)
 
@@ -145,6 +455,16 @@ class TimeFactorTest(TestCase):
         self.timeline.freeze()
         self.assertEqual(self.timeline.get_time_factor(), 0)
 
+    def test__freeze_during_sleep(self):
+        start_time = self.timeline.time()
+        self.timeline.set_time_factor(2)
+        self.timeline.schedule_callback(1, self.timeline.freeze)
+        self.timeline.schedule_callback(3, self.callback)
+        self.timeline.sleep(5)
+        self.assertEqual(self.timeline.time(), start_time + 5)
+        self.assertEqual(self._callback_calls, [start_time + 3])
+        self.assertEqual(self._real_time, self._start_real_time + 0.5)
+
     def _test__factor_changes(self, real_sleep):
         expected_virtual_time = self.timeline.time()
         expected_real_time = self._real_time
@@ -178,6 +498,26 @@ class TimeFactorTest(TestCase):
         assert a == b, "{0} ({1} != {2})".format(msg, a, b)
 
 
+class RealTimeSleepTest(TestCase):
+
+    def test__sleep_woken_by_earlier_callback(self):
+        timeline = Timeline()
+        timeline.set_time_factor(10)
+        called_real_times = []
+
+        def schedule_from_thread():
+            time.sleep(0.1)
+            self.scheduled_real_time = time.time()
+            timeline.schedule_callback(0.1, lambda: called_real_times.append(time.time()))
+
+        thread = threading.Thread(target=schedule_from_thread)
+        thread.start()
+        timeline.sleep(10)
+        thread.join()
+        self.assertEqual(len(called_real_times), 1)
+        self.assertLess(called_real_times[0] - self.scheduled_real_time, 0.5)
+
+
 class ScheduleTest(TimelineTestBase):
 
     def setUp(self):
@@ -260,6 +600,392 @@ class ScheduleSequenceTest(TimelineTestBase):
         self.assertEqual(self.value, i)
 
 
+class ParallelDispatchTest(TimelineTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.executor = concurrent.futures.ThreadPoolExecutor(4)
+        self.addCleanup(self.executor.shutdown)
+        self.timeline.set_dispatch_executor(self.executor)
+        self.start_time = self.timeline.time()
+
+    def test__same_time_callbacks_run_concurrently(self):
+        # would time out if the callbacks were called one by one
+        barrier = threading.Barrier(4, timeout=10)
+        observed = []
+
+        def callback():
+            barrier.wait()
+            observed.append((threading.current_thread(), self.timeline.time()))
+
+        for _ in range(4):
+            self.timeline.schedule_callback(10, callback)
+        self.timeline.sleep(20)
+        self.assertEqual(len({thread for thread, _ in observed}), 4)
+        self.assertEqual([called_time for _, called_time in observed], [self.start_time + 10] * 4)
+        self.assertEqual(self.timeline.time(), self.start_time + 20)
+
+    def test__batches_in_time_order(self):
+        called = []
+        for delay in (3, 1, 2, 1, 3, 3):
+            self.timeline.schedule_callback(delay, lambda delay=delay: called.append((delay, self.timeline.time())))
+        self.assertEqual(self.timeline.run_for(5), 6)
+        self.assertEqual(sorted(called), called)
+        self.assertEqual([called_time - self.start_time for _, called_time in called], [1, 1, 2, 3, 3, 3])
+
+    def test__callbacks_scheduled_by_batch(self):
+        called = []
+
+        def callback(remaining):
+            called.append(remaining)
+            if remaining:
+                self.timeline.schedule_callback(0, callback, remaining - 1)
+
+        self.timeline.schedule_callback(1, callback, 2)
+        self.timeline.schedule_callback(1, callback, 0)
+        self.timeline.sleep(1)
+        self.assertEqual(sorted(called), [0, 0, 1, 2])
+
+    def test__max_events(self):
+        for _ in range(10):
+            self.timeline.schedule_callback(1, lambda: None)
+        self.assertEqual(self.timeline.run_events(3), 3)
+        self.assertEqual(len(self.timeline._scheduled), 7)
+
+    def test__batch_errors_raised_after_batch(self):
+        called = []
+
+        def fail():
+            raise ZeroDivisionError()
+
+        self.timeline.schedule_callback(1, fail)
+        self.timeline.schedule_callback(1, called.append, 1)
+        with self.assertRaises(ZeroDivisionError):
+            self.timeline.sleep(1)
+        self.assertEqual(called, [1])
+
+    def test__process_pool(self):
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            self.timeline.set_dispatch_executor(executor)
+            for _ in range(4):
+                self.timeline.schedule_callback(1, functools.partial(math.factorial, 100))
+            self.assertEqual(self.timeline.run_for(2), 4)
+
+    def test__disable(self):
+        self.timeline.set_dispatch_executor(None)
+        observed = []
+        for _ in range(3):
+            self.timeline.schedule_callback(1, lambda: observed.append(threading.current_thread()))
+        self.timeline.sleep(1)
+        self.assertEqual(observed, [threading.current_thread()] * 3)
+
+    def test__instrumentation(self):
+        called = []
+        stats = self.timeline.enable_instrumentation(pre_dispatch=called.append)
+        for _ in range(4):
+            self.timeline.schedule_callback(1, lambda: None)
+        self.timeline.sleep(1)
+        self.assertEqual(stats.num_fired, 4)
+        self.assertEqual(stats.callback_wall_time.count, 4)
+        self.assertEqual(len(called), 4)
+
+    def test__invalid_min_batch_size(self):
+        with self.assertRaises(ValueError):
+            self.timeline.set_dispatch_executor(self.executor, min_batch_size=0)
+
+
+class InstrumentationTest(TimelineTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.start_time = self.timeline.time()
+
+    def test__disabled_by_default(self):
+        self.assertIsNone(self.timeline.get_stats())
+
+    def test__counters(self):
+        stats = self.timeline.enable_instrumentation()
+        self.assertIs(self.timeline.get_stats(), stats)
+        for delay in (1, 2, 3):
+            self.timeline.schedule_callback(delay, lambda: None)
+        self.timeline.schedule_many([(4, lambda: None), (5, lambda: None)])
+        self.timeline.sleep(2)
+        self.assertEqual(stats.num_scheduled, 5)
+        self.assertEqual(stats.num_fired, 2)
+        self.assertEqual(stats.max_scheduled_size, 5)
+        self.assertEqual(stats.callback_wall_time.count, 2)
+        # frozen, so callbacks are never late
+        self.assertEqual(stats.lateness.count, 0)
+
+    def test__disable(self):
+        stats = self.timeline.enable_instrumentation()
+        self.timeline.schedule_callback(1, lambda: None)
+        self.assertIs(self.timeline.disable_instrumentation(), stats)
+        self.assertIsNone(self.timeline.get_stats())
+        self.timeline.schedule_callback(1, lambda: None)
+        self.timeline.sleep(1)
+        self.assertEqual((stats.num_scheduled, stats.num_fired), (1, 0))
+
+    def test__hooks(self):
+        called = []
+        self.timeline.enable_instrumentation(
+            pre_dispatch=lambda item: called.append(("pre", item.time - self.start_time)),
+            post_dispatch=lambda item, wall_time: called.append(("post", item.time - self.start_time, wall_time >= 0)))
+        self.timeline.schedule_callback(1, called.append, "callback")
+        self.timeline.sleep(1)
+        self.assertEqual(called, [("pre", 1), "callback", ("post", 1, True)])
+
+    def test__failing_callbacks_are_recorded(self):
+        stats = self.timeline.enable_instrumentation()
+        self.timeline.schedule_callback(1, lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            self.timeline.sleep(1)
+        self.assertEqual(stats.num_fired, 1)
+
+    def test__lateness(self):
+        stats = self.timeline.enable_instrumentation()
+        self.timeline.set_time_factor(1)
+        self.timeline.schedule_callback(0.001, lambda: None)
+        self.timeline.sleep(0.01)
+        self.assertEqual(stats.lateness.count, 1)
+        self.assertGreaterEqual(stats.lateness.min, 0)
+
+    def test__callback_wall_time(self):
+        stats = self.timeline.enable_instrumentation()
+        self.timeline.schedule_callback(1, time.sleep, 0.01)
+        self.timeline.sleep(1)
+        self.assertGreaterEqual(stats.callback_wall_time.max, 0.01)
+        self.assertGreaterEqual(stats.callback_wall_time.percentile(100), 0.01)
+
+    def test__scheduled_size_samples(self):
+        stats = self.timeline.enable_instrumentation(size_sample_interval=2)
+        for delay in range(1, 6):
+            self.timeline.schedule_callback(delay, lambda: None)
+        self.timeline.run_for(10)
+        self.assertEqual(stats.scheduled_sizes, [(self.start_time + 2, 3), (self.start_time + 4, 1)])
+
+    def test__scheduled_sizes_exclude_cancelled(self):
+        stats = self.timeline.enable_instrumentation(size_sample_interval=1)
+        items = [self.timeline.schedule_callback(delay, lambda: None) for delay in range(1, 61)]
+        for item in items[1:]:
+            item.cancel()
+        self.timeline.schedule_callback(1, lambda: None)
+        self.timeline.run_for(1)
+        self.assertEqual(stats.max_scheduled_size, 60)
+        self.assertEqual(stats.scheduled_sizes, [(self.start_time + 1, 1), (self.start_time + 1, 0)])
+
+    def test__speedup(self):
+        stats = self.timeline.enable_instrumentation()
+        self.timeline.sleep(3600)
+        self.assertGreater(stats.get_speedup(), 1000)
+
+    def test__checkpoint(self):
+        stats = self.timeline.enable_instrumentation()
+        self.timeline.schedule_callback(1, self.timeline.trigger_past_callbacks)
+        checkpoint = self.timeline.checkpoint()
+        self.timeline.restore(checkpoint)
+        self.timeline.sleep(1)
+        self.assertEqual(stats.num_fired, 1)
+        self.timeline.disable_instrumentation()
+        self.timeline.restore(checkpoint)
+        self.timeline.sleep(1)
+        self.assertEqual(stats.num_fired, 1)
+
+    def test__profile_disabled_by_default(self):
+        self.assertIsNone(self.timeline.enable_instrumentation().profile)
+
+    def test__profile_call_sites(self):
+        profile = self.timeline.enable_instrumentation(profile_callbacks=True).profile
+        for _ in range(2):
+            self.timeline.schedule_callback(1, time.sleep, 0.002)
+        self.timeline.schedule_interval(1, self._do_nothing)
+        self.timeline.sleep(3)
+        sleep_site, interval_site = profile.get_call_sites()
+        self.assertEqual(sleep_site.callback_name, "time.sleep")
+        self.assertEqual((sleep_site.filename, sleep_site.function), (__file__, "test__profile_call_sites"))
+        self.assertEqual(sleep_site.num_calls, 2)
+        self.assertGreaterEqual(sleep_site.total_time, 0.004)
+        self.assertGreaterEqual(sleep_site.max_time, 0.002)
+        self.assertEqual(interval_site.callback_name, "tests.test__timeline.InstrumentationTest._do_nothing")
+        self.assertEqual(interval_site.lineno, sleep_site.lineno + 1)
+        self.assertEqual(interval_site.num_calls, 3)
+
+    def test__profile_sequences(self):
+        profile = self.timeline.enable_instrumentation(profile_callbacks=True).profile
+
+        def worker():
+            for _ in range(3):
+                yield Sequence.sleep(1)
+
+        Sequence(worker()).run(self.timeline)
+        self.timeline.sleep(10)
+        [site] = profile.get_call_sites()
+        self.assertEqual(site.callback_name, "InstrumentationTest.test__profile_sequences.<locals>.worker")
+        self.assertEqual(site.num_calls, 3)
+
+    def test__profile_callbacks_scheduled_before_profiling(self):
+        self.timeline.schedule_callback(1, self._do_nothing)
+        profile = self.timeline.enable_instrumentation(profile_callbacks=True).profile
+        self.timeline.sleep(1)
+        [site] = profile.get_call_sites()
+        self.assertEqual((site.filename, site.lineno), ("~", 0))
+
+    def test__profile_callable_objects(self):
+        profile = self.timeline.enable_instrumentation(profile_callbacks=True).profile
+        for delay in range(3):
+            self.timeline.schedule_callback(delay, _Tick())
+        self.timeline.sleep(3)
+        [site] = profile.get_call_sites()
+        self.assertEqual(site.callback_name, "tests.test__timeline._Tick")
+        self.assertEqual(site.num_calls, 3)
+
+    def test__profile_export(self):
+        profile = self.timeline.enable_instrumentation(profile_callbacks=True).profile
+        self.timeline.schedule_callback(1, time.sleep, 0.001)
+        self.timeline.sleep(1)
+        [site] = profile.get_call_sites()
+        self.assertEqual(list(pstats.Stats(profile).stats), [(__file__, site.lineno, "time.sleep")])
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "profile")
+            profile.dump_stats(path)
+            self.assertEqual(pstats.Stats(path).total_calls, 1)
+        collapsed = io.StringIO()
+        profile.write_collapsed(collapsed)
+        self.assertRegex(
+            collapsed.getvalue(),
+            r"^test__profile_export \(test__timeline.py:{}\);time.sleep \d+\n$".format(site.lineno))
+
+    def _do_nothing(self):
+        pass
+
+    def test__histogram(self):
+        histogram = Histogram()
+        self.assertIsNone(histogram.percentile(50))
+        for value in (0, 0.000001, 0.0001, 0.01, 0.01):
+            histogram.record(value)
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual((histogram.min, histogram.max), (0, 0.01))
+        self.assertAlmostEqual(histogram.mean(), 0.0040202)
+        self.assertEqual(histogram.percentile(20), 0.000001)
+        self.assertEqual(histogram.percentile(50), 0.000128)
+        self.assertEqual(histogram.percentile(100), 0.01)
+
+
+class _Tick():
+
+    def __call__(self):
+        pass
+
+
+class _SharedLog(list):
+    # shared between checkpoints instead of being copied, to observe the calls of restored timelines
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class _Recorder():
+
+    def __init__(self, timeline, log):
+        super().__init__()
+        self.timeline = timeline
+        self.log = log
+        self.start_time = timeline.time()
+
+    def record(self, name):
+        self.log.append((name, self.timeline.time() - self.start_time))
+
+
+class _Counter():
+
+    def __init__(self, log):
+        super().__init__()
+        self.log = log
+        self.count = 0
+
+    def increment(self):
+        self.count += 1
+        self.log.append(self.count)
+
+
+class CheckpointTest(TimelineTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.start_time = self.timeline.time()
+        self.log = _SharedLog()
+        self.recorder = _Recorder(self.timeline, self.log)
+
+    def test__restore(self):
+        self.timeline.schedule_callback(10, self.recorder.record, "a")
+        self.timeline.schedule_callback(20, self.recorder.record, "b")
+        checkpoint = self.timeline.checkpoint()
+        for _ in range(2):
+            self.timeline.sleep(15)
+            self.timeline.schedule_callback(1, self.recorder.record, "c")
+            self.timeline.sleep_wait_all_scheduled()
+            self.timeline.restore(checkpoint)
+            self.assertEqual(self.timeline.time(), self.start_time)
+        self.assertEqual(self.log, [("a", 10), ("c", 16), ("b", 20)] * 2)
+        self.assertEqual(len(self.timeline._scheduled), 2)
+
+    def test__restore_time_factor(self):
+        self.timeline.set_time_factor(2)
+        checkpoint = self.timeline.checkpoint()
+        self.timeline.freeze()
+        self.timeline.restore(checkpoint)
+        self.assertEqual(self.timeline.get_time_factor(), 2)
+        self.assertGreater(self.timeline.time(), checkpoint.time_ns / 1e9)
+
+    def test__restored_callbacks_are_copies(self):
+        counter = _Counter(self.log)
+        self.timeline.schedule_callback(1, counter.increment)
+        checkpoint = self.timeline.checkpoint()
+        self.timeline.sleep(1)
+        for _ in range(2):
+            self.timeline.restore(checkpoint)
+            self.timeline.sleep(1)
+        self.assertEqual(self.log, [1, 1, 1])
+        self.assertEqual(counter.count, 1)
+
+    def test__callbacks_referring_to_the_timeline(self):
+        self.timeline.schedule_callback(1, self.timeline.schedule_callback, 1, self.log.append, "nested")
+        forked = self.timeline.fork()
+        forked.sleep(2)
+        self.assertEqual(self.log, ["nested"])
+        self.assertEqual(len(self.timeline._scheduled), 1)
+
+    def test__fork(self):
+        counter = _Counter(self.log)
+        self.timeline.schedule_interval(10, counter.increment)
+        forked = self.timeline.fork()
+        self.assertIs(type(forked), type(self.timeline))
+        self.assertEqual(forked.time(), self.timeline.time())
+        forked.sleep(35)
+        self.assertEqual(self.log, [1, 2, 3])
+        self.assertEqual(forked.time(), self.start_time + 35)
+        self.timeline.sleep(15)
+        self.assertEqual(self.log, [1, 2, 3, 1])
+
+    def test__closures_cannot_be_captured(self):
+        self.timeline.schedule_callback(1, lambda: self.log.append(1))
+        with self.assertRaisesRegex(CheckpointError, "functools.partial"):
+            self.timeline.checkpoint()
+
+    def test__uncopyable_callbacks(self):
+        self.timeline.schedule_stream((self.start_time + i, self.log.append) for i in range(3))
+        with self.assertRaises(CheckpointError):
+            self.timeline.checkpoint()
+
+    def test__running_sequences_cannot_be_captured(self):
+        def worker():
+            yield Sequence.sleep(1)
+
+        Sequence(worker()).run(self.timeline)
+        with self.assertRaisesRegex(CheckpointError, "generators"):
+            self.timeline.checkpoint()
+
+
 class CurrentTimeLineTest(TestCase):
 
     def test__current_timeline_available(self):
@@ -275,6 +1001,42 @@ class CurrentTimeLineTest(TestCase):
         self.assertEqual(new_timeline.get_time_factor(), new_factor)
 
 
+    def test__use_scoped_timeline(self):
+        global_timeline = flux.current_timeline.get()
+        scoped_timeline = Timeline()
+        scoped_timeline.freeze()
+        scoped_timeline.set_time(scoped_timeline.time() + 10000)
+        with flux.current_timeline.use(scoped_timeline) as used:
+            self.assertIs(used, scoped_timeline)
+            self.assertIs(flux.current_timeline.get(), scoped_timeline)
+            self.assertEqual(flux.current_timeline.time(), scoped_timeline.time())
+            self.assertEqual(flux.current_timeline.get_time_factor(), 0)
+            flux.current_timeline.sleep(5)
+            self.assertEqual(flux.current_timeline.time(), scoped_timeline.time())
+        self.assertIs(flux.current_timeline.get(), global_timeline)
+
+    def test__use_is_per_thread(self):
+        global_timeline = flux.current_timeline.get()
+        seen = []
+        with flux.current_timeline.use(Timeline()):
+            thread = threading.Thread(target=lambda: seen.append(flux.current_timeline.get()))
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, [global_timeline])
+
+    def test__use_is_per_asyncio_task(self):
+        async def get_in_task(timeline):
+            with flux.current_timeline.use(timeline):
+                await asyncio.sleep(0)
+                return flux.current_timeline.get()
+
+        async def main():
+            return await asyncio.gather(*(get_in_task(timeline) for timeline in timelines))
+
+        timelines = [Timeline(), Timeline()]
+        self.assertEqual(asyncio.run(main()), timelines)
+
+
 class DatetimeTest(TimelineTestBase):
 
     def setUp(self):
@@ -0,0 +1,238 @@
+import io
+import random
+from unittest import TestCase
+
+from flux.threadsafe_timeline import ThreadSafeTimeline
+from flux.timeline import Timeline
+from flux.tracing import TRACE_DISPATCH, TRACE_SCHEDULE, TRACE_TIME, TraceDivergence, TraceEvent, read_trace
+
+
+class _Client():
+
+    def __init__(self, timeline, rand, log):
+        super().__init__()
+        self.timeline = timeline
+        self.rand = rand
+        self.log = log
+
+    def tick(self):
+        self.log.append(self)
+        self.timeline.schedule_callback(self.rand.random(), self.tick)
+
+
+
+class _Tick():
+
+    def __call__(self):
+        pass
+
+
+def _do_nothing():
+    pass
+
+
+class TracingTest(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.timeline = self._get_timeline()
+        self.timeline.freeze()
+        self.start_ns = self.timeline.time_ns()
+
+    def _get_timeline(self):
+        return Timeline()
+
+    def _simulate(self, timeline, seed=0, num_clients=10, duration=100):
+        rand = random.Random(seed)
+        log = []
+        for _ in range(num_clients):
+            timeline.schedule_callback(rand.random(), _Client(timeline, rand, log).tick)
+        timeline.run_for(duration)
+        return log
+
+    def test__record(self):
+        trace = io.BytesIO()
+        self.timeline.start_trace(trace)
+        self.timeline.schedule_callback(2, _do_nothing)
+        self.timeline.schedule_many([(1, dict)])
+        self.timeline.sleep(3)
+        self.timeline.set_time_factor(2)
+        self.timeline.stop_trace()
+        trace.seek(0)
+        events = list(read_trace(trace))
+        second = 1000000000
+        self.assertEqual(events[:-1], [
+            TraceEvent(TRACE_SCHEDULE, self.start_ns + 2 * second, 0, "tests.test__tracing._do_nothing"),
+            TraceEvent(TRACE_SCHEDULE, self.start_ns + second, 1, "builtins.dict"),
+            # frozen sleeps move the time first, then call the past callbacks
+            TraceEvent(TRACE_TIME, self.start_ns + 3 * second, time_factor=0),
+            TraceEvent(TRACE_DISPATCH, self.start_ns + second, 1, "builtins.dict"),
+            TraceEvent(TRACE_DISPATCH, self.start_ns + 2 * second, 0, "tests.test__tracing._do_nothing"),
+        ])
+        self.assertEqual(events[-1].kind, TRACE_TIME)
+        self.assertEqual(events[-1].time_factor, 2)
+
+    def test__buffering(self):
+        trace = io.BytesIO()
+        self.timeline.start_trace(trace, buffer_size=1000)
+        self.timeline.schedule_callback(1, _do_nothing).cancel()
+        self.assertEqual(trace.getvalue(), b"")
+        log = self._simulate(self.timeline, duration=10)
+        num_written = len(trace.getvalue())
+        self.assertGreater(num_written, 0)
+        self.timeline.stop_trace()
+        self.assertGreater(len(trace.getvalue()), num_written)
+        trace.seek(0)
+        self.assertEqual(len([event for event in read_trace(trace) if event.kind == TRACE_DISPATCH]), len(log))
+
+    def test__large_trace(self):
+        trace = io.BytesIO()
+        self.timeline.start_trace(trace)
+        log = self._simulate(self.timeline, num_clients=100, duration=500)
+        self.timeline.stop_trace()
+        trace.seek(0)
+        self.assertEqual(len([event for event in read_trace(trace) if event.kind == TRACE_DISPATCH]), len(log))
+
+    def test__replay(self):
+        trace = io.BytesIO()
+        self.timeline.start_trace(trace)
+        self._simulate(self.timeline)
+        self.timeline.stop_trace()
+        trace.seek(0)
+        rerun = self._get_timeline()
+        rerun.freeze()
+        rerun.set_time_ns(self.start_ns, allow_backwards=True)
+        replayer = rerun.start_replay(trace)
+        self._simulate(rerun)
+        self.assertIs(rerun.stop_trace(), replayer)
+        self.assertEqual(replayer.get_num_remaining(), 0)
+        self.assertGreater(replayer.num_replayed, 0)
+
+    def test__replay_from_another_start_time(self):
+        trace = io.BytesIO()
+        self.timeline.start_trace(trace)
+        self._simulate(self.timeline)
+        self.timeline.stop_trace()
+        trace.seek(0)
+        rerun = self._get_timeline()
+        rerun.freeze()
+        rerun.set_time_ns(self.start_ns + 3600 * 1000000000)
+        replayer = rerun.start_replay(trace)
+        self._simulate(rerun)
+        rerun.stop_trace()
+        self.assertEqual(replayer.get_num_remaining(), 0)
+        self.assertGreater(replayer.num_replayed, 0)
+
+    def test__replay_callable_objects(self):
+        def run(timeline):
+            for delay in range(3):
+                timeline.schedule_callback(delay, _Tick())
+            timeline.sleep(3)
+
+        trace = io.BytesIO()
+        self.timeline.start_trace(trace)
+        run(self.timeline)
+        recorder = self.timeline.stop_trace()
+        self.assertEqual(list(recorder._callback_ids), ["tests.test__tracing._Tick"])
+        trace.seek(0)
+        rerun = self._get_timeline()
+        rerun.freeze()
+        replayer = rerun.start_replay(trace)
+        run(rerun)
+        rerun.stop_trace()
+        self.assertEqual(replayer.num_replayed, 3)
+        self.assertEqual(replayer.get_num_remaining(), 0)
+
+    def test__replay_divergence(self):
+        trace = io.BytesIO()
+        self.timeline.start_trace(trace)
+        self._simulate(self.timeline)
+        self.timeline.stop_trace()
+        trace.seek(0)
+        rerun = self._get_timeline()
+        rerun.freeze()
+        rerun.set_time_ns(self.start_ns, allow_backwards=True)
+        replayer = rerun.start_replay(trace)
+        with self.assertRaisesRegex(TraceDivergence, "Dispatch #0 "):
+            self._simulate(rerun, seed=1)
+        self.assertEqual(replayer.num_replayed, 0)
+
+    def test__replay_after_other_callbacks(self):
+        self.timeline.schedule_callback(0, dict)
+        self.timeline.sleep(0)
+        trace = io.BytesIO()
+        self.timeline.start_trace(trace)
+        self._simulate(self.timeline)
+        self.timeline.stop_trace()
+        trace.seek(0)
+        rerun = self._get_timeline()
+        rerun.freeze()
+        replayer = rerun.start_replay(trace)
+        self._simulate(rerun)
+        rerun.stop_trace()
+        self.assertEqual(replayer.get_num_remaining(), 0)
+        self.assertGreater(replayer.num_replayed, 0)
+
+    def test__replay_divergence_drops_item(self):
+        trace = io.BytesIO()
+        self.timeline.start_trace(trace)
+        self.timeline.schedule_callback(1, dict)
+        self.timeline.sleep(1)
+        self.timeline.stop_trace()
+        trace.seek(0)
+        rerun = self._get_timeline()
+        rerun.freeze()
+        rerun.start_replay(trace)
+        item = rerun.schedule_callback(1, _do_nothing)
+        with self.assertRaises(TraceDivergence):
+            rerun.sleep(1)
+        self.assertFalse(item.is_pending())
+
+    def test__replay_shorter_run(self):
+        trace = io.BytesIO()
+        self.timeline.start_trace(trace)
+        self.timeline.schedule_callback(1, dict)
+        self.timeline.schedule_callback(2, dict)
+        self.timeline.sleep(2)
+        self.timeline.stop_trace()
+        trace.seek(0)
+        rerun = self._get_timeline()
+        rerun.freeze()
+        rerun.set_time_ns(self.start_ns, allow_backwards=True)
+        replayer = rerun.start_replay(trace)
+        rerun.schedule_callback(1, dict)
+        rerun.sleep(2)
+        self.assertEqual(replayer.get_num_remaining(), 1)
+
+    def test__single_trace_at_a_time(self):
+        self.timeline.start_trace(io.BytesIO())
+        with self.assertRaises(RuntimeError):
+            self.timeline.start_replay(io.BytesIO())
+
+    def test__stop_without_trace(self):
+        self.assertIsNone(self.timeline.stop_trace())
+
+    def test__tracing_with_instrumentation(self):
+        trace = io.BytesIO()
+        stats = self.timeline.enable_instrumentation()
+        self.timeline.start_trace(trace)
+        first_log = self._simulate(self.timeline, duration=10)
+        num_instrumented = len(first_log)
+        self.timeline.disable_instrumentation()
+        # clients of the first run keep ticking, and logging to first_log
+        second_log = self._simulate(self.timeline, duration=10)
+        self.timeline.stop_trace()
+        trace.seek(0)
+        self.assertEqual(len([event for event in read_trace(trace) if event.kind == TRACE_DISPATCH]),
+                         len(first_log) + len(second_log))
+        self.assertEqual(stats.num_fired, num_instrumented)
+
+    def test__not_a_trace(self):
+        with self.assertRaises(ValueError):
+            list(read_trace(io.BytesIO(b"hello")))
+
+
+class ThreadSafeTracingTest(TracingTest):
+
+    def _get_timeline(self):
+        return ThreadSafeTimeline()
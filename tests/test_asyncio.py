@@ -1,5 +1,8 @@
-import pytest
 import asyncio
+import time
+
+import pytest
+from flux import asyncio_loop
 
 
 async def _do_nothing_async_function():
@@ -14,3 +17,175 @@ async def test_async_sleep(timeline):
     timeline.sleep(5)
     await timeline.async_sleep(5)
     assert task.done()
+
+
+@pytest.mark.asyncio
+async def test_async_sleep_awaits_coroutine_callbacks(timeline):
+    timeline.freeze()
+    called = []
+
+    async def callback(value):
+        await asyncio.sleep(0)
+        called.append(value)
+
+    timeline.schedule_callback(5, callback, 1)
+    timeline.schedule_callback(20, callback, 2)
+    await timeline.async_sleep(10)
+    assert called == [1]
+    await timeline.async_sleep(10)
+    assert called == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_coroutine_callbacks_run_concurrently(timeline):
+    timeline.freeze()
+    event = asyncio.Event()
+    called = []
+
+    async def waiter():
+        await event.wait()
+        called.append("waiter")
+
+    async def setter():
+        event.set()
+        called.append("setter")
+
+    timeline.schedule_callback(1, waiter)
+    timeline.schedule_callback(2, setter)
+    await asyncio.wait_for(timeline.async_sleep(5), 10)
+    assert called == ["setter", "waiter"]
+
+
+@pytest.mark.asyncio
+async def test_async_sleep_raises_coroutine_callback_errors(timeline):
+    timeline.freeze()
+
+    async def callback():
+        raise ZeroDivisionError()
+
+    timeline.schedule_callback(1, callback)
+    with pytest.raises(ZeroDivisionError):
+        await timeline.async_sleep(5)
+
+
+@pytest.mark.asyncio
+async def test_async_sleep_woken_by_earlier_callback(timeline):
+    timeline.set_time_factor(1)
+    called_real_times = []
+    start_real_time = time.monotonic()
+
+    async def schedule():
+        await asyncio.sleep(0.1)
+        timeline.schedule_callback(0.1, lambda: called_real_times.append(time.monotonic()))
+
+    await asyncio.gather(timeline.async_sleep(1.5), schedule())
+    assert len(called_real_times) == 1
+    assert called_real_times[0] - start_real_time < 0.8
+
+
+@pytest.mark.asyncio
+async def test_coroutine_callbacks_see_scheduled_time(timeline):
+    timeline.freeze()
+    start_time = timeline.time()
+    times = []
+
+    async def async_callback():
+        times.append(("async", timeline.time() - start_time))
+        await asyncio.sleep(0)
+        times.append(("async resumed", timeline.time() - start_time))
+
+    timeline.schedule_callback(1, async_callback)
+    timeline.schedule_callback(1, lambda: times.append(("sync", timeline.time() - start_time)))
+    await timeline.async_sleep(5)
+    assert times == [("sync", 1), ("async", 1), ("async resumed", 5)]
+
+
+@pytest.mark.asyncio
+async def test_async_sleep_frozen_by_callback(timeline):
+    timeline.set_time_factor(100)
+    start_time = timeline.time()
+    timeline.schedule_callback(1, timeline.freeze)
+    await timeline.async_sleep(5)
+    assert timeline.get_time_factor() == 0
+    assert timeline.time() == pytest.approx(start_time + 5, abs=0.1)
+
+
+def test_coroutine_callback_requires_running_loop(timeline):
+    timeline.freeze()
+
+    async def callback():
+        pass  # pragma: no cover
+
+    timeline.schedule_callback(1, callback)
+    with pytest.raises(RuntimeError):
+        timeline.sleep(5)
+
+
+def test_timeline_event_loop_coroutine_callbacks(timeline):
+    timeline.freeze()
+    start_time = timeline.time()
+    called = []
+
+    async def callback():
+        await asyncio.sleep(10)
+        called.append(timeline.time())
+
+    async def main():
+        timeline.schedule_callback(20, callback)
+        await asyncio.sleep(60)
+
+    asyncio_loop.run(main(), timeline)
+    assert called == [start_time + 30]
+
+
+def test_timeline_event_loop_sleep(timeline):
+    start_time = timeline.time()
+    real_start_time = time.time()
+
+    async def main():
+        await asyncio.sleep(3600)
+        return timeline.time()
+
+    assert asyncio_loop.run(main(), timeline) >= start_time + 3600
+    assert time.time() - real_start_time < 60
+
+
+def test_timeline_event_loop_wait_for_timeout(timeline):
+    timeline.freeze()
+    start_time = timeline.time()
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.Event().wait(), 600)
+        return timeline.time()
+
+    assert asyncio_loop.run(main(), timeline) == pytest.approx(start_time + 600)
+
+
+def test_timeline_event_loop_call_later_and_timeline_callbacks(timeline):
+    timeline.freeze()
+    called = []
+
+    async def main():
+        loop = asyncio.get_event_loop()
+        loop.call_later(30, called.append, "loop")
+        timeline.schedule_callback(20, called.append, "timeline")
+        await asyncio.sleep(40)
+
+    asyncio_loop.run(main())
+    assert called == ["timeline", "loop"]
+
+
+class TestTimelineEventLoopPolicy:
+
+    @pytest.fixture
+    def event_loop_policy(self, timeline):
+        timeline.freeze()
+        return asyncio_loop.TimelineEventLoopPolicy(timeline)
+
+    @pytest.mark.asyncio
+    async def test_sleep(self, timeline):
+        assert isinstance(asyncio.get_event_loop(), asyncio_loop.TimelineEventLoop)
+        start_time = timeline.time()
+        await asyncio.sleep(24 * 60 * 60)
+        assert timeline.time() == pytest.approx(start_time + 24 * 60 * 60)